@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
+from . import cli
 from . import controllers
+from . import models
 from . import wizard
 from . import report
 
@@ -39,6 +39,7 @@
     'depends': ['base', 'base_accounting_kit'],
     'data': [
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         'views/templates.xml',
         'views/views.xml',
         'views/kit_menus.xml',
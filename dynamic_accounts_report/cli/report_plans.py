@@ -0,0 +1,30 @@
+import argparse
+
+import odoo
+from odoo import api, SUPERUSER_ID
+from odoo.cli import Command
+from odoo.tools import config
+
+from ..models.account_move_line import SEQ_SCAN_THRESHOLD
+
+
+class ReportPlans(Command):
+    """ Report sequential scans in the plans of the financial report queries"""
+
+    def run(self, args):
+        parser = argparse.ArgumentParser(prog='report_plans')
+        parser.add_argument('--threshold', type=int, default=SEQ_SCAN_THRESHOLD,
+                            help="Ignore tables with fewer estimated rows")
+        options, args = parser.parse_known_args(args)
+        config.parse_config(args)
+        dbname = config['db_name']
+        if not dbname:
+            parser.error("a database is required, use -d")
+        registry = odoo.registry(dbname)
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            issues = env['account.move.line']._verify_report_query_plans(options.threshold)
+        for report, table, rows in issues:
+            print("%s: sequential scan on %s (~%s rows)" % (report, table, rows))
+        if not issues:
+            print("No sequential scan on large tables.")
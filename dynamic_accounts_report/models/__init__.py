@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+from . import account_balance_snapshot
+from . import account_move
+from . import account_move_line
+from . import account_partial_reconcile
+from . import report_result_cache
@@ -0,0 +1,244 @@
+import threading
+from datetime import timedelta
+
+from odoo import fields, models, api
+
+# First key of the advisory locks serializing the snapshots of a company,
+# the second one being the id of the company.
+SNAPSHOT_LOCK = 0x646172
+
+
+class AccountBalanceSnapshot(models.Model):
+    _name = 'account.balance.snapshot'
+    _description = 'Account Balance Snapshot'
+    _order = 'date desc, company_id, account_id, journal_id'
+
+    date = fields.Date(string='Date', required=True, index=True,
+                       help="End of the fiscal year the balances are "
+                            "accumulated up to, this date included.")
+    company_id = fields.Many2one('res.company', string='Company',
+                                 required=True, ondelete='cascade')
+    account_id = fields.Many2one('account.account', string='Account',
+                                 required=True, ondelete='cascade')
+    journal_id = fields.Many2one('account.journal', string='Journal',
+                                 required=True, ondelete='cascade')
+    debit = fields.Float(string='Debit', digits='Account')
+    credit = fields.Float(string='Credit', digits='Account')
+    balance = fields.Float(string='Balance', digits='Account')
+
+    def init(self):
+        self.env.cr.execute("""CREATE INDEX IF NOT EXISTS account_balance_snapshot_company_date_index
+                               ON account_balance_snapshot (company_id, date)""")
+
+    def _get_snapshot_dates(self, company):
+        """ Ends of the closed fiscal years of the company, starting with
+        the one of its first journal item."""
+        self.env.cr.execute("""SELECT MIN(date) FROM account_move_line
+                               WHERE company_id = %s""", (company.id,))
+        first_date = self.env.cr.fetchone()[0]
+        dates = []
+        if not first_date:
+            return dates
+        today = fields.Date.context_today(self)
+        fiscal_year = company.compute_fiscalyear_dates(first_date)
+        while fiscal_year['date_to'] < today:
+            dates.append(fiscal_year['date_to'])
+            fiscal_year = company.compute_fiscalyear_dates(
+                fiscal_year['date_to'] + timedelta(days=1))
+        return dates
+
+    def _lock_companies(self, company_ids):
+        """ Lock the snapshots of the companies until the end of the current
+        transaction, the companies being locked in the order of their ids."""
+        self.env.cr.execute("""SELECT pg_advisory_xact_lock(%s, id)
+                               FROM unnest(%s::int[]) AS id""",
+                            (SNAPSHOT_LOCK, sorted(company_ids)))
+
+    def _build_snapshot(self, company, date):
+        """ Store the posted balances of the company up to ``date``, computed
+        from the previous snapshot and the journal items posted since."""
+        cr = self.env.cr
+        cr.execute("""SELECT MAX(date) FROM account_balance_snapshot
+                      WHERE company_id = %s AND date < %s""", (company.id, date))
+        previous_date = cr.fetchone()[0]
+        cr.execute("""
+            INSERT INTO account_balance_snapshot
+                (create_uid, create_date, write_uid, write_date,
+                 date, company_id, account_id, journal_id, debit, credit, balance)
+            SELECT %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC',
+                   %(date)s, %(company_id)s, account_id, journal_id,
+                   SUM(debit), SUM(credit), SUM(balance)
+            FROM (
+                SELECT s.account_id, s.journal_id, s.debit, s.credit, s.balance
+                FROM account_balance_snapshot s
+                WHERE s.company_id = %(company_id)s AND s.date = %(previous_date)s
+                UNION ALL
+                SELECT l.account_id, l.journal_id, l.debit, l.credit, l.balance
+                FROM account_move_line l
+                WHERE l.company_id = %(company_id)s
+                    AND l.parent_state = 'posted'
+                    AND l.date <= %(date)s
+                    AND (%(previous_date)s IS NULL OR l.date > %(previous_date)s)
+            ) balances
+            GROUP BY account_id, journal_id
+        """, {
+            'uid': self.env.uid,
+            'date': date,
+            'company_id': company.id,
+            'previous_date': previous_date,
+        })
+
+    @api.model
+    def _cron_refresh_snapshots(self):
+        """ Build the missing snapshots of every company.
+
+        The snapshots of a company are built holding its lock, taken before
+        the transaction reading the journal items starts: the builds wait
+        for the invalidating transactions to commit, and see their moves."""
+        cr = self.env.cr
+        testing = getattr(threading.current_thread(), 'testing', False)
+        for company in self.env['res.company'].search([]):
+            cr.execute("SELECT pg_advisory_lock(%s, %s)", (SNAPSHOT_LOCK, company.id))
+            try:
+                if not testing:
+                    cr.commit()
+                cr.execute("""SELECT DISTINCT date FROM account_balance_snapshot
+                              WHERE company_id = %s""", (company.id,))
+                existing = {row[0] for row in cr.fetchall()}
+                for date in self._get_snapshot_dates(company):
+                    if date not in existing:
+                        self._build_snapshot(company, date)
+                if not testing:
+                    cr.commit()
+            finally:
+                cr.execute("SELECT pg_advisory_unlock(%s, %s)", (SNAPSHOT_LOCK, company.id))
+
+    @api.model
+    def _invalidate_snapshots(self, moves):
+        """ Drop the snapshots covering the date of any of the given moves,
+        they no longer match the posted journal items.
+
+        The companies stay locked until the moves are committed, so that no
+        snapshot is built without them. The snapshots built since the
+        current transaction started are not visible to it, they are dropped
+        once it is committed."""
+        if not moves:
+            return
+        # Only the items dated before the current fiscal year can be in a
+        # snapshot, the others leave the snapshots as they are
+        today = fields.Date.context_today(self)
+        companies = moves.filtered(lambda move: move.date < move.company_id.compute_fiscalyear_dates(
+            today)['date_from']).company_id
+        if not companies:
+            return
+        self._lock_companies(companies.ids)
+        self.env.cr.execute("""SELECT company_id, MIN(date) FROM account_move
+                               WHERE id IN %s GROUP BY company_id""", (tuple(moves.ids),))
+        dates = self.env.cr.fetchall()
+        query = """DELETE FROM account_balance_snapshot s
+                   USING unnest(%s::int[], %s::date[]) AS m (company_id, date)
+                   WHERE s.company_id = m.company_id AND s.date >= m.date"""
+        params = ([company_id for company_id, date in dates], [date for company_id, date in dates])
+        self.env.cr.execute(query, params)
+        registry = self.env.registry
+
+        @self.env.cr.postcommit.add
+        def invalidate():
+            with registry.cursor() as cr:
+                cr.execute(query, params)
+
+    @api.model
+    def _get_opening_query(self, date_from, target_move, company_ids,
+                           journal_ids=None, account_ids=None, groupby=('account_id',)):
+        """ Query returning the debit, credit and balance of the journal items
+        dated before ``date_from``, grouped by the ``groupby`` columns among
+        account_id and journal_id.
+
+        The posted part is read from the last snapshot of each company
+        before ``date_from`` plus the items posted after it, while draft
+        items, when requested, are always read from the journal items.
+        Returns the query and its parameters so that it can be used as a
+        subquery by the reports."""
+        states = ['posted'] if target_move == 'posted' else ['draft', 'posted']
+        snapshot_filter = ""
+        snapshot_params = ()
+        line_filter = ""
+        line_params = ()
+        if journal_ids:
+            snapshot_filter += " AND s.journal_id = ANY(%s)"
+            snapshot_params += (list(journal_ids),)
+            line_filter += " AND l.journal_id = ANY(%s)"
+            line_params += (list(journal_ids),)
+        if account_ids:
+            snapshot_filter += " AND s.account_id = ANY(%s)"
+            snapshot_params += (list(account_ids),)
+            line_filter += " AND l.account_id = ANY(%s)"
+            line_params += (list(account_ids),)
+        last_query = """SELECT company_id, MAX(date) AS date
+                        FROM account_balance_snapshot
+                        WHERE date < %s AND company_id = ANY(%s)
+                        GROUP BY company_id"""
+        last_params = (date_from, list(company_ids))
+        groupby = ", ".join(groupby)
+        query = """
+            SELECT """ + groupby + """,
+                   COALESCE(SUM(debit), 0) AS debit,
+                   COALESCE(SUM(credit), 0) AS credit,
+                   COALESCE(SUM(balance), 0) AS balance
+            FROM (
+                SELECT s.account_id, s.journal_id, s.debit, s.credit, s.balance
+                FROM account_balance_snapshot s
+                    JOIN (""" + last_query + """) last
+                        ON (last.company_id = s.company_id AND last.date = s.date)
+                WHERE TRUE""" + snapshot_filter + """
+                UNION ALL
+                SELECT l.account_id, l.journal_id, l.debit, l.credit, l.balance
+                FROM account_move_line l
+                    LEFT JOIN (""" + last_query + """) last
+                        ON (last.company_id = l.company_id)
+                WHERE l.company_id = ANY(%s)
+                    AND l.date < %s
+                    AND l.parent_state = ANY(%s)
+                    AND (l.parent_state != 'posted' OR last.date IS NULL
+                         OR l.date > last.date)""" + line_filter + """
+            ) opening
+            GROUP BY """ + groupby
+        params = last_params + snapshot_params + last_params + (
+            list(company_ids), date_from, states) + line_params
+        return query, params
+
+    @api.model
+    def _get_opening_balances(self, date_from, target_move, company_ids,
+                              journal_ids=None, account_ids=None):
+        """ Debit, credit and balance before ``date_from`` by account id."""
+        query, params = self._get_opening_query(
+            date_from, target_move, company_ids, journal_ids, account_ids)
+        self.env.cr.execute(query, params)
+        return {row.pop('account_id'): row for row in self.env.cr.dictfetchall()}
+
+    @api.model
+    def _get_unallocated_earnings(self, date, target_move, company_ids, journal_ids=None):
+        """ Balance of the income and expense accounts before ``date``, i.e.
+        the earnings not yet allocated to the retained earnings account.
+
+        It is shared by the Trial Balance and the Balance Sheet, and memoized
+        by (companies, date, target move, journals) until journal items are
+        posted or reset. Draft items are not memoized, as they change without
+        being posted."""
+        def compute():
+            query, params = self._get_opening_query(
+                date, target_move, company_ids, journal_ids)
+            self.env.cr.execute("""
+                SELECT COALESCE(SUM(o.balance), 0)
+                FROM (""" + query + """) o
+                    JOIN account_account a ON (a.id = o.account_id)
+                    JOIN account_account_type t ON (t.id = a.user_type_id)
+                WHERE t.internal_group IN ('income', 'expense')""", params)
+            return self.env.cr.fetchone()[0]
+
+        if target_move != 'posted':
+            return compute()
+        return self.env['dynamic.report.cache']._memoize([
+            'unallocated_earnings', sorted(company_ids), date, target_move,
+            sorted(journal_ids or []),
+        ], compute)
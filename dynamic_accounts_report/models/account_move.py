@@ -0,0 +1,23 @@
+from odoo import models
+
+
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    def _post(self, soft=True):
+        posted = super(AccountMove, self)._post(soft)
+        self.env['account.balance.snapshot']._invalidate_snapshots(posted)
+        self.env['dynamic.report.cache']._invalidate()
+        return posted
+
+    def button_draft(self):
+        self.env['account.balance.snapshot']._invalidate_snapshots(
+            self.filtered(lambda move: move.state == 'posted'))
+        self.env['dynamic.report.cache']._invalidate()
+        return super(AccountMove, self).button_draft()
+
+    def button_cancel(self):
+        self.env['account.balance.snapshot']._invalidate_snapshots(
+            self.filtered(lambda move: move.state == 'posted'))
+        self.env['dynamic.report.cache']._invalidate()
+        return super(AccountMove, self).button_cancel()
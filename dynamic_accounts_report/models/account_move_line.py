@@ -0,0 +1,137 @@
+import json
+import logging
+
+import psycopg2
+
+from odoo import fields, models, api
+
+_logger = logging.getLogger(__name__)
+
+# Tables below this estimated number of rows may be sequentially scanned.
+SEQ_SCAN_THRESHOLD = 10000
+
+REPORT_INDEXES = [
+    ('account_move_line_dar_posted_account_date_index',
+     'account_move_line', '(account_id, date)', "parent_state = 'posted'"),
+    ('account_move_line_dar_partner_account_date_index',
+     'account_move_line', '(partner_id, account_id, date)', None),
+    ('account_move_line_dar_company_date_index',
+     'account_move_line', '(company_id, date)', None),
+    ('account_move_line_dar_open_partner_account_date_index',
+     'account_move_line', '(partner_id, account_id, date)', "NOT reconciled"),
+]
+
+# Trigram indexes of the texts searched from the General Ledger, used when
+# the pg_trgm extension is available.
+TRGM_INDEXES = [
+    ('account_move_line_dar_name_trgm_index', 'account_move_line', 'name'),
+    ('account_move_line_dar_ref_trgm_index', 'account_move_line', 'ref'),
+    ('account_move_dar_name_trgm_index', 'account_move', 'name'),
+    ('res_partner_dar_name_trgm_index', 'res_partner', 'name'),
+]
+
+
+class AccountMoveLine(models.Model):
+    _inherit = 'account.move.line'
+
+    def init(self):
+        super(AccountMoveLine, self).init()
+        for name, table, columns, where in REPORT_INDEXES:
+            query = "CREATE INDEX IF NOT EXISTS %s ON %s %s" % (name, table, columns)
+            if where:
+                query += " WHERE %s" % where
+            self.env.cr.execute(query)
+        self._create_trgm_indexes()
+
+    def _create_trgm_indexes(self):
+        """ Create the trigram indexes of the ledger search. Creating the
+        pg_trgm extension requires the rights to do so, without them the
+        search works through sequential scans only."""
+        cr = self.env.cr
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except psycopg2.Error:
+            _logger.warning("The pg_trgm extension could not be created, "
+                            "the ledger search will not be indexed.")
+            return
+        for name, table, column in TRGM_INDEXES:
+            cr.execute("CREATE INDEX IF NOT EXISTS %s ON %s USING gin (%s gin_trgm_ops)"
+                       % (name, table, column))
+
+    @api.model
+    def _get_report_canonical_queries(self):
+        """ Representative queries of the reports, built by the reports
+        themselves, with parameters taken from the current database."""
+        cr = self.env.cr
+        cr.execute("""SELECT account_id, partner_id, date FROM account_move_line
+                      WHERE partner_id IS NOT NULL AND parent_state = 'posted'
+                      ORDER BY id DESC LIMIT 1""")
+        row = cr.fetchone()
+        if not row:
+            return {}
+        account_id, partner_id, date_to = row
+        date_from = fields.Date.start_of(date_to, 'year')
+        companies = self.env.companies
+        account = self.env['account.account'].browse(account_id)
+        accounts = self.env['account.account'].search([('company_id', 'in', companies.ids)])
+        journals = self.env['account.journal'].search([('company_id', 'in', companies.ids)])
+        data = {
+            'target_move': 'posted',
+            'journals': self.env['account.journal'],
+            'display_account': 'movement',
+            'date_from': date_from,
+            'date_to': date_to,
+        }
+        ledger = self.env['account.general.ledger']
+        init_query, init_params = ledger._get_ledger_init_query(account, data)
+        line_query, line_params = ledger._get_ledger_line_query(account, data, date_from, date_to)
+        partner_ledger = self.env['account.partner.ledger'].new({
+            'target_move': 'posted',
+            'date_from': date_from,
+            'date_to': date_to,
+            'partner_ids': [(6, 0, [partner_id])],
+        })
+        return {
+            'General Ledger': (
+                ledger._get_ledger_window_query(init_query + " UNION ALL " + line_query),
+                init_params + line_params),
+            'Initial Balance': self.env['account.balance.snapshot']._get_opening_query(
+                date_from, 'posted', companies.ids, account_ids=account.ids),
+            'Trial Balance': self.env['account.trial.balance']._get_accounts_query(
+                accounts, 'movement', data),
+            'Balance Sheet': self.env['dynamic.balance.sheet.report']._get_accounts_query(
+                accounts, data, 1, accounts.filtered('ret_earning_account')[:1]),
+            'Partner Ledger': partner_ledger._get_summary_page_query(),
+            'Partner Ageing': self.env['account.partner.ageing']._get_ageing_query(
+                data, None, date_to, 'posted', ['receivable'], 30),
+            'Day Book': self.env['account.day.book']._get_account_move_entry_query(
+                accounts, data, journals, date_to),
+        }
+
+    @api.model
+    def _verify_report_query_plans(self, threshold=SEQ_SCAN_THRESHOLD):
+        """ Run EXPLAIN on the canonical report queries and return the
+        sequential scans on tables larger than ``threshold`` rows, as a list
+        of (report, table, estimated rows)."""
+        cr = self.env.cr
+        issues = []
+        for report, (query, params) in self._get_report_canonical_queries().items():
+            cr.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cr.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            nodes = [plan[0]['Plan']]
+            while nodes:
+                node = nodes.pop()
+                nodes.extend(node.get('Plans', []))
+                if node['Node Type'] != 'Seq Scan':
+                    continue
+                cr.execute("SELECT reltuples FROM pg_class WHERE relname = %s",
+                           (node['Relation Name'],))
+                rows = cr.fetchone()[0]
+                if rows > threshold:
+                    issues.append((report, node['Relation Name'], int(rows)))
+        for report, table, rows in issues:
+            _logger.warning("%s: sequential scan on %s (~%s rows)", report, table, rows)
+        return issues
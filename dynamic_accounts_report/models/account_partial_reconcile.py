@@ -0,0 +1,15 @@
+from odoo import models, api
+
+
+class AccountPartialReconcile(models.Model):
+    _inherit = 'account.partial.reconcile'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        partials = super(AccountPartialReconcile, self).create(vals_list)
+        self.env['dynamic.report.cache']._invalidate()
+        return partials
+
+    def unlink(self):
+        self.env['dynamic.report.cache']._invalidate()
+        return super(AccountPartialReconcile, self).unlink()
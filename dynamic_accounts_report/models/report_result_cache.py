@@ -0,0 +1,136 @@
+import json
+import threading
+from collections import OrderedDict
+
+from odoo import models, api
+from odoo.tools import config, date_utils
+
+# Memory budget of the cached report results of a worker, in bytes.
+CACHE_SIZE = int(config.get('dynamic_report_cache_size', 64 * 1024 * 1024))
+
+
+class ReportResultLRU(object):
+    """ Least recently used report results, bounded by the total size of
+    their JSON encoding."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_size:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_size:
+                self.size -= len(self.entries.popitem(last=False)[1])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+results = ReportResultLRU(CACHE_SIZE)
+
+
+class ReportResultCache(models.AbstractModel):
+    _name = 'dynamic.report.cache'
+    _description = 'Dynamic Report Result Cache'
+
+    def init(self):
+        self.env.cr.execute("""CREATE SEQUENCE IF NOT EXISTS dynamic_report_cache_sequence""")
+
+    def _get_generation(self):
+        """ Current generation of the cache, shared by all the workers through
+        a sequence so that an invalidation in one worker reaches them all."""
+        self.env.cr.execute("SELECT last_value FROM dynamic_report_cache_sequence")
+        return self.env.cr.fetchone()[0]
+
+    def _get_filters(self, record):
+        """ Normalized values of the stored fields of a report wizard."""
+        filters = {}
+        for name, field in record._fields.items():
+            if not field.store or name in models.MAGIC_COLUMNS:
+                continue
+            value = record[name]
+            if field.relational:
+                value = sorted(value.ids)
+            filters[name] = value
+        return filters
+
+    @api.model
+    def _get_or_compute(self, record, method, args, compute):
+        """ Return the result of ``method`` of the report wizard ``record``
+        called with ``args``, computing it with ``compute`` when it is not
+        cached yet.
+
+        Results of reports including draft entries are not cached, as draft
+        entries change without being posted."""
+        if 'target_move' in record._fields and record.target_move != 'posted':
+            return compute()
+        return self._memoize(self._get_key(record, method, args), compute)
+
+    @api.model
+    def _get_cached(self, record, method, args):
+        """ Return the result of ``method`` of the report wizard ``record``
+        called with ``args`` if it is cached, None otherwise."""
+        if 'target_move' in record._fields and record.target_move != 'posted':
+            return None
+        value = results.get(self._dump_key(self._get_key(record, method, args)))
+        return value and json.loads(value)
+
+    def _get_key(self, record, method, args):
+        """ Cache key of the result of ``method`` of the report wizard
+        ``record`` called with ``args``."""
+        return [
+            record._name, method, args, self._get_filters(record),
+            self.env.uid, sorted(self.env.companies.ids),
+            self.env.context.get('lang'),
+        ]
+
+    def _dump_key(self, key):
+        """ Serialized ``key``, along with the database and the generation
+        of the cache, the results being shared by the databases of the
+        worker."""
+        return json.dumps(key + [self.env.cr.dbname, self._get_generation()], sort_keys=True,
+                          default=date_utils.json_default)
+
+    @api.model
+    def _memoize(self, key, compute):
+        """ Return the value cached for ``key``, a JSON serializable list,
+        computing it with ``compute`` when it is not cached yet. The value
+        is dropped along with the report results, when journal items are
+        posted or reset."""
+        key = self._dump_key(key)
+        value = results.get(key)
+        if value is None:
+            value = json.dumps(compute(), default=date_utils.json_default)
+            results.set(key, value)
+        return json.loads(value)
+
+    @api.model
+    def _invalidate(self):
+        """ Drop the cached results of all the workers, now and once the
+        current transaction is committed."""
+        results.clear()
+        self.env.cr.execute("SELECT nextval('dynamic_report_cache_sequence')")
+        registry = self.env.registry
+
+        @self.env.cr.postcommit.add
+        def invalidate():
+            results.clear()
+            with registry.cursor() as cr:
+                cr.execute("SELECT nextval('dynamic_report_cache_sequence')")
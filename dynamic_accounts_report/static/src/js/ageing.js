@@ -81,39 +81,24 @@ odoo.define('dynamic_accounts_report.ageing', function (require) {
                                     self.$('.filter_view_tb').html(QWeb.render('AgeingFilterView', {
                                         filter_data: datas['filters'],
                                     }));
-                                    self._rpc({
+                                    self.$el.find('.partners').select2({
+                                        placeholder: 'Partners...',
+                                        multiple: true,
+                                        // Partners are searched on the server, one page at a time
+                                        query: function(q) {
+                                            self._rpc({
                                                 model: 'account.partner.ageing',
                                                 method: 'get_partners',
-                                                //args: [[this.wizard_id]],
-                                            }).then(function(datas) {
-                                                self.$el.find('.partners').select2({
-                                                    placeholder: 'Partners...',
-                                                    multiple: true,
-                                                    data: datas,
-                                                    query: function(q) {
-                                                              var pageSize,
-                                                                results,
-                                                                that = this;
-                                                              pageSize = 20; // or whatever pagesize
-                                                              results = [];
-                                                              if (q.term && q.term !== '') {
-                                                                // HEADS UP; for the _.filter function i use underscore (actually lo-dash) here
-                                                                results = _.filter(that.data, function(e) {
-                                                                  return e.text.toUpperCase().indexOf(q.term.toUpperCase()) >= 0;
-                                                                });
-                                                              } else if (q.term === '') {
-                                                                results = that.data;
-                                                              }
-                                                              q.callback({
-                                                                results: results.slice((q.page - 1) * pageSize, q.page * pageSize),
-                                                                more: results.length >= q.page * pageSize,
-                                                              });
-                                                            },
-                                                    /*query: function(q) {
-                                                        alert(q);
-                                                        },*/
-                                            });
+                                                args: [q.term || '', q.page,
+                                                       self.$('#partner_rollup').is(':checked')],
+                                            }).then(function(res) {
+                                                q.callback(res);
                                             });
+                                        },
+                                    });
+                                    self.$el.find('.partners').select2('data', _.map(datas['filters']['partners_list'], function(partner) {
+                                        return {id: partner[0], text: partner[1]};
+                                    }));
                                     self.$el.find('.category').select2({
                                         placeholder: ' Partner Category...',
                                     });
@@ -303,6 +288,7 @@ odoo.define('dynamic_accounts_report.ageing', function (require) {
                     $(event.currentTarget).next('tr').find('td ul').after(
                         QWeb.render('SubSectional', {
                             account_data: data['report_lines'][0][i]['child_lines'],
+                            rollup: data['filters']['partner_rollup'],
                         }))
                     $(event.currentTarget).next('tr').find('td ul li:first a').css({
                         'background-color': '#00ede8',
@@ -417,6 +403,8 @@ odoo.define('dynamic_accounts_report.ageing', function (require) {
               }
             }
 
+            filter_data_selected.partner_rollup = $("#partner_rollup").is(':checked');
+
             if ($(".result_selection").length) {
             var account_res = document.getElementById("account_res")
             filter_data_selected.result_selection = $(".result_selection")[1].value
@@ -20,6 +20,10 @@ odoo.define('dynamic_cash_flow_statements.general_ledger', function (require) {
             'click #pdf': 'print_pdf',
             'click #xlsx': 'print_xlsx',
             'click .gl-line': 'show_drop_down',
+            'click .gl-load-more': 'load_more_lines',
+            'click #gl_search': 'search_lines',
+            'keypress .gl-search-input': 'search_lines_on_enter',
+            'click .gl-search-more': 'load_more_search',
             'click .view-account-move': 'view_acc_move',
         },
 
@@ -28,6 +32,7 @@ odoo.define('dynamic_cash_flow_statements.general_ledger', function (require) {
                 this.currency=action.currency;
                 this.report_lines = action.report_lines;
                 this.wizard_id = action.context.wizard | null;
+                this.gl_cursors = {};
             },
 
 
@@ -81,7 +86,13 @@ odoo.define('dynamic_cash_flow_statements.general_ledger', function (require) {
                             if (rep_lines.balance){
                                 rep_lines.balance = self.format_currency(datas['currency'],rep_lines.balance);
                             }
+                            _.each(rep_lines.move_lines, function(move_line) {
+                                self.format_move_line(datas['currency'], move_line);
                             });
+                            });
+                            self.report_lines = datas['report_lines'];
+                            self.currency = datas['currency'];
+                            self.journal_sections = datas['journal_sections'];
                             if (initial_render) {
                                     self.$('.filter_view_tb').html(QWeb.render('GLFilterView', {
                                         filter_data: datas['filters'],
@@ -258,40 +269,15 @@ odoo.define('dynamic_cash_flow_statements.general_ledger', function (require) {
             event.preventDefault();
             var self = this;
             var account_id = $(event.currentTarget).data('account-id');
-            var offset = 0;
             var td = $(event.currentTarget).next('tr').find('td');
             if (td.length == 1) {
-                    var action_title = self._title
-                    self._rpc({
-                        model: 'account.general.ledger',
-                        method: 'view_report',
-                        args: [
-                            [self.wizard_id], action_title, account_id, false
-                        ],
-                    }).then(function(data) {
-                    _.each(data['report_lines'], function(rep_lines) {
-                            _.each(rep_lines['move_lines'], function(move_line) {
-
-                            if (move_line.debit){
-                                move_line.debit = self.format_currency(data['currency'],move_line.debit);
-                            }
-                            if (move_line.credit){
-                                move_line.credit = self.format_currency(data['currency'],move_line.credit);
-                            }
-                            if (move_line.balance){
-                                move_line.balance = self.format_currency(data['currency'],move_line.balance);
-                            }
-                             });
-                             });
-
-                    for (var i = 0; i < data['report_lines'].length; i++) {
-
-                    if (account_id == data['report_lines'][i]['id'] ){
-
+                    self.get_account_lines(account_id, false).then(function(data) {
                     $(event.currentTarget).next('tr').find('td .gl-table-div').remove();
                     $(event.currentTarget).next('tr').find('td ul').after(
                         QWeb.render('SubSection', {
-                            account_data: data['report_lines'][i]['move_lines'],
+                            account_data: data['move_lines'],
+                            account_id: account_id,
+                            cursor: data['cursor'],
                             currency_symbol : data.currency[0],
                             currency_position : data.currency[1],
 
@@ -300,13 +286,121 @@ odoo.define('dynamic_cash_flow_statements.general_ledger', function (require) {
                         'background-color': '#00ede8',
                         'font-weight': 'bold',
                     });
-                     }
-                    }
-
                     });
             }
         },
 
+        load_more_lines: function(event) {
+            event.preventDefault();
+            var self = this;
+            var button = $(event.currentTarget);
+            var account_id = button.data('account-id');
+            var div = button.closest('.gl-table-div');
+            self.get_account_lines(account_id, self.gl_cursors[account_id]).then(function(data) {
+                div.find('tbody').append(
+                    QWeb.render('SubSectionLines', {
+                        account_data: data['move_lines'],
+                        currency_symbol : data.currency[0],
+                        currency_position : data.currency[1],
+                    }))
+                if (!data['cursor']) {
+                    button.parent().remove();
+                }
+            });
+        },
+
+        search_lines_on_enter: function(event) {
+            if (event.which === 13) {
+                this.search_lines(event);
+            }
+        },
+
+        search_lines: function(event) {
+            event.preventDefault();
+            var self = this;
+            self.search_term = self.$('.gl-search-input').val();
+            if (!self.search_term) {
+                self.$('.gl_search_view').empty();
+                return;
+            }
+            self.fetch_search_lines(false).then(function(data) {
+                self.$('.gl_search_view').html(QWeb.render('GLSearchResults', {
+                    account_data: data['move_lines'],
+                    cursor: data['cursor'],
+                }));
+            });
+        },
+
+        load_more_search: function(event) {
+            event.preventDefault();
+            var self = this;
+            var button = $(event.currentTarget);
+            self.fetch_search_lines(self.search_cursor).then(function(data) {
+                self.$('.gl-search-div tbody').append(QWeb.render('GLSearchLines', {
+                    account_data: data['move_lines'],
+                }));
+                if (!data['cursor']) {
+                    button.parent().remove();
+                }
+            });
+        },
+
+        fetch_search_lines: function(cursor) {
+            var self = this;
+            return self._rpc({
+                model: 'account.general.ledger',
+                method: 'search_lines',
+                args: [
+                    self.wizard_id, self.search_term, cursor
+                ],
+            }).then(function(data) {
+                self.search_cursor = data['cursor'];
+                _.each(data['move_lines'], function(move_line) {
+                    self.format_move_line(data['currency'], move_line);
+                });
+                return data;
+            });
+        },
+
+        get_account_lines: function(account_id, cursor) {
+            var self = this;
+            if (self.journal_sections) {
+                // Bank and Cash Book sections come with all their lines
+                var section = _.findWhere(self.report_lines, {id: account_id});
+                return Promise.resolve({
+                    account_id: account_id,
+                    move_lines: section ? section.move_lines : [],
+                    cursor: false,
+                    currency: self.currency,
+                });
+            }
+            return self._rpc({
+                model: 'account.general.ledger',
+                method: 'get_account_lines',
+                args: [
+                    self.wizard_id, account_id, cursor
+                ],
+            }).then(function(data) {
+                self.gl_cursors[account_id] = data['cursor'];
+                _.each(data['move_lines'], function(move_line) {
+                    self.format_move_line(data['currency'], move_line);
+                });
+                return data;
+            });
+        },
+
+        format_move_line: function(currency, move_line) {
+            if (move_line.debit){
+                move_line.debit = this.format_currency(currency,move_line.debit);
+            }
+            if (move_line.credit){
+                move_line.credit = this.format_currency(currency,move_line.credit);
+            }
+            if (move_line.balance){
+                move_line.balance = this.format_currency(currency,move_line.balance);
+            }
+        },
+
         view_acc_move: function(event) {
             event.preventDefault();
             var self = this;
@@ -435,6 +529,8 @@ odoo.define('dynamic_cash_flow_statements.general_ledger', function (require) {
                 filter_data_selected.date_to = dateString;
             }
 
+            filter_data_selected.partner_subtotals = $("#partner_subtotals").is(':checked');
+
             if ($(".target_move").length) {
             var post_res = document.getElementById("post_res")
             filter_data_selected.target_move = $(".target_move")[1].value
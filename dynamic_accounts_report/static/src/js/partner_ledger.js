@@ -20,6 +20,7 @@ odoo.define('dynamic_accounts_report.partner_ledger', function (require) {
             'click #pdf': 'print_pdf',
             'click #xlsx': 'print_xlsx',
             'click .pl-line': 'show_drop_down',
+            'click .pl-sort': 'sort_lines',
             'click .view-account-move': 'view_acc_move',
 
         },
@@ -29,6 +30,8 @@ odoo.define('dynamic_accounts_report.partner_ledger', function (require) {
                 this.currency=action.currency;
                 this.report_lines = action.report_lines;
                 this.wizard_id = action.context.wizard | null;
+                this.pl_sort = 'name';
+                this.pl_cursor = false;
             },
 
          start: function() {
@@ -53,17 +56,11 @@ odoo.define('dynamic_accounts_report.partner_ledger', function (require) {
                     self._rpc({
                         model: 'account.partner.ledger',
                         method: 'view_report',
-                        args: [[this.wizard_id]],
+                        args: [[this.wizard_id], self.pl_sort, true],
                     }).then(function(datas) {
-                            _.each(datas['report_lines'], function(rep_lines) {
-                            rep_lines.debit = self.format_currency(datas['currency'],rep_lines.debit);
-                            rep_lines.credit = self.format_currency(datas['currency'],rep_lines.credit);
-                            rep_lines.balance = self.format_currency(datas['currency'],rep_lines.balance);
-
-
-
-
-                            });
+                            self.currency = datas['currency'];
+                            self.pl_cursor = datas['cursor'];
+                            self.format_lines(datas['report_lines']);
 
 
 
@@ -78,39 +75,24 @@ odoo.define('dynamic_accounts_report.partner_ledger', function (require) {
                             self.$el.find('.account').select2({
                                 placeholder: ' Accounts...',
                             });
-                            self._rpc({
-                                    model: 'account.partner.ledger',
-                                    method: 'get_partners',
-                                    //args: [[this.wizard_id]],
-                                }).then(function(datas) {
-                                    self.$el.find('.partners').select2({
-                                        placeholder: 'Partners...',
-                                        multiple: true,
-                                        data: datas,
-                                        query: function(q) {
-                                                  var pageSize,
-                                                    results,
-                                                    that = this;
-                                                  pageSize = 20; // or whatever pagesize
-                                                  results = [];
-                                                  if (q.term && q.term !== '') {
-                                                    // HEADS UP; for the _.filter function i use underscore (actually lo-dash) here
-                                                    results = _.filter(that.data, function(e) {
-                                                      return e.text.toUpperCase().indexOf(q.term.toUpperCase()) >= 0;
-                                                    });
-                                                  } else if (q.term === '') {
-                                                    results = that.data;
-                                                  }
-                                                  q.callback({
-                                                    results: results.slice((q.page - 1) * pageSize, q.page * pageSize),
-                                                    more: results.length >= q.page * pageSize,
-                                                  });
-                                                },
-                                        /*query: function(q) {
-                                            alert(q);
-                                            },*/
-                                });
-                                });
+                            self.$el.find('.partners').select2({
+                                placeholder: 'Partners...',
+                                multiple: true,
+                                // Partners are searched on the server, one page at a time
+                                query: function(q) {
+                                    self._rpc({
+                                        model: 'account.partner.ledger',
+                                        method: 'get_partners',
+                                        args: [q.term || '', q.page,
+                                               self.$('#partner_rollup').is(':checked')],
+                                    }).then(function(res) {
+                                        q.callback(res);
+                                    });
+                                },
+                            });
+                            self.$el.find('.partners').select2('data', _.map(datas['filters']['partners_list'], function(partner) {
+                                return {id: partner[0], text: partner[1]};
+                            }));
                             /*self.$el.find('.partners').select2({
                             placeholder: 'Partners...',
                             query: function(q) {
@@ -153,12 +135,15 @@ odoo.define('dynamic_accounts_report.partner_ledger', function (require) {
 
                         self.$('.table_view_tb').html(QWeb.render('PLTable', {
                             report_lines : datas['report_lines'],
+                            sort : datas['sort'],
                             filter : datas['filters'],
                             currency : datas['currency'],
                             credit_total : datas['credit_total'],
                             debit_total : datas['debit_total'],
                             debit_balance : datas['debit_balance']
                         }));
+                        self.$el.closest('.o_content').off('scroll.pl_summary').on(
+                            'scroll.pl_summary', _.throttle(self.load_more_lines.bind(self), 200));
                     });
 
                 }
@@ -196,7 +181,7 @@ odoo.define('dynamic_accounts_report.partner_ledger', function (require) {
                 model: 'account.partner.ledger',
                 method: 'view_report',
                 args: [
-                    [self.wizard_id]
+                    [self.wizard_id], self.pl_sort, false
                 ],
             }).then(function(data) {
                 var action = {
@@ -227,7 +212,7 @@ odoo.define('dynamic_accounts_report.partner_ledger', function (require) {
                 model: 'account.partner.ledger',
                 method: 'view_report',
                 args: [
-                    [self.wizard_id]
+                    [self.wizard_id], self.pl_sort, false
                 ],
             }).then(function(data) {
                 var action = {
@@ -263,6 +248,47 @@ odoo.define('dynamic_accounts_report.partner_ledger', function (require) {
             });
         },
 
+        format_lines: function(lines) {
+            var self = this;
+            _.each(lines, function(rep_lines) {
+                rep_lines.opening = self.format_currency(self.currency,rep_lines.opening);
+                rep_lines.debit = self.format_currency(self.currency,rep_lines.debit);
+                rep_lines.credit = self.format_currency(self.currency,rep_lines.credit);
+                rep_lines.balance = self.format_currency(self.currency,rep_lines.balance);
+            });
+        },
+
+        sort_lines: function(event) {
+            event.preventDefault();
+            this.pl_sort = $(event.currentTarget).data('sort');
+            this.load_data(false);
+        },
+
+        load_more_lines: function() {
+            var self = this;
+            var content = self.$el.closest('.o_content');
+            if (!self.pl_cursor || self.pl_loading ||
+                    content.scrollTop() + content.innerHeight() < content[0].scrollHeight - 200) {
+                return;
+            }
+            self.pl_loading = true;
+            self._rpc({
+                model: 'account.partner.ledger',
+                method: 'get_summary_page',
+                args: [self.wizard_id, self.pl_sort, self.pl_cursor],
+            }).then(function(datas) {
+                self.pl_loading = false;
+                self.pl_cursor = datas['cursor'];
+                self.format_lines(datas['report_lines']);
+                self.$('.table_view_tb tbody').first().append(QWeb.render('PLTableRows', {
+                    report_lines : datas['report_lines'],
+                    currency : self.currency,
+                }));
+            }).guardedCatch(function() {
+                self.pl_loading = false;
+            });
+        },
+
         show_drop_down: function(event) {
             event.preventDefault();
             var self = this;
@@ -280,9 +306,12 @@ odoo.define('dynamic_accounts_report.partner_ledger', function (require) {
                             rep_lines.credit = self.format_currency(data['currency'],rep_lines.credit);
                             rep_lines.balance = self.format_currency(data['currency'],rep_lines.balance);
                              });
+                             self.format_lines(data['contacts']);
                              $(event.currentTarget).next('tr').find('td ul').after(
                                 QWeb.render('SubSectionPL', {
                                     account_data: data['report_lines'],
+                                    contacts: data['contacts'],
+                                    currency: data['currency'],
                                 }))
                     /*for (var i = 0; i < data['report_lines'].length; i++) {
 
@@ -469,15 +498,14 @@ odoo.define('dynamic_accounts_report.partner_ledger', function (require) {
 
             if ($(".reconciled").length){
             var reconciled_res = document.getElementById("reconciled_res")
-            filter_data_selected.reconciled = $(".reconciled")[0].value
-            reconciled_res.value = $(".reconciled")[0].value
-            reconciled_res.innerHTML=reconciled_res.value;
-            if ($(".reconciled").value==""){
-                reconciled_res.innerHTML="unreconciled";
-                filter_data_selected.reconciled = "unreconciled"
-                }
+            var reconciled = $(".reconciled")[1].value
+            filter_data_selected.reconciled = reconciled == 'unreconciled' ? reconciled : 'all'
+            reconciled_res.value = reconciled
+            reconciled_res.innerHTML = $(".reconciled")[1].selectedOptions[0].text;
             }
 
+            filter_data_selected.partner_rollup = $("#partner_rollup").is(':checked');
+
             if ($(".target_move").length) {
             var post_res = document.getElementById("post_res")
             var target_move = $(".target_move")[1].value
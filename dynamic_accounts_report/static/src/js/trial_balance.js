@@ -19,6 +19,7 @@ odoo.define('dynamic_cash_flow_statements.trial', function (require) {
             'click #pdf': 'print_pdf',
             'click #xlsx': 'print_xlsx',
             'click .show-gl': 'show_gl',
+            'click .tb-group-line': 'toggle_group',
         },
 
         init: function(parent, action) {
@@ -55,17 +56,11 @@ odoo.define('dynamic_cash_flow_statements.trial', function (require) {
                         method: 'view_report',
                         args: [[this.wizard_id]],
                     }).then(function(datas) {
-                            _.each(datas['report_lines'], function(rep_lines) {
-                            rep_lines.debit = self.format_currency(datas['currency'],rep_lines.debit);
-                            rep_lines.credit = self.format_currency(datas['currency'],rep_lines.credit);
-                            rep_lines.balance = self.format_currency(datas['currency'],rep_lines.balance);
-                            rep_lines.Init_balance.debit = self.format_currency(datas['currency'],rep_lines.Init_balance.debit);
-                            rep_lines.Init_balance.credit = self.format_currency(datas['currency'],rep_lines.Init_balance.credit);
-                            rep_lines.Init_balance.balance = self.format_currency(datas['currency'],rep_lines.Init_balance.balance);
-                            rep_lines.closing_balance.debit = self.format_currency(datas['currency'],rep_lines.closing_balance.debit);
-                            rep_lines.closing_balance.credit = self.format_currency(datas['currency'],rep_lines.closing_balance.credit);
-
-
+                            self.currency = datas['currency'];
+                            // the groups are unfolded on demand
+                            var report_lines = datas['root_lines'] || datas['report_lines'];
+                            _.each(report_lines, function(rep_lines) {
+                                self.format_line(datas['currency'], rep_lines);
                             });
                             if (initial_render) {
                                     self.$('.filter_view_tb').html(QWeb.render('TrialFilterView', {
@@ -82,7 +77,8 @@ odoo.define('dynamic_cash_flow_statements.trial', function (require) {
 
                         self.$('.table_view_tb').html(QWeb.render('TrialTable', {
 
-                                            report_lines : datas['report_lines'],
+                                            report_lines : report_lines,
+                                            periods : datas['periods'],
                                             filter : datas['filters'],
                                             currency : datas['currency'],
                                             credit_total : self.format_currency(datas['currency'],datas['credit_total']),
@@ -100,6 +96,49 @@ odoo.define('dynamic_cash_flow_statements.trial', function (require) {
                     }
             },
 
+        format_line: function(currency, rep_lines) {
+            rep_lines.debit = this.format_currency(currency,rep_lines.debit);
+            rep_lines.credit = this.format_currency(currency,rep_lines.credit);
+            rep_lines.balance = this.format_currency(currency,rep_lines.balance);
+            rep_lines.Init_balance.debit = this.format_currency(currency,rep_lines.Init_balance.debit);
+            rep_lines.Init_balance.credit = this.format_currency(currency,rep_lines.Init_balance.credit);
+            rep_lines.Init_balance.balance = this.format_currency(currency,rep_lines.Init_balance.balance);
+            rep_lines.closing_balance.debit = this.format_currency(currency,rep_lines.closing_balance.debit);
+            rep_lines.closing_balance.credit = this.format_currency(currency,rep_lines.closing_balance.credit);
+            rep_lines.period_balances = _.map(rep_lines.period_balances, function(balance) {
+                return this.format_currency(currency, balance);
+            }, this);
+        },
+
+        toggle_group: function(event) {
+            event.preventDefault();
+            var self = this;
+            var row = $(event.currentTarget);
+            var key = row.data('key');
+            if (row.data('expanded')) {
+                self.$('tr[data-ancestors~="' + key + '"]').remove();
+                row.data('expanded', false);
+                row.find('.fa-caret-down').removeClass('fa-caret-down').addClass('fa-caret-right');
+                return;
+            }
+            row.data('expanded', true);
+            row.find('.fa-caret-right').removeClass('fa-caret-right').addClass('fa-caret-down');
+            self._rpc({
+                model: 'account.trial.balance',
+                method: 'get_group_lines',
+                args: [self.wizard_id, key],
+            }).then(function(lines) {
+                _.each(lines, function(line) {
+                    self.format_line(self.currency, line);
+                });
+                row.after(QWeb.render('TrialTableRows', {
+                    report_lines: lines,
+                    currency: self.currency,
+                    ancestors: ((row.attr('data-ancestors') || '') + ' ' + key).trim(),
+                }));
+            });
+        },
+
             show_gl: function(e) {
             var self = this;
             var account_id = $(e.target).attr('data-account-id');
@@ -243,6 +282,10 @@ odoo.define('dynamic_cash_flow_statements.trial', function (require) {
                 filter_data_selected.date_to = dateString;
             }
 
+            filter_data_selected.group_hierarchy = $("#group_hierarchy").is(':checked');
+            filter_data_selected.period_type = $("#period_type").val() || false;
+            filter_data_selected.consolidate = $("#consolidate").is(':checked');
+
             if ($(".target_move").length) {
             var post_res = document.getElementById("post_res")
             filter_data_selected.target_move = $(".target_move")[1].value
@@ -0,0 +1,35 @@
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+from ..wizard import trial_balance
+
+
+@tagged('post_install', '-at_install')
+class TestTrialBalanceConsolidation(common.TransactionCase):
+
+    def setUp(self):
+        super(TestTrialBalanceConsolidation, self).setUp()
+        company = self.env.company
+        other_company = self.env['res.company'].create({'name': 'Consolidated Company'})
+        self.env.user.company_ids |= other_company
+        self.env = self.env(context=dict(
+            self.env.context, allowed_company_ids=[company.id, other_company.id]))
+        self.wizard = self.env['account.trial.balance'].create({'consolidate': True})
+
+    def test_threaded_consolidation(self):
+        """ The companies computed by the worker threads give the same rows
+        as when computed one after the other on the current cursor."""
+        data = self.wizard._get_report_data()
+        self.assertTrue(data.get('consolidate'))
+        expected = self.wizard._get_consolidated_accounts(self.wizard.display_account, data)
+        # the worker cursors share the transaction of the test
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        with patch.object(type(self.registry), 'in_test_mode', lambda registry: False), \
+                patch.object(trial_balance, 'CONSOLIDATION_WORKERS', 4), \
+                patch.object(trial_balance, 'ThreadPoolExecutor',
+                             wraps=trial_balance.ThreadPoolExecutor) as executor:
+            result = self.wizard._get_consolidated_accounts(self.wizard.display_account, data)
+        executor.assert_called_once_with(max_workers=2)
+        self.assertEqual(result, expected)
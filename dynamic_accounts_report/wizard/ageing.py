@@ -1,9 +1,7 @@
 import time
 from datetime import datetime
 
-from dateutil.relativedelta import relativedelta
 from odoo import fields, models, api, _
-from odoo.tools import float_is_zero
 
 import io
 import json
@@ -13,6 +11,8 @@ try:
 except ImportError:
     import xlsxwriter
 
+from .report_filter import search_partners
+
 
 LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
@@ -44,19 +44,14 @@ class AgeingView(models.TransientModel):
     partner_category_ids = fields.Many2many(
         'res.partner.category', string='Partner Tag',
     )
+    partner_rollup = fields.Boolean(
+        string='Group by Commercial Entity',
+        help="Aggregate the journal items of the contacts on their commercial "
+             "entity, the company they belong to.")
 
     @api.model
-    def get_partners(self):
-        query = """SELECT
-                        rp.id as id,
-                        rp.name as text
-                    FROM
-                        res_partner rp
-                    WHERE
-                        rp.parent_id is null
-                        AND rp.active is true"""
-        self._cr.execute(query)
-        return self._cr.dictfetchall()
+    def get_partners(self, term='', page=1, commercial=False):
+        return search_partners(self.env, term, page, commercial)
 
     @api.model
     def view_report(self, option):
@@ -70,6 +65,7 @@ class AgeingView(models.TransientModel):
             'period_length': r.period_length,
             'partners': r.partner_ids,
             'partner_tags': r.partner_category_ids,
+            'partner_rollup': r.partner_rollup,
 
         }
         if r.date_from:
@@ -125,6 +121,7 @@ class AgeingView(models.TransientModel):
         filters['category_list'] = data.get('category_list')
         filters['company_name'] = data.get('company_name')
         filters['target_move'] = data.get('target_move').capitalize()
+        filters['partner_rollup'] = data.get('partner_rollup')
 
 
         return filters
@@ -134,8 +131,6 @@ class AgeingView(models.TransientModel):
         default_filters = {}
         company_id = self.env.company
         company_domain = [('company_id', '=', company_id.id)]
-        partner = r.partner_ids if r.partner_ids else self.env[
-            'res.partner'].search([])
         categories = r.partner_category_ids if r.partner_category_ids \
             else self.env['res.partner.category'].search([])
 
@@ -147,7 +142,8 @@ class AgeingView(models.TransientModel):
 
             'target_move': r.target_move,
             'result_selection': r.result_selection,
-            'partners_list': [(p.id, p.name) for p in partner],
+            'partner_rollup': r.partner_rollup,
+            'partners_list': [(p.id, p.name) for p in r.partner_ids],
             'category_list': [(c.id, c.name) for c in categories],
             'company_name': company_id and company_id.name,
         }
@@ -168,6 +164,10 @@ class AgeingView(models.TransientModel):
         if data['partner_tags']:
             partners = self.env['res.partner'].search(
                 [('category_id', 'in', data['partner_tags'].ids)])
+        if data.get('partner_rollup') and partners:
+            # Selected entities stand for all their contacts
+            partners = self.env['res.partner'].with_context(active_test=False).search(
+                [('commercial_partner_id', 'in', partners.commercial_partner_id.ids)])
 
         account_res = self._get_partner_move_lines(data, partners, date_from,
                                                    target_move,
@@ -209,450 +209,177 @@ class AgeingView(models.TransientModel):
     def _get_partner_move_lines(self, data, partners, date_from, target_move,
                                 account_type,
                                 period_length):
+        """ Aged balances of the partners as of ``date_from``.
 
-        periods = {}
-        start = datetime.strptime(date_from, "%Y-%m-%d")
-        date_from = datetime.strptime(date_from, "%Y-%m-%d").date()
-        for i in range(7)[::-1]:
-            if i in [6, 5, 4, 3]:
-                stop = start - relativedelta(days=period_length)
-                period_name = str((7 - (i + 1)) * period_length + 1) + '-' + str(
-                    (7 - i) * period_length)
-                if i == 6:
-                    period_stop = date_from
-                else:
-                    period_stop = (start - relativedelta(days=1)).strftime('%Y-%m-%d')
-            elif i == 2:
-                stop = start - relativedelta(days=60)
-                period_name = '121-180'
-                period_stop = (start - relativedelta(days=1)).strftime('%Y-%m-%d')
-            elif i == 1:
-                stop = start - relativedelta(days=185)
-                period_name = '181-365'
-                period_stop = (start - relativedelta(days=1)).strftime('%Y-%m-%d')
-            elif i in [0]:
-                stop = datetime.strptime('2000-01-01', '%Y-%m-%d')
-                period_stop = (start - relativedelta(days=1)).strftime('%Y-%m-%d')
-                period_name = '+365'
-            periods[str(i)] = {
-                'name': period_name,
-                'stop': period_stop,
-                'start': (i != 0 and stop.strftime('%Y-%m-%d') or False),
-            }
-            start = stop
-        res = []
-        total = []
-        cr = self.env.cr
-        user_company = self.env.company
+        The residual of every journal item as of ``date_from`` is computed by
+        a single query, from its balance and the partial reconciliations
+        dated up to ``date_from``, along with its period:
 
-        user_currency = user_company.currency_id
-        ResCurrency = self.env['res.currency'].with_context(date=date_from)
-        company_ids = self._context.get('company_ids') or [user_company.id]
-        move_state = ['draft', 'posted']
-        if target_move == 'posted':
-            move_state = ['posted']
-        arg_list = (tuple(move_state), tuple(account_type))
-
-        reconciliation_clause = '(l.reconciled IS FALSE)'
-        cr.execute(
-            'SELECT debit_move_id, credit_move_id FROM account_partial_reconcile where max_date > %s',
-            (date_from,))
-        reconciled_after_date = []
-        for row in cr.fetchall():
-            reconciled_after_date += [row[0], row[1]]
-        if reconciled_after_date:
-            reconciliation_clause = '(l.reconciled IS FALSE OR l.id IN %s)'
-            arg_list += (tuple(reconciled_after_date),)
-
-        arg_list += (date_from, tuple(company_ids),)
-        partner_list = '(l.partner_id IS NOT  NULL)'
-        if partners:
-            list = tuple(partners.ids) + tuple([0])
-            if list:
-                partner_list = '(l.partner_id IS NULL OR l.partner_id IN %s)'
-                arg_list += (tuple(list),)
-        query = '''
-                    SELECT DISTINCT l.partner_id, UPPER(res_partner.name)
-                    FROM account_move_line AS l left join res_partner on l.partner_id = res_partner.id, account_account, account_move am
-                    WHERE (l.account_id = account_account.id)
-                        AND (l.move_id = am.id)
-                        AND (am.state IN %s)
-                        AND (account_account.internal_type IN %s)
-                       
-                        AND ''' + reconciliation_clause + '''          
-                        AND (l.date <= %s)
-                        AND l.company_id IN %s
-                        AND ''' + partner_list + '''
-                           
-                    ORDER BY UPPER(res_partner.name)'''
-        cr.execute(query, arg_list)
+        * '6' to '3': up to 1, 2, 3 and 4 ``period_length`` days old,
+        * '2': up to 60 more days, '1': up to 185 more days, '0': older.
 
+        Only the items still open at that date are read: the unreconciled
+        ones and the ones reconciled afterwards. Negative residuals of
+        receivables and positive residuals of payables are reported as
+        unallocated. Returns the partner rows, the totals and the lines by
+        partner."""
+        cr = self.env.cr
+        cr.execute(*self._get_ageing_query(data, partners, date_from, target_move,
+                                            account_type, period_length))
 
-        partners = cr.dictfetchall()
-
-        # put a total of 0
-        for i in range(9):
-            total.append(0)
-
-        # Build a string like (1,2,3) for easy use in SQL query
-        partner_ids = [partner['partner_id'] for partner in partners if
-                       partner['partner_id']]
-
-        lines = dict(
-            (partner['partner_id'] or False, []) for partner in partners)
-        if not partner_ids:
-            return [], [], {}
-
-        # This dictionary will store the not due amount of all partners
-        undue_amounts = {}
-        undue_paid_amount = {}
-        query = '''SELECT l.id
-                        FROM account_move_line AS l, account_account, account_move am
-                        WHERE (l.account_id = account_account.id) AND (l.move_id = am.id)
-                            AND (am.state IN %s)
-                            AND (account_account.internal_type IN %s)
-                            AND (l.date >= %s)\
-                            AND ((l.partner_id IN %s) OR (l.partner_id IS NULL))
-                        AND (l.date <= %s)
-                        AND l.company_id IN %s'''
-        cr.execute(query, (
-            tuple(move_state), tuple(account_type), date_from,
-            tuple(partner_ids), date_from, tuple(company_ids)))
-        aml_ids = cr.fetchall()
-        aml_ids = aml_ids and [x[0] for x in aml_ids] or []
-        # for line in self.env['account.move.line'].browse(aml_ids):
-        #     partner_id = line.partner_id.id or False
-        #     move_id = line.move_id.id
-        #     move_name = line.move_id.name
-        #     date_maturity = line.date
-        #     account_id = line.account_id.name
-        #     account_code = line.account_id.code
-        #     jrnl_id = line.journal_id.name
-        #     currency_id = line.company_id.currency_id.position
-        #     currency_symbol = line.company_id.currency_id.symbol
-        #
-        #     if partner_id not in undue_amounts:
-        #         undue_amounts[partner_id] = 0.00
-        #     if partner_id not in undue_paid_amount:
-        #         undue_paid_amount[partner_id] = 0.00
-        #     line_amount = ResCurrency._compute(line.company_id.currency_id,
-        #                                        user_currency, line.balance)
-        #     if user_currency.is_zero(line_amount):
-        #         continue
-        #     for partial_line in line.matched_debit_ids:
-        #         if partial_line.max_date <= date_from and partial_line.debit_move_id.move_id.state == 'posted' and \
-        #                     partial_line.credit_move_id.move_id.state == 'posted':
-        #             line_amount += ResCurrency._compute(
-        #                 partial_line.company_id.currency_id, user_currency,
-        #                 partial_line.amount)
-        #     for partial_line in line.matched_credit_ids:
-        #         if partial_line.max_date <= date_from and partial_line.debit_move_id.move_id.state == 'posted' and \
-        #                     partial_line.credit_move_id.move_id.state == 'posted':
-        #             line_amount -= ResCurrency._compute(
-        #                 partial_line.company_id.currency_id, user_currency,
-        #                 partial_line.amount)
-        #     if not self.env.company.currency_id.is_zero(line_amount):
-        #         paid_amount = 0.00
-        #         invoice_amount = 0.00
-        #         if line.account_id.user_type_id.type == 'receivable':
-        #             if line_amount < 0.00:
-        #                 paid_amount += line_amount
-        #                 undue_paid_amount[partner_id] += line_amount
-        #             # else:
-        #             #     undue_amounts[partner_id] += line_amount
-        #         elif line.account_id.user_type_id.type == 'payable':
-        #             if line_amount > 0.00:
-        #                 paid_amount += line_amount
-        #                 undue_paid_amount[partner_id] += line_amount
-        #             # else:
-        #             #     undue_amounts[partner_id] += line_amount
-        #         if round(invoice_amount, 3) != 0.00 or round(paid_amount, 3) != 0.00:
-        #             lines[partner_id].append({
-        #                 'line': line,
-        #                 'partner_id': partner_id,
-        #                 'move': move_name,
-        #                 'jrnl': jrnl_id,
-        #                 'currency': currency_id,
-        #                 'symbol': currency_symbol,
-        #                 'acc_name': account_id,
-        #                 'mov_id': move_id,
-        #                 'acc_code': account_code,
-        #                 'date': date_maturity,
-        #                 'amount': invoice_amount,
-        #                 'paid_amount': paid_amount,
-        #                 'period7': 7,
-        #             })
-
-        # Use one query per period and store results in history (a list variable)
-        # Each history will contain: history[1] = {'<partner_id>': <partner_debit-credit>}
-        history = []
-        for i in range(7):
-            args_list = (
-                tuple(move_state), tuple(account_type), tuple(partner_ids),)
-            dates_query = '(l.date'
-
-            if periods[str(i)]['start'] and periods[str(i)]['stop']:
-                dates_query += ' BETWEEN %s AND %s)'
-
-                args_list += (
-                    periods[str(i)]['start'], periods[str(i)]['stop'])
-            elif periods[str(i)]['start']:
-                dates_query += ' >= %s)'
-
-                args_list += (periods[str(i)]['start'],)
+        res = []
+        total = [0.0] * 9
+        lines = {}
+        for row in cr.dictfetchall():
+            key = row['partner_id'] or False
+            if key not in lines:
+                lines[key] = []
+                values = dict((str(i), 0.0) for i in range(7))
+                values.update({
+                    'partner_id': key,
+                    'name': row['partner_name'],
+                    'direction': 0.00,
+                    'unalloc': 0.0,
+                    'child_lines': lines[key],
+                })
+                res.append(values)
+            residual = row['residual']
+            invoice_amount = paid_amount = 0.0
+            if (row['internal_type'] == 'receivable') == (residual < 0):
+                paid_amount = residual
             else:
-                dates_query += ' <= %s)'
-                args_list += (periods[str(i)]['stop'],)
-
-            args_list += (date_from, tuple(company_ids))
-
-            query = '''SELECT l.id
-                            FROM account_move_line AS l, account_account, account_move am
-                            WHERE (l.account_id = account_account.id) AND (l.move_id = am.id)
-                                AND (am.state IN %s)
-                                AND (account_account.internal_type IN %s)
-                                AND ((l.partner_id IN %s) OR (l.partner_id IS NULL))
-                                AND ''' + dates_query + '''
-                                
-                                
-                            AND (l.date <= %s)
-                            AND l.company_id IN %s'''
-            cr.execute(query, args_list)
-
-            partners_amount = {}
-            aml_ids = cr.fetchall()
-            aml_ids = aml_ids and [x[0] for x in aml_ids] or []
-            for line in self.env['account.move.line'].browse(aml_ids):
-                partner_id = line.partner_id.id or False
-                move_id = line.move_id.id
-                move_name = line.move_id.name
-                date_maturity = line.date.strftime("%d/%m/%Y")
-                account_id = line.account_id.name
-                account_code = line.account_id.code
-                jrnl_id = line.journal_id.name
-                currency_id = line.company_id.currency_id.position
-                currency_symbol = line.company_id.currency_id.symbol
-                if partner_id not in partners_amount:
-                    partners_amount[partner_id] = 0.0
-                if partner_id not in undue_paid_amount:
-                    undue_paid_amount[partner_id] = 0.00
-                line_amount = ResCurrency._compute(line.company_id.currency_id,
-                                                   user_currency, line.balance)
-                if user_currency.is_zero(line_amount):
-                    continue
-                for partial_line in line.matched_debit_ids:
-                    if partial_line.max_date <= date_from and partial_line.debit_move_id.move_id.state == 'posted' and \
-                            partial_line.credit_move_id.move_id.state == 'posted':
-                        line_amount += ResCurrency._compute(
-                            partial_line.company_id.currency_id, user_currency,
-                            partial_line.amount)
-                for partial_line in line.matched_credit_ids:
-                    if partial_line.max_date <= date_from and partial_line.debit_move_id.move_id.state == 'posted' and \
-                            partial_line.credit_move_id.move_id.state == 'posted':
-                        line_amount -= ResCurrency._compute(
-                            partial_line.company_id.currency_id, user_currency,
-                            partial_line.amount)
-
-                if not self.env.company.currency_id.is_zero(
-                        line_amount):
-                    invoice_amount = 0.00
-                    paid_amount = 0.00
-                    if line.account_id.user_type_id.type == 'receivable':
-                        if line_amount < 0.00:
-                            paid_amount += line_amount
-                            print (paid_amount,">>>>>>>Paid Amount\n\n\n\n")
-                        else:
-                            invoice_amount += line_amount
-                    elif line.account_id.user_type_id.type == 'payable':
-                        if line_amount > 0.00:
-                            paid_amount += line_amount
-                        else:
-                            invoice_amount += line_amount
-                    partners_amount[partner_id] += invoice_amount
-                    undue_paid_amount[partner_id] += paid_amount
-                    if i + 1 == 7:
-                        period7 = i + 1
-                        lines[partner_id].append({
-                            'period7': period7,
-                            'line': line,
-                            'partner_id': partner_id,
-                            'move': move_name,
-                            'currency': currency_id,
-                            'symbol': currency_symbol,
-                            'jrnl': jrnl_id,
-                            'acc_name': account_id,
-                            'mov_id': move_id,
-                            'acc_code': account_code,
-                            'date': date_maturity,
-                            'amount': invoice_amount,
-                            'paid_amount': paid_amount
-                        })
-                    elif i + 1 == 6:
-                        period6 = i + 1
-                        lines[partner_id].append({
-                            'period6': period6,
-                            'line': line,
-                            'partner_id': partner_id,
-                            'move': move_name,
-                            'currency': currency_id,
-                            'symbol': currency_symbol,
-                            'jrnl': jrnl_id,
-                            'acc_name': account_id,
-                            'mov_id': move_id,
-                            'acc_code': account_code,
-                            'date': date_maturity,
-                            'amount': invoice_amount,
-                            'paid_amount': paid_amount
-                        })
-                    elif i + 1 == 5:
-                        period5 = i + 1
-                        lines[partner_id].append({
-                            'period5': period5,
-                            'line': line,
-                            'partner_id': partner_id,
-                            'move': move_name,
-                            'currency': currency_id,
-                            'symbol': currency_symbol,
-                            'jrnl': jrnl_id,
-                            'acc_name': account_id,
-                            'mov_id': move_id,
-                            'acc_code': account_code,
-                            'date': date_maturity,
-                            'amount': invoice_amount,
-                            'paid_amount': paid_amount
-                        })
-                    elif i + 1 == 4:
-                        period4 = i + 1
-                        lines[partner_id].append({
-
-                            'period4': period4,
-                            'line': line,
-                            'partner_id': partner_id,
-                            'move': move_name,
-                            'jrnl': jrnl_id,
-                            'acc_name': account_id,
-                            'currency': currency_id,
-                            'symbol': currency_symbol,
-                            'mov_id': move_id,
-                            'acc_code': account_code,
-                            'date': date_maturity,
-                            'amount': invoice_amount,
-                            'paid_amount': paid_amount
-                        })
-                    elif i + 1 == 3:
-                        period3 = i + 1
-                        lines[partner_id].append({
-
-                            'period3': period3,
-                            'line': line,
-                            'partner_id': partner_id,
-                            'move': move_name,
-                            'jrnl': jrnl_id,
-                            'acc_name': account_id,
-                            'currency': currency_id,
-                            'symbol': currency_symbol,
-                            'mov_id': move_id,
-                            'acc_code': account_code,
-                            'date': date_maturity,
-                            'amount': invoice_amount,
-                            'paid_amount': paid_amount
-                        })
-                    elif i + 1 == 2:
-                        period2 = i + 1
-                        lines[partner_id].append({
-
-                            'period2': period2,
-                            'line': line,
-                            'partner_id': partner_id,
-                            'move': move_name,
-                            'jrnl': jrnl_id,
-                            'acc_name': account_id,
-                            'currency': currency_id,
-                            'symbol': currency_symbol,
-                            'mov_id': move_id,
-                            'acc_code': account_code,
-                            'date': date_maturity,
-                            'amount': invoice_amount,
-                            'paid_amount': paid_amount
-                        })
-                    else:
-                        period1 = i + 1
-                        lines[partner_id].append({
-
-                            'period1': period1,
-                            'line': line,
-                            'partner_id': partner_id,
-                            'move': move_name,
-                            'jrnl': jrnl_id,
-                            'acc_name': account_id,
-                            'currency': currency_id,
-                            'symbol': currency_symbol,
-                            'mov_id': move_id,
-                            'acc_code': account_code,
-                            'date': date_maturity,
-                            'amount': invoice_amount,
-                            'paid_amount': paid_amount
-                        })
-
-            history.append(partners_amount)
-
-        for partner in partners:
-            if partner['partner_id'] is None:
-                partner['partner_id'] = False
-            at_least_one_amount = False
-            values = {}
-            undue_amt = 0.0
-            paid_amount = 0.00
-            if partner['partner_id'] in undue_amounts:  # Making sure this partner actually was found by the query
-                undue_amt = undue_amounts[partner['partner_id']]
-            if partner['partner_id'] in undue_paid_amount:
-                paid_amount = undue_paid_amount[partner['partner_id']]
-                if paid_amount != 0.00:
-                    at_least_one_amount = True
-            total[8] = total[8] + undue_amt + paid_amount
-            values['direction'] = 0.00
-            values['unalloc'] = paid_amount
-            for rec in lines:
-                if partner['partner_id'] == rec:
-                    child_lines = lines[rec]
-            values['child_lines'] = child_lines
-            if not float_is_zero(values['direction'],
-                                 precision_rounding=self.env.company.currency_id.rounding):
-                at_least_one_amount = True
+                invoice_amount = residual
+            period = row['period']
+            values[str(period)] += invoice_amount
+            values['unalloc'] += paid_amount
+            lines[key].append({
+                'period%s' % (period + 1): period + 1,
+                'partner_id': key,
+                'contact': row['contact'],
+                'move': row['move_name'],
+                'currency': row['currency_position'],
+                'symbol': row['currency_symbol'],
+                'jrnl': row['journal_name'],
+                'acc_name': row['account_name'],
+                'mov_id': row['move_id'],
+                'acc_code': row['account_code'],
+                'date': row['date'].strftime("%d/%m/%Y"),
+                'amount': invoice_amount,
+                'paid_amount': paid_amount,
+            })
 
-            for i in range(7):
-                during = False
-                if partner['partner_id'] in history[i]:
-                    during = [history[i][partner['partner_id']]]
-                # Adding counter
-                total[(i)] = total[(i)] + (during and during[0] or 0)
-                values[str(i)] = during and during[0] or 0.0
-                if not float_is_zero(values[str(i)],
-                                     precision_rounding=self.env.company.currency_id.rounding):
-                    at_least_one_amount = True
-            values['6'] += undue_amt
+        trusts = dict((partner.id, partner.trust) for partner in self.env['res.partner'].browse(
+            [values['partner_id'] for values in res if values['partner_id']]))
+        for values in res:
             values['total'] = sum(
                 [values['unalloc']] + [values['direction']] + [values[str(i)] for i in range(7)])
-            ## Add for total
-            total[(i + 1)] += values['total']
-            values['partner_id'] = partner['partner_id']
-            if partner['partner_id']:
-                browsed_partner = self.env['res.partner'].browse(
-                    partner['partner_id'])
-                values['name'] = browsed_partner.name and len(
-                    browsed_partner.name) >= 45 and browsed_partner.name[
-                                                    0:40] + '...' or browsed_partner.name
-                values['trust'] = browsed_partner.trust
+            for i in range(7):
+                total[i] += values[str(i)]
+            total[7] += values['total']
+            total[8] += values['unalloc']
+            if values['partner_id']:
+                name = values['name'] or ''
+                values['name'] = len(name) >= 45 and name[0:40] + '...' or name
+                values['trust'] = trusts[values['partner_id']]
             else:
                 values['name'] = _('Unknown Partner')
                 values['trust'] = False
-
-            if at_least_one_amount or (
-                    self._context.get('include_nullified_amount') and lines[
-                partner['partner_id']]):
-                res.append(values)
         return res, total, lines
 
+    def _get_ageing_query(self, data, partners, date_from, target_move,
+                          account_type, period_length):
+        """ Query of the journal items open as of ``date_from`` with their
+        residual at that date and their period, along with its parameters,
+        see ``_get_partner_move_lines``."""
+        date_from = fields.Date.to_date(date_from)
+        user_company = self.env.company
+        user_currency = user_company.currency_id
+        companies = self.env['res.company'].browse(
+            self._context.get('company_ids') or [user_company.id])
+        rates = [self.env['res.currency']._get_conversion_rate(
+            company.currency_id, user_currency, user_company, date_from)
+            for company in companies]
+        move_state = ['draft', 'posted']
+        if target_move == 'posted':
+            move_state = ['posted']
+        # Number of days from which an item falls in the periods '5' to '0'
+        thresholds = [period_length * n + 1 for n in range(1, 5)]
+        thresholds += [thresholds[-1] + 60, thresholds[-1] + 245]
+
+        # With the rollup, the journal items are grouped on the commercial
+        # entity of their partner instead of the partner itself
+        if data.get('partner_rollup'):
+            partner_id, partner_name = 'rp.commercial_partner_id', 'crp.name'
+        else:
+            partner_id, partner_name = 'l.partner_id', 'rp.name'
+        partner_clause = 'l.partner_id IS NOT NULL'
+        params = {
+            'date_from': date_from,
+            'company_ids': companies.ids,
+            'rates': rates,
+            'move_state': move_state,
+            'account_type': list(account_type),
+            'thresholds': thresholds,
+            'decimal_places': user_currency.decimal_places,
+        }
+        if partners:
+            partner_clause = '(l.partner_id IS NULL OR l.partner_id = ANY(%(partner_ids)s))'
+            params['partner_ids'] = partners.ids
+        query = '''
+            SELECT *
+            FROM (
+                SELECT
+                    l.id,
+                    ''' + partner_id + ''' AS partner_id,
+                    ''' + partner_name + ''' AS partner_name,
+                    rp.name AS contact,
+                    l.date,
+                    l.move_id,
+                    am.name AS move_name,
+                    aj.name AS journal_name,
+                    aa.name AS account_name,
+                    aa.code AS account_code,
+                    aa.internal_type,
+                    c.position AS currency_position,
+                    c.symbol AS currency_symbol,
+                    ROUND((l.balance + matched.amount) * r.rate, %(decimal_places)s) AS residual,
+                    6 - width_bucket(%(date_from)s - l.date, %(thresholds)s::int[]) AS period
+                FROM account_move_line l
+                    JOIN account_move am ON am.id = l.move_id
+                    JOIN account_account aa ON aa.id = l.account_id
+                    JOIN account_journal aj ON aj.id = l.journal_id
+                    JOIN res_company rc ON rc.id = l.company_id
+                    JOIN res_currency c ON c.id = rc.currency_id
+                    JOIN unnest(%(company_ids)s::int[], %(rates)s::numeric[]) AS r (company_id, rate)
+                        ON r.company_id = l.company_id
+                    LEFT JOIN res_partner rp ON rp.id = l.partner_id
+                    LEFT JOIN res_partner crp ON crp.id = rp.commercial_partner_id
+                    CROSS JOIN LATERAL (
+                        SELECT COALESCE(SUM(CASE WHEN p.debit_move_id = l.id
+                                                 THEN -p.amount ELSE p.amount END), 0) AS amount
+                        FROM account_partial_reconcile p
+                            JOIN account_move_line debit_line ON debit_line.id = p.debit_move_id
+                            JOIN account_move_line credit_line ON credit_line.id = p.credit_move_id
+                        WHERE (p.debit_move_id = l.id OR p.credit_move_id = l.id)
+                            AND p.max_date <= %(date_from)s
+                            AND debit_line.parent_state = 'posted'
+                            AND credit_line.parent_state = 'posted'
+                    ) matched
+                WHERE l.parent_state = ANY(%(move_state)s)
+                    AND aa.internal_type = ANY(%(account_type)s)
+                    AND l.date <= %(date_from)s
+                    AND l.company_id = ANY(%(company_ids)s)
+                    AND ''' + partner_clause + '''
+                    AND (NOT l.reconciled
+                         OR EXISTS (SELECT 1 FROM account_partial_reconcile p
+                                    WHERE p.debit_move_id = l.id AND p.max_date > %(date_from)s)
+                         OR EXISTS (SELECT 1 FROM account_partial_reconcile p
+                                    WHERE p.credit_move_id = l.id AND p.max_date > %(date_from)s))
+            ) aged
+            WHERE aged.residual != 0
+            ORDER BY UPPER(aged.partner_name), aged.partner_id, aged.period, aged.date, aged.id'''
+        return query, params
+
     @api.model
     def _get_currency(self):
         journal = self.env['account.journal'].browse(
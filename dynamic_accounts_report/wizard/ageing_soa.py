@@ -13,6 +13,8 @@ try:
 except ImportError:
     import xlsxwriter
 
+from .report_filter import move_line_where, search_partners
+
 
 LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
@@ -46,17 +48,8 @@ class AgeingView(models.TransientModel):
     )
 
     @api.model
-    def get_partners(self):
-        query = """SELECT
-                        rp.id as id,
-                        rp.name as text
-                    FROM
-                        res_partner rp
-                    WHERE
-                        rp.parent_id is null
-                        AND rp.active is true"""
-        self._cr.execute(query)
-        return self._cr.dictfetchall()
+    def get_partners(self, term='', page=1):
+        return search_partners(self.env, term, page)
 
     @api.model
     def view_report(self, option):
@@ -134,8 +127,6 @@ class AgeingView(models.TransientModel):
         default_filters = {}
         company_id = self.env.company
         company_domain = [('company_id', '=', company_id.id)]
-        partner = r.partner_ids if r.partner_ids else self.env[
-            'res.partner'].search([])
         categories = r.partner_category_ids if r.partner_category_ids \
             else self.env['res.partner.category'].search([])
 
@@ -147,7 +138,7 @@ class AgeingView(models.TransientModel):
 
             'target_move': r.target_move,
             'result_selection': r.result_selection,
-            'partners_list': [(p.id, p.name) for p in partner],
+            'partners_list': [(p.id, p.name) for p in r.partner_ids],
             'category_list': [(c.id, c.name) for c in categories],
             'company_name': company_id and company_id.name,
         }
@@ -257,12 +248,11 @@ class AgeingView(models.TransientModel):
         user_currency = user_company.currency_id
         ResCurrency = self.env['res.currency'].with_context(date=date_from)
         company_ids = self._context.get('company_ids') or [user_company.id]
-        move_state = ['draft', 'posted']
-        if target_move == 'posted':
-            move_state = ['posted']
-        arg_list = (tuple(move_state), tuple(account_type))
+        base_where = move_line_where(self.env, {'target_move': target_move},
+                                     date_to=date_from, company_ids=company_ids)
+        base_where.add("account_account.internal_type = ANY(%s)", list(account_type))
 
-        reconciliation_clause = '(l.reconciled IS FALSE)'
+        where = base_where.copy()
         cr.execute(
             'SELECT debit_move_id, credit_move_id FROM account_partial_reconcile where max_date > %s',
             (date_from,))
@@ -270,31 +260,21 @@ class AgeingView(models.TransientModel):
         for row in cr.fetchall():
             reconciled_after_date += [row[0], row[1]]
         if reconciled_after_date:
-            reconciliation_clause = '(l.reconciled IS FALSE OR l.id IN %s)'
-            arg_list += (tuple(reconciled_after_date),)
-
-        arg_list += (date_from, tuple(company_ids),)
-        partner_list = '(l.partner_id IS NOT  NULL)'
+            where.add("({l}.reconciled IS FALSE OR {l}.id = ANY(%s))", reconciled_after_date)
+        else:
+            where.add("{l}.reconciled IS FALSE")
         if partners:
-            list = tuple(partners.ids) + tuple([0])
-            if list:
-                partner_list = '(l.partner_id IS NULL OR l.partner_id IN %s)'
-                arg_list += (tuple(list),)
+            where.add("({l}.partner_id IS NULL OR {l}.partner_id = ANY(%s))", partners.ids)
+        else:
+            where.add("{l}.partner_id IS NOT NULL")
         query = '''
                     SELECT DISTINCT l.partner_id, UPPER(res_partner.name)
-                    FROM account_move_line AS l left join res_partner on l.partner_id = res_partner.id, account_account, account_move am
-                    WHERE (l.account_id = account_account.id)
-                        AND (l.move_id = am.id)
-                        AND (am.state IN %s)
-                        AND (account_account.internal_type IN %s)
-                       
-                        AND ''' + reconciliation_clause + '''          
-                        AND (l.date <= %s)
-                        AND l.company_id IN %s
-                        AND ''' + partner_list + '''
-                           
+                    FROM account_move_line AS l
+                        LEFT JOIN res_partner ON l.partner_id = res_partner.id
+                        JOIN account_account ON l.account_id = account_account.id
+                    WHERE ''' + where.sql + '''
                     ORDER BY UPPER(res_partner.name)'''
-        cr.execute(query, arg_list)
+        cr.execute(query, where.params)
 
 
         partners = cr.dictfetchall()
@@ -315,18 +295,13 @@ class AgeingView(models.TransientModel):
         # This dictionary will store the not due amount of all partners
         undue_amounts = {}
         undue_paid_amount = {}
+        base_where.add("({l}.partner_id = ANY(%s) OR {l}.partner_id IS NULL)", partner_ids)
+        where = base_where.copy().add("{l}.date >= %s", date_from)
         query = '''SELECT l.id
-                        FROM account_move_line AS l, account_account, account_move am
-                        WHERE (l.account_id = account_account.id) AND (l.move_id = am.id)
-                            AND (am.state IN %s)
-                            AND (account_account.internal_type IN %s)
-                            AND (l.date >= %s)\
-                            AND ((l.partner_id IN %s) OR (l.partner_id IS NULL))
-                        AND (l.date <= %s)
-                        AND l.company_id IN %s'''
-        cr.execute(query, (
-            tuple(move_state), tuple(account_type), date_from,
-            tuple(partner_ids), date_from, tuple(company_ids)))
+                        FROM account_move_line AS l
+                            JOIN account_account ON l.account_id = account_account.id
+                        WHERE ''' + where.sql
+        cr.execute(query, where.params)
         aml_ids = cr.fetchall()
         aml_ids = aml_ids and [x[0] for x in aml_ids] or []
         for line in self.env['account.move.line'].browse(aml_ids):
@@ -409,37 +384,17 @@ class AgeingView(models.TransientModel):
         duty_hist = []
         vat_hist = []
         for i in range(7):
-            args_list = (
-                tuple(move_state), tuple(account_type), tuple(partner_ids),)
-            dates_query = '(l.date'
-
-            if periods[str(i)]['start'] and periods[str(i)]['stop']:
-                dates_query += ' BETWEEN %s AND %s)'
-
-                args_list += (
-                    periods[str(i)]['start'], periods[str(i)]['stop'])
-            elif periods[str(i)]['start']:
-                dates_query += ' >= %s)'
-
-                args_list += (periods[str(i)]['start'],)
-            else:
-                dates_query += ' <= %s)'
-                args_list += (periods[str(i)]['stop'],)
-
-            args_list += (date_from, tuple(company_ids))
+            where = base_where.copy()
+            if periods[str(i)]['start']:
+                where.add("{l}.date >= %s", periods[str(i)]['start'])
+            if periods[str(i)]['stop']:
+                where.add("{l}.date <= %s", periods[str(i)]['stop'])
 
             query = '''SELECT l.id
-                            FROM account_move_line AS l, account_account, account_move am
-                            WHERE (l.account_id = account_account.id) AND (l.move_id = am.id)
-                                AND (am.state IN %s)
-                                AND (account_account.internal_type IN %s)
-                                AND ((l.partner_id IN %s) OR (l.partner_id IS NULL))
-                                AND ''' + dates_query + '''
-                                
-                                
-                            AND (l.date <= %s)
-                            AND l.company_id IN %s'''
-            cr.execute(query, args_list)
+                            FROM account_move_line AS l
+                                JOIN account_account ON l.account_id = account_account.id
+                            WHERE ''' + where.sql
+            cr.execute(query, where.params)
 
             partners_amount = {}
             duty_amount_dict = {}
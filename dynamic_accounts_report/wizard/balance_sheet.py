@@ -5,12 +5,14 @@ import io
 import json
 from odoo.exceptions import AccessError, UserError, AccessDenied
 from odoo.http import request
-from datetime import datetime
+from datetime import datetime, timedelta
 try:
     from odoo.tools.misc import xlsxwriter
 except ImportError:
     import xlsxwriter
 
+from .report_filter import move_line_where
+
 LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
 def excel_style(row, col):
@@ -132,550 +134,134 @@ class BalanceSheetView(models.TransientModel):
     
     def _get_accounts(self, accounts, data, sign):
         cr = self.env.cr
-        MoveLine = self.env['account.move.line']
-        move_lines = {x: [] for x in accounts.ids}
-        currency_id = self.env.company.currency_id
-    
-        # Prepare sql query base on selected parameters from wizard
-        tables, where_clause, where_params = MoveLine._query_get()
-        wheres = [""]
-        if where_clause.strip():
-            wheres.append(where_clause.strip())
-        final_filters = " AND ".join(wheres)
-        final_filters = final_filters.replace('account_move_line__move_id',
-                                              'm').replace(
-            'account_move_line', 'l')
-        new_final_filter = final_filters
-        comp_final_filter = final_filters
-    
-        if data['target_move'] == 'posted':
-            new_final_filter += " AND m.state = 'posted'"
-            comp_final_filter += " AND m.state = 'posted'"
-        else:
-            new_final_filter += " AND m.state in ('draft','posted')"
-            comp_final_filter += " AND m.state in ('draft','posted')"
-    
-        if data.get('date_from'):
-            new_final_filter += " AND l.date >= '%s'" % data.get('date_from')
-        if data.get('date_to'):
-            new_final_filter += " AND l.date <= '%s'" % data.get('date_to')
-        
-        has_comp = False
-        if data.get('date_from_comp'):
-            comp_final_filter += " AND l.date >= '%s'" % data.get('date_from_comp')
-            has_comp = True
-        if data.get('date_to_comp'):
-            comp_final_filter += " AND l.date <= '%s'" % data.get('date_to_comp')
-            has_comp = True
-    
-        if data['journals']:
-            new_final_filter += ' AND j.id IN %s' % str(
-                tuple(data['journals'].ids) + tuple([0]))
-            comp_final_filter += ' AND j.id IN %s' % str(
-                tuple(data['journals'].ids) + tuple([0]))
-    
-        RET_WHERE = "WHERE aat.internal_group in ('income', 'expense')"
         if data.get('accounts'):
-            WHERE = "WHERE l.account_id IN %s" % str(
-                tuple(data.get('accounts').ids) + tuple([0]))
             filter_accounts = data['accounts']
         else:
-            WHERE = "WHERE l.account_id IN %s"
             filter_accounts = accounts
-    
-        if data['analytics']:
-            WHERE += ' AND anl.id IN %s' % str(
-                tuple(data.get('analytics').ids) + tuple([0]))
-            RET_WHERE += ' AND anl.id IN %s' % str(
-                tuple(data.get('analytics').ids) + tuple([0]))
-    
-        if data['analytic_tags']:
-            WHERE += ' AND anltag.account_analytic_tag_id IN %s' % str(
-                tuple(data.get('analytic_tags').ids) + tuple([0]))
-            RET_WHERE += ' AND anltag.account_analytic_tag_id IN %s' % str(
-                tuple(data.get('analytic_tags').ids) + tuple([0]))
-    
-        # Get move lines base on sql query and Calculate the total balance of move lines
-        has_ret_earnings = False
+
         ret_earning_acc = filter_accounts.filtered(lambda a: a.ret_earning_account)
-        if ret_earning_acc:
-            if len(ret_earning_acc.ids) > 1:
-                raise UserError(_("Retained earnings account cannot be more than 1"))
-            has_ret_earnings = True
-        if has_comp:
-            if has_ret_earnings:
-                sql = ("""
-                    SELECT
-                        COALESCE(SUM(x.credit),0) as credit,
-                        COALESCE(SUM(x.debit),0) as debit,
-                        COALESCE(SUM(x.balance),0) as balance,
-                        COALESCE(SUM(x.credit_comp),0) as credit_comp,
-                        COALESCE(SUM(x.debit_comp),0) as debit_comp,
-                        COALESCE(SUM(x.balance_comp),0) as balance_comp,
-                        x.account_name as account_name,
-                        x.id as id
-                    FROM
-                        (SELECT
-                            COALESCE(SUM(l.credit),0) as credit,
-                            COALESCE(SUM(l.debit),0) as debit,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                            0.00 as credit_comp,
-                            0.00 as debit_comp,
-                            0.00 as balance_comp,
-                            acc.code || ' - ' || acc.name as account_name,
-                            acc.id as id
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                            + WHERE + new_final_filter + """ GROUP BY acc.code, acc.name, acc.id
-                        UNION
-                        SELECT
-                            0.00 as credit,
-                            0.00 as debit,
-                            0.00 as balance,
-                            COALESCE(SUM(l.credit),0) as credit_comp,
-                            COALESCE(SUM(l.debit),0) as debit_comp,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance_comp,
-                            acc.code || ' - ' || acc.name as account_name,
-                            acc.id as id
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                            + WHERE + comp_final_filter + """ GROUP BY acc.code, acc.name, acc.id
-                            
-                            
-                            
-                            
-                            
-                            
-                        UNION
-                        SELECT
-                            CASE WHEN (SUM(l.debit - l.credit) <= 0) THEN SUM(l.debit - l.credit) * -1 ELSE 0.00 END as credit,
-                            CASE WHEN (SUM(l.debit - l.credit) > 0 THEN SUM(l.debit - l.credit) ELSE 0.00 END as debit,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                            0.00 as credit_comp,
-                            0.00 as debit_comp,
-                            0.00 as balance_comp,
-                            '%s' || ' - ' || '%s' as account_name,
-                            %s as id
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_account aa on aa.id = l.account_id
-                            LEFT JOIN account_account_type aat ON (aat.id=aa.user_type_id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)"""%(sign, ret_earning_acc.code, ret_earning_acc.name, ret_earning_acc.id)
-                            + RET_WHERE + new_final_filter + """
-                        UNION
-                        SELECT
-                            0.00 as credit,
-                            0.00 as debit,
-                            0.00 as balance,
-                            CASE WHEN (SUM(l.debit - l.credit) <= 0) THEN SUM(l.debit - l.credit) * -1 ELSE 0.00 END as credit_comp,
-                            CASE WHEN (SUM(l.debit - l.credit) > 0) THEN SUM(l.debit - l.credit) ELSE 0.00 END as debit_comp,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance_comp,
-                            '%s' || ' - ' || '%s' as account_name,
-                            %s as id
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_account aa on aa.id = l.account_id
-                            LEFT JOIN account_account_type aat ON (aat.id=aa.user_type_id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)"""%(sign, ret_earning_acc.code, ret_earning_acc.name, ret_earning_acc.id)
-                            + RET_WHERE + comp_final_filter + """ 
-                            
-                            )x
-                    GROUP BY x.account_name, x.id""")
-                if data.get('accounts'):
-                    params = tuple(where_params) + tuple(where_params) + tuple(where_params) + tuple(where_params)
-                else:
-                    params = (tuple(accounts.ids),) + tuple(where_params) + (tuple(accounts.ids),) + tuple(where_params) + tuple(where_params) + tuple(where_params)
-            else:
-                sql = ("""
-                    SELECT
-                        COALESCE(SUM(x.credit),0) as credit,
-                        COALESCE(SUM(x.debit),0) as debit,
-                        COALESCE(SUM(x.balance),0) as balance,
-                        COALESCE(SUM(x.credit_comp),0) as credit_comp,
-                        COALESCE(SUM(x.debit_comp),0) as debit_comp,
-                        COALESCE(SUM(x.balance_comp),0) as balance_comp,
-                        x.account_name as account_name,
-                        x.id as id
-                    FROM
-                        (SELECT
-                            COALESCE(SUM(l.credit),0) as credit,
-                            COALESCE(SUM(l.debit),0) as debit,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                            0.00 as credit_comp,
-                            0.00 as debit_comp,
-                            0.00 as balance_comp,
-                            acc.code || ' - ' || acc.name as account_name,
-                            acc.id as id
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                            + WHERE + new_final_filter + """ GROUP BY acc.code, acc.name, acc.id
-                        UNION
-                        SELECT
-                            0.00 as credit,
-                            0.00 as debit,
-                            0.00 as balance,
-                            COALESCE(SUM(l.credit),0) as credit_comp,
-                            COALESCE(SUM(l.debit),0) as debit_comp,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance_comp,
-                            acc.code || ' - ' || acc.name as account_name,
-                            acc.id as id
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                            + WHERE + comp_final_filter + """ GROUP BY acc.code, acc.name, acc.id)x
-                    GROUP BY x.account_name, x.id""")
-                if data.get('accounts'):
-                    params = tuple(where_params) + tuple(where_params)
-                else:
-                    params = (tuple(accounts.ids),) + tuple(where_params) + (tuple(accounts.ids),) + tuple(where_params)
-        else:
-            if has_ret_earnings:
-                sql = ("""
-                    SELECT
-                        COALESCE(SUM(x.credit),0) as credit,
-                        COALESCE(SUM(x.debit),0) as debit,
-                        COALESCE(SUM(x.balance),0) as balance,
-                        COALESCE(SUM(x.credit_comp),0) as credit_comp,
-                        COALESCE(SUM(x.debit_comp),0) as debit_comp,
-                        COALESCE(SUM(x.balance_comp),0) as balance_comp,
-                        x.account_name as account_name,
-                        x.id as id
-                    FROM
-                    (SELECT
-                        COALESCE(SUM(l.credit),0) as credit,
-                        COALESCE(SUM(l.debit),0) as debit,
-                        COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                        0.00 as credit_comp,
-                        0.00 as debit_comp,
-                        0.00 as balance_comp,
-                        acc.code || ' - ' || acc.name as account_name,
-                        acc.id as id
-                    FROM
-                        account_move_line l
-                        JOIN account_move m ON (l.move_id=m.id)
-                        LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                        LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                        LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                        LEFT JOIN account_account aa on aa.id = l.account_id
-                        LEFT JOIN account_account_type aat ON (aat.id=aa.user_type_id)
-                        LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                        JOIN account_journal j ON (l.journal_id=j.id)
-                        JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                        + WHERE + new_final_filter + """ GROUP BY acc.code, acc.name, acc.id
-                    UNION
-                    SELECT
-                        CASE WHEN SUM(l.debit - l.credit) < 0 THEN SUM(l.debit - l.credit) * -1 ELSE 0 END as credit,
-                        CASE WHEN SUM(l.debit - l.credit) > 0 THEN SUM(l.debit - l.credit) ELSE 0 END as debit,
-                        COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                        0.00 as credit_comp,
-                        0.00 as debit_comp,
-                        0.00 as balance_comp,
-                        '%s' || ' - ' || '%s' as account_name,
-                        %s as id
-                    FROM
-                        account_move_line l
-                        JOIN account_move m ON (l.move_id=m.id)
-                        LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                        LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                        LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                        LEFT JOIN account_account aa on aa.id = l.account_id
-                        LEFT JOIN account_account_type aat ON (aat.id=aa.user_type_id)
-                        LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                        JOIN account_journal j ON (l.journal_id=j.id)
-                        JOIN account_account acc ON (l.account_id = acc.id)"""%(sign, ret_earning_acc.code, ret_earning_acc.name, ret_earning_acc.id)
-                        + RET_WHERE + new_final_filter + """)x group by x.account_name, x.id
-                    """)
-                if data.get('accounts'):
-                    params = tuple(where_params) + tuple(where_params)
-                else:
-                    params = (tuple(accounts.ids),) + tuple(where_params) + tuple(where_params)
-            else:
-                sql = ("""
-                    SELECT
-                        COALESCE(SUM(l.credit),0) as credit,
-                        COALESCE(SUM(l.debit),0) as debit,
-                        COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                        0.00 as credit_comp,
-                        0.00 as debit_comp,
-                        0.00 as balance_comp,
-                        acc.code || ' - ' || acc.name as account_name,
-                        acc.id as id
-                    FROM
-                        account_move_line l
-                        JOIN account_move m ON (l.move_id=m.id)
-                        LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                        LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                        LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                        LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                        JOIN account_journal j ON (l.journal_id=j.id)
-                        JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                        + WHERE + new_final_filter + """ GROUP BY acc.code, acc.name, acc.id""")
-                if data.get('accounts'):
-                    params = tuple(where_params)
-                else:
-                    params = (tuple(accounts.ids),) + tuple(where_params)
+        if len(ret_earning_acc.ids) > 1:
+            raise UserError(_("Retained earnings account cannot be more than 1"))
+        has_comp = bool(data.get('date_from_comp') or data.get('date_to_comp'))
+        sql, params = self._get_accounts_query(accounts, data, sign, ret_earning_acc)
         cr.execute(sql, params)
         account_res = cr.dictfetchall()
+        totals = dict((fn, sum(row[fn] for row in account_res)) for fn in [
+            'debit', 'credit', 'balance', 'debit_comp', 'credit_comp', 'balance_comp'])
+        return account_res, totals['debit'], totals['credit'], totals['balance'], totals['debit_comp'], totals['credit_comp'], totals['balance_comp'], has_comp
+
+    def _get_accounts_query(self, accounts, data, sign, ret_earning_acc):
+        """ Query of the debit, credit and balance of the accounts over the
+        period and the comparison period, the retained earnings account
+        ``ret_earning_acc``, if any, carrying the result of the income and
+        expense accounts. Returns the query and its parameters."""
+        has_comp = bool(data.get('date_from_comp') or data.get('date_to_comp'))
+        has_ret_earnings = bool(ret_earning_acc)
+        periods = [(False, data.get('date_from'), data.get('date_to'))]
         if has_comp:
-            if has_ret_earnings:
-                bal_sql = ("""
-                    SELECT
-                        COALESCE(SUM(x.credit),0) as credit,
-                        COALESCE(SUM(x.debit),0) as debit,
-                        COALESCE(SUM(x.balance),0) as balance,
-                        COALESCE(SUM(x.credit_comp),0) as credit_comp,
-                        COALESCE(SUM(x.debit_comp),0) as debit_comp,
-                        COALESCE(SUM(x.balance_comp),0) as balance_comp
-                    FROM
-                        (SELECT
-                            COALESCE(SUM(l.credit),0) as credit,
-                            COALESCE(SUM(l.debit),0) as debit,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                            0.00 as credit_comp,
-                            0.00 as debit_comp,
-                            0.00 as balance_comp
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                            + WHERE + new_final_filter + """ 
-                        UNION
-                        SELECT
-                            0.00 as credit,
-                            0.00 as debit,
-                            0.00 as balance,
-                            COALESCE(SUM(l.credit),0) as credit_comp,
-                            COALESCE(SUM(l.debit),0) as debit_comp,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance_comp
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                            + WHERE + comp_final_filter + """ 
-                        UNION
-                        SELECT
-                            CASE WHEN (SUM(l.debit - l.credit) <= 0) THEN SUM(l.debit - l.credit) * -1 ELSE 0.00 END as credit,
-                            CASE WHEN (SUM(l.debit - l.credit) > 0) THEN SUM(l.debit - l.credit) ELSE 0.00 END as debit,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                            0.00 as credit_comp,
-                            0.00 as debit_comp,
-                            0.00 as balance_comp
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)
-                            LEFT JOIN account_account_type aat ON (aat.id=acc.user_type_id)"""%(sign)
-                            + RET_WHERE + new_final_filter + """ 
-                        UNION
-                        SELECT
-                            0.00 as credit,
-                            0.00 as debit,
-                            0.00 as balance,
-                            CASE WHEN (SUM(l.debit - l.credit) <= 0) THEN SUM(l.debit - l.credit) * -1 ELSE 0.00 END as credit_comp,
-                            CASE WHEN (SUM(l.debit - l.credit) > 0) THEN SUM(l.debit - l.credit) ELSE 0.00 END as debit_comp,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance_comp
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)
-                            LEFT JOIN account_account_type aat ON (aat.id=acc.user_type_id)"""%(sign)
-                            + RET_WHERE + comp_final_filter + """)x""")
-                if data.get('accounts'):
-                    params = tuple(where_params) + tuple(where_params) + tuple(where_params) + tuple(where_params)
-                else:
-                    params = (tuple(accounts.ids),) + tuple(where_params) + (tuple(accounts.ids),) + tuple(where_params) + tuple(where_params) + tuple(where_params)
-                
-                
-            else:
-                bal_sql = ("""
-                    SELECT
-                        COALESCE(SUM(x.credit),0) as credit,
-                        COALESCE(SUM(x.debit),0) as debit,
-                        COALESCE(SUM(x.balance),0) as balance,
-                        COALESCE(SUM(x.credit_comp),0) as credit_comp,
-                        COALESCE(SUM(x.debit_comp),0) as debit_comp,
-                        COALESCE(SUM(x.balance_comp),0) as balance_comp
-                    FROM
-                        (SELECT
-                            COALESCE(SUM(l.credit),0) as credit,
-                            COALESCE(SUM(l.debit),0) as debit,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                            0.00 as credit_comp,
-                            0.00 as debit_comp,
-                            0.00 as balance_comp
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                            + WHERE + new_final_filter + """ 
-                        UNION
-                        SELECT
-                            0.00 as credit,
-                            0.00 as debit,
-                            0.00 as balance,
-                            COALESCE(SUM(l.credit),0) as credit_comp,
-                            COALESCE(SUM(l.debit),0) as debit_comp,
-                            COALESCE(SUM(l.debit - l.credit),0) * %s as balance_comp
-                        FROM
-                            account_move_line l
-                            JOIN account_move m ON (l.move_id=m.id)
-                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                            LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                            LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                            JOIN account_journal j ON (l.journal_id=j.id)
-                            JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                            + WHERE + comp_final_filter + """ )x""")
-                if data.get('accounts'):
-                    params = tuple(where_params) + tuple(where_params)
-                else:
-                    params = (tuple(accounts.ids),) + tuple(where_params) + (tuple(accounts.ids),) + tuple(where_params)
-        else:
-            if has_ret_earnings:
-                bal_sql = ("""SELECT
-                    COALESCE(SUM(x.credit),0) as credit,
-                    COALESCE(SUM(x.debit),0) as debit,
-                    COALESCE(SUM(x.balance),0) as balance,
-                    COALESCE(SUM(x.credit_comp),0) as credit_comp,
-                    COALESCE(SUM(x.debit_comp),0) as debit_comp,
-                    COALESCE(SUM(x.balance_comp),0) as balance_comp
+            periods.append((True, data.get('date_from_comp'), data.get('date_to_comp')))
+
+        # One query per period and per kind of row, the retained earnings
+        # row carrying the result of the income and expense accounts of all
+        # the chart.
+        queries = []
+        params = []
+        for comp, date_from, date_to in periods:
+            where = move_line_where(self.env, data, date_from=date_from, date_to=date_to)
+            if not data.get('accounts'):
+                where.add("{l}.account_id = ANY(%s)", accounts.ids)
+            queries.append("""
+                SELECT """ + self._get_period_columns("""
+                        COALESCE(SUM(l.credit),0) AS credit{suffix},
+                        COALESCE(SUM(l.debit),0) AS debit{suffix},
+                        COALESCE(SUM(l.debit - l.credit),0) * %s AS balance{suffix}""", comp) + """,
+                    acc.code || ' - ' || acc.name AS account_name,
+                    acc.id AS id
                 FROM
-                (SELECT
-                        COALESCE(SUM(l.credit),0) as credit,
-                        COALESCE(SUM(l.debit),0) as debit,
-                        COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                        0.00 as credit_comp,
-                        0.00 as debit_comp,
-                        0.00 as balance_comp
-                    FROM
-                        account_move_line l
-                        JOIN account_move m ON (l.move_id=m.id)
-                        LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                        LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                        LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                        LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                        JOIN account_journal j ON (l.journal_id=j.id)
-                        JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                        + WHERE + new_final_filter + """
-                UNION
-                SELECT
-                        CASE WHEN (SUM(l.debit - l.credit) <= 0) THEN SUM(l.debit - l.credit) * -1 ELSE 0.00 END as credit,
-                        CASE WHEN (SUM(l.debit - l.credit) > 0) THEN SUM(l.debit - l.credit) ELSE 0.00 END as debit,
-                        COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                        0.00 as credit_comp,
-                        0.00 as debit_comp,
-                        0.00 as balance_comp
-                    FROM
-                        account_move_line l
-                        JOIN account_move m ON (l.move_id=m.id)
-                        LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                        LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                        LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                        LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                        JOIN account_journal j ON (l.journal_id=j.id)
-                        JOIN account_account acc ON (l.account_id = acc.id)
-                        LEFT JOIN account_account_type aat ON (aat.id=acc.user_type_id)"""%(sign)
-                        + RET_WHERE + new_final_filter + """)x""")
-                if data.get('accounts'):
-                    params = tuple(where_params) + tuple(where_params)
-                else:
-                    params = (tuple(accounts.ids),) + tuple(where_params) + tuple(where_params)
-            else:
-                bal_sql = ("""
-                    SELECT
-                        COALESCE(SUM(l.credit),0) as credit,
-                        COALESCE(SUM(l.debit),0) as debit,
-                        COALESCE(SUM(l.debit - l.credit),0) * %s as balance,
-                        0.00 as credit_comp,
-                        0.00 as debit_comp,
-                        0.00 as balance_comp
+                    account_move_line l
+                    JOIN account_account acc ON (l.account_id = acc.id)
+                WHERE """ + where.sql + """
+                GROUP BY acc.code, acc.name, acc.id""")
+            params += [sign] + where.params
+            earnings = None
+            if has_ret_earnings:
+                earnings = self._get_period_earnings(data, date_from, date_to)
+            if earnings is not None:
+                queries.append("""
+                    SELECT """ + self._get_period_columns("""
+                            %s AS credit{suffix},
+                            %s AS debit{suffix},
+                            %s * %s AS balance{suffix}""", comp) + """,
+                        %s AS account_name,
+                        %s AS id""")
+                params += [earnings < 0 and -earnings or 0.00, earnings > 0 and earnings or 0.00,
+                           earnings, sign, ret_earning_acc.code + ' - ' + ret_earning_acc.name,
+                           ret_earning_acc.id]
+            elif has_ret_earnings:
+                ret_where = move_line_where(self.env, dict(data, accounts=False),
+                                            date_from=date_from, date_to=date_to)
+                queries.append("""
+                    SELECT """ + self._get_period_columns("""
+                            CASE WHEN (SUM(l.debit - l.credit) <= 0) THEN SUM(l.debit - l.credit) * -1 ELSE 0.00 END AS credit{suffix},
+                            CASE WHEN (SUM(l.debit - l.credit) > 0) THEN SUM(l.debit - l.credit) ELSE 0.00 END AS debit{suffix},
+                            COALESCE(SUM(l.debit - l.credit),0) * %s AS balance{suffix}""", comp) + """,
+                        %s AS account_name,
+                        %s AS id
                     FROM
                         account_move_line l
-                        JOIN account_move m ON (l.move_id=m.id)
-                        LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                        LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                        LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                        LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id = l.id)
-                        JOIN account_journal j ON (l.journal_id=j.id)
-                        JOIN account_account acc ON (l.account_id = acc.id)"""%(sign)
-                        + WHERE + new_final_filter)
-                if data.get('accounts'):
-                    params = tuple(where_params)
-                else:
-                    params = (tuple(accounts.ids),) + tuple(where_params)
-        cr.execute(bal_sql, params)
-        balance_res = cr.dictfetchall()
-        if not balance_res:
-            return account_res, 0.00, 0.00, 0.00, 0.00, 0.00, 0.00, has_comp
-        else:
-            return account_res, balance_res[0]['debit'], balance_res[0]['credit'], balance_res[0]['balance'], balance_res[0]['debit_comp'], balance_res[0]['credit_comp'], balance_res[0]['balance_comp'], has_comp
+                        JOIN account_account aa ON (aa.id = l.account_id)
+                        JOIN account_account_type aat ON (aat.id = aa.user_type_id)
+                    WHERE aat.internal_group IN ('income', 'expense') AND """ + ret_where.sql)
+                params += [sign, ret_earning_acc.code + ' - ' + ret_earning_acc.name,
+                           ret_earning_acc.id] + ret_where.params
+        sql = """
+            SELECT
+                COALESCE(SUM(x.credit),0) AS credit,
+                COALESCE(SUM(x.debit),0) AS debit,
+                COALESCE(SUM(x.balance),0) AS balance,
+                COALESCE(SUM(x.credit_comp),0) AS credit_comp,
+                COALESCE(SUM(x.debit_comp),0) AS debit_comp,
+                COALESCE(SUM(x.balance_comp),0) AS balance_comp,
+                x.account_name AS account_name,
+                x.id AS id
+            FROM (""" + " UNION ALL ".join(queries) + """) x
+            GROUP BY x.account_name, x.id"""
+        return sql, params
+
+    def _get_period_earnings(self, data, date_from, date_to):
+        """ Result of the income and expense accounts over the period, from
+        the unallocated earnings shared with the Trial Balance. Returns None
+        when it has to be summed from the journal items instead, i.e. when
+        filtering on analytic accounts or tags or without an end date."""
+        if data.get('analytics') or data.get('analytic_tags') or not date_to:
+            return None
+        snapshot = self.env['account.balance.snapshot']
+        args = (data['target_move'], self.env.companies.ids, data['journals'].ids)
+        earnings = snapshot._get_unallocated_earnings(date_to + timedelta(days=1), *args)
+        if date_from:
+            earnings -= snapshot._get_unallocated_earnings(date_from, *args)
+        return earnings
+
+    def _get_period_columns(self, columns, comp):
+        """ Select list of the amounts of one period, the amounts of the other
+        period being zero."""
+        zeros = """
+                        0.00 AS credit{suffix},
+                        0.00 AS debit{suffix},
+                        0.00 AS balance{suffix}"""
+        if comp:
+            return zeros.format(suffix='') + "," + columns.format(suffix='_comp')
+        return columns.format(suffix='') + "," + zeros.format(suffix='_comp')
 
     @api.model
     def view_report(self, option, tag, lang):
+        r = self.env['dynamic.balance.sheet.report'].search([('id', '=', option[0])])
+        return self.env['dynamic.report.cache']._get_or_compute(
+            r, 'view_report', [tag, lang],
+            lambda: self._compute_view_report(option, tag, lang))
+
+    @api.model
+    def _compute_view_report(self, option, tag, lang):
         r = self.env['dynamic.balance.sheet.report'].search([('id', '=', option[0])])
         filters = self.get_filter(option)
         data = {
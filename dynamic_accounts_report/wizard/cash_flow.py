@@ -9,6 +9,8 @@ try:
     from odoo.tools.misc import xlsxwriter
 except ImportError:
     import xlsxwriter
+
+from .report_filter import move_line_where
 year = datetime.now().year
 
 
@@ -141,151 +143,36 @@ class AccountCasgFlow(models.TransientModel):
         journal_res = []
         fetched = []
 
-        account_type_id = self.env.ref('account.data_account_type_liquidity').id
         model = self.env.context.get('active_model')
+        where = self._get_cash_where(data)
         if data.get('levels') == 'summary':
-            state = """ WHERE am.state = 'posted' """ if data.get('target_move') == 'posted' else ''
-            query3 = """SELECT to_char(am.date, 'Month') as month_part, extract(YEAR from am.date) as year_part,
+            query3 = """SELECT to_char(aml.date, 'Month') as month_part, extract(YEAR from aml.date) as year_part,
                          sum(aml.debit) AS total_debit, sum(aml.credit) AS total_credit,
-                                 sum(aml.balance) AS total_balance FROM (SELECT am.date, am.id, am.state FROM account_move as am
-                                 LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                 LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                 LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                 WHERE am.date BETWEEN '""" + str(
-                data.get('date_from')) + """' and '""" + str(
-                data.get('date_to')) + """' AND aat.id='""" + str(
-                account_type_id) + """' ) am
-                                             LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                             LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                             LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                             """ + state + """GROUP BY month_part,year_part"""
+                         sum(aml.balance) AS total_balance
+                         FROM account_move_line aml
+                         WHERE """ + where.sql + """
+                         GROUP BY month_part,year_part"""
             cr = self._cr
-            cr.execute(query3)
+            cr.execute(query3, where.params)
             fetched_data = cr.dictfetchall()
-        elif data.get('date_from') is False:
-            account_type_id = self.env.ref(
-                'account.data_account_type_liquidity').id
-            state = """AND am.state = 'posted' """ if data.get(
-                'target_move') == 'posted' else ''
-            sql = """SELECT DISTINCT aa.id, aa.name,aa.code, sum(aml.debit) AS total_debit,
-                                                sum(aml.credit) AS total_credit,sum(aml.balance) AS total_balance
-                                                 FROM (SELECT am.* FROM account_move as am
-                                                LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                                LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                                LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                                WHERE am.date BETWEEN '""" + str(
-                data.get('date_from')) + """' and '""" + str(
-                data.get('date_to')) + """' AND aat.id='""" + str(
-                account_type_id) + """' """ + state + """) am
-                                                                    LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                                                    LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                                                    LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                                                    GROUP BY aa.name, aa.code,aa.id"""
-            cr = self._cr
-            cr.execute(sql)
-            fetched_data = cr.dictfetchall()
-        elif data.get('date_from') is False and data.get('date_from') != False:
-            account_type_id = self.env.ref(
-                'account.data_account_type_liquidity').id
-            state = """AND am.state = 'posted' """ if data.get(
-                'target_move') == 'posted' else ''
-            sql = """SELECT DISTINCT aa.id, aa.name,aa.code, sum(aml.debit) AS total_debit,
-                                                           sum(aml.credit) AS total_credit,sum(aml.balance) AS total_balance
-                                                            FROM (SELECT am.* FROM account_move as am
-                                                           LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                                           LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                                           LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                                           WHERE am.date BETWEEN '""" + str(
-                data.get('date_from')) + """' and '""" + str(
-                data.get('date_to')) + """' AND aat.id='""" + str(
-                account_type_id) + """' """ + state + """) am
-                                                                               LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                                                               LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                                                               LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                                                               GROUP BY aa.name, aa.code,aa.id"""
-            cr = self._cr
-            cr.execute(sql)
-            fetched_data = cr.dictfetchall()
-        elif data.get('date_from') is False and data.get('date_from') != False:
-            account_type_id = self.env.ref(
-                'account.data_account_type_liquidity').id
-            state = """AND am.state = 'posted' """ if data.get(
-                'target_move') == 'posted' else ''
-            sql = """SELECT DISTINCT aa.id, aa.name,aa.code, sum(aml.debit) AS total_debit,
-                                                           sum(aml.credit) AS total_credit,sum(aml.balance) AS total_balance
-                                                            FROM (SELECT am.* FROM account_move as am
-                                                           LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                                           LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                                           LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                                           WHERE am.date BETWEEN '""" + str(
-                data.get('date_from')) + """' and '""" + str(
-                data.get('date_to')) + """' AND aat.id='""" + str(
-                account_type_id) + """' """ + state + """) am
-                                                                               LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                                                               LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                                                               LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                                                               GROUP BY aa.name, aa.code,aa.id"""
-            cr = self._cr
-            cr.execute(sql)
-            fetched_data = cr.dictfetchall()
-
-        elif data.get('date_to') == " ":
-            account_type_id = self.env.ref(
-                'account.data_account_type_liquidity').id
-            state = """AND am.state = 'posted' """ if data.get(
-                'target_move') == 'posted' else ''
-            sql = """SELECT DISTINCT aa.id, aa.name,aa.code, sum(aml.debit) AS total_debit,
-                                                sum(aml.credit) AS total_credit,sum(aml.balance) AS total_balance
-                                                 FROM (SELECT am.* FROM account_move as am
-                                                LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                                LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                                LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                                WHERE am.date BETWEEN '""" + str(
-                data.get('date_from')) + """' and '""" + str(
-                data.get('date_to')) + """' AND aat.id='""" + str(
-                account_type_id) + """' """ + state + """) am
-                                                                    LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                                                    LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                                                    LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                                                    GROUP BY aa.name, aa.code,aa.id"""
+        elif data.get('date_from') is False or data.get('date_to') == " ":
             cr = self._cr
-            cr.execute(sql)
+            cr.execute(self._get_cash_accounts_query(where), where.params)
             fetched_data = cr.dictfetchall()
-
         elif data.get('levels') == 'consolidated':
-            state = """ WHERE am.state = 'posted' """ if data.get('target_move') == 'posted' else ''
             query2 = """SELECT aat.name, sum(aml.debit) AS total_debit, sum(aml.credit) AS total_credit,
-                         sum(aml.balance) AS total_balance FROM (  SELECT am.id, am.state FROM account_move as am
-                         LEFT JOIN account_move_line aml ON aml.move_id = am.id
+                         sum(aml.balance) AS total_balance
+                         FROM account_move_line aml
                          LEFT JOIN account_account aa ON aa.id = aml.account_id
                          LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                         WHERE am.date BETWEEN '""" + str(data.get('date_from')) + """' and '""" + str(
-                data.get('date_to')) + """' AND aat.id='""" + str(
-                account_type_id) + """' ) am
-                                     LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                     LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                     LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                     """ + state + """GROUP BY aat.name"""
+                         WHERE """ + where.sql + """
+                         GROUP BY aat.name"""
             cr = self._cr
-            cr.execute(query2)
+            cr.execute(query2, where.params)
             fetched_data = cr.dictfetchall()
         elif data.get('levels') == 'detailed':
-            state = """ WHERE am.state = 'posted' """ if data.get('target_move') == 'posted' else ''
-            query1 = """SELECT aa.id,aa.name,aa.code, sum(aml.debit) AS total_debit, sum(aml.credit) AS total_credit,
-                         sum(aml.balance) AS total_balance FROM (SELECT am.id, am.state FROM account_move as am
-                         LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                         LEFT JOIN account_account aa ON aa.id = aml.account_id
-                         LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                         WHERE am.date BETWEEN '""" + str(
-                data.get('date_from')) + """' and '""" + str(
-                data.get('date_to')) + """' AND aat.id='""" + str(
-                account_type_id) + """' ) am
-                                     LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                     LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                     LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                     """ + state + """GROUP BY aa.name, aa.code, aa.id"""
             cr = self._cr
-            cr.execute(query1)
+            cr.execute(self._get_cash_accounts_query(where), where.params)
             fetched_data = cr.dictfetchall()
             for account in self.env['account.account'].search([]):
                 child_lines = self.get_journal_lines(account, data)
@@ -293,25 +180,8 @@ class AccountCasgFlow(models.TransientModel):
                     journal_res.append(child_lines)
 
         else:
-            account_type_id = self.env.ref(
-                'account.data_account_type_liquidity').id
-            state = """AND am.state = 'posted' """ if data.get('target_move') == 'posted' else ''
-            sql = """SELECT DISTINCT aa.id, aa.name,aa.code, sum(aml.debit) AS total_debit,
-                                             sum(aml.credit) AS total_credit,sum(aml.balance) AS total_balance
-                                              FROM (SELECT am.* FROM account_move as am
-                                             LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                             LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                             LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                             WHERE am.date BETWEEN '""" + str(
-                data.get('date_from')) + """' and '""" + str(
-                data.get('date_to')) + """' AND aat.id='""" + str(
-                account_type_id) + """' """ + state + """) am
-                                                                 LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                                                 LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                                                 LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                                                                 GROUP BY aa.name, aa.code,aa.id"""
             cr = self._cr
-            cr.execute(sql)
+            cr.execute(self._get_cash_accounts_query(where), where.params)
             fetched_data = cr.dictfetchall()
             for account in self.env['account.account'].search([]):
                 child_lines = self._get_lines(account, data)
@@ -336,47 +206,54 @@ class AccountCasgFlow(models.TransientModel):
             'company_currency_position': position,
         }
 
-    def _get_lines(self, account, data):
-        account_type_id = self.env.ref(
-            'account.data_account_type_liquidity').id
-        state = """AND am.state = 'posted' """ if data.get('target_move') == 'posted' else ''
-        query = """SELECT aml.account_id,aj.id as j_id,aj.name,am.id, am.name as move_name, sum(aml.debit) AS total_debit, 
-                    sum(aml.credit) AS total_credit, COALESCE(SUM(aml.debit - aml.credit),0) AS balance FROM (SELECT am.* FROM account_move as am
-                    LEFT JOIN account_move_line aml ON aml.move_id = am.id
+    def _get_cash_where(self, data):
+        """ Compile the filters of the report on the journal items of the
+        moves hitting a liquidity account between its dates."""
+        where = move_line_where(
+            self.env, {'target_move': (data.get('target_move') or '').lower()},
+            alias='aml', date_from=data.get('date_from') or None,
+            date_to=data.get('date_to') or None)
+        where.add("""EXISTS (SELECT 1 FROM account_move_line cl
+                                 JOIN account_account ca ON ca.id = cl.account_id
+                             WHERE cl.move_id = {l}.move_id AND ca.user_type_id = %s)""",
+                  self.env.ref('account.data_account_type_liquidity').id)
+        return where
+
+    def _get_cash_accounts_query(self, where):
+        """ Query of the debit, credit and balance by account of the journal
+        items matching ``where``."""
+        return """SELECT aa.id, aa.name,aa.code, sum(aml.debit) AS total_debit,
+                    sum(aml.credit) AS total_credit,sum(aml.balance) AS total_balance
+                    FROM account_move_line aml
                     LEFT JOIN account_account aa ON aa.id = aml.account_id
-                    LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                    WHERE am.date BETWEEN '""" + str(
-            data.get('date_from')) + """' and '""" + str(
-            data.get('date_to')) + """' AND aat.id='""" + str(
-            account_type_id) + """' """ + state + """) am
-                                        LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                        LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                        LEFT JOIN account_journal aj ON aj.id = am.journal_id
-                                        WHERE aa.id = """ + str(account.id) + """
-                                        GROUP BY am.name, aml.account_id, aj.id, aj.name, am.id"""
+                    WHERE """ + where.sql + """
+                    GROUP BY aa.name, aa.code,aa.id"""
+
+    def _get_lines(self, account, data):
+        where = self._get_cash_where(data)
+        where.add("{l}.account_id = %s", account.id)
+        query = """SELECT aml.account_id,aj.id as j_id,aj.name,am.id, am.name as move_name, sum(aml.debit) AS total_debit,
+                    sum(aml.credit) AS total_credit, COALESCE(SUM(aml.debit - aml.credit),0) AS balance
+                    FROM account_move_line aml
+                    LEFT JOIN account_move am ON am.id = aml.move_id
+                    LEFT JOIN account_journal aj ON aj.id = aml.journal_id
+                    WHERE """ + where.sql + """
+                    GROUP BY am.name, aml.account_id, aj.id, aj.name, am.id"""
 
         cr = self._cr
-        cr.execute(query)
+        cr.execute(query, where.params)
         fetched_data = cr.dictfetchall()
 
         sql2 = """SELECT aa.name as account_name,aa.id as account_id, aj.id, aj.name, sum(aml.debit) AS total_debit,
-                        sum(aml.credit) AS total_credit, sum(aml.balance) AS total_balance FROM (SELECT am.* FROM account_move as am
-                            LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                            LEFT JOIN account_account aa ON aa.id = aml.account_id
-                            LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                            WHERE am.date BETWEEN '""" + str(
-            data.get('date_from')) + """' and '""" + str(
-            data.get('date_to')) + """' AND aat.id='""" + str(
-            account_type_id) + """' """ + state + """) am
-                                                LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                                LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                                LEFT JOIN account_journal aj ON aj.id = am.journal_id
-                                                WHERE aa.id = """ + str(
-            account.id) + """
-                                                GROUP BY aa.name, aj.name, aj.id,aa.id"""
+                    sum(aml.credit) AS total_credit, sum(aml.balance) AS total_balance
+                    FROM account_move_line aml
+                    LEFT JOIN account_account aa ON aa.id = aml.account_id
+                    LEFT JOIN account_journal aj ON aj.id = aml.journal_id
+                    WHERE """ + where.sql + """
+                    GROUP BY aa.name, aj.name, aj.id,aa.id"""
 
         cr = self._cr
-        cr.execute(sql2)
+        cr.execute(sql2, where.params)
         fetch_data = cr.dictfetchall()
         if fetched_data:
             return {
@@ -389,27 +266,19 @@ class AccountCasgFlow(models.TransientModel):
 
 
     def get_journal_lines(self, account, data, offset=0, fetch_range=FETCH_RANGE):
-        account_type_id = self.env.ref(
-            'account.data_account_type_liquidity').id
         offset_count = offset * fetch_range
-        state = """AND am.state = 'posted' """ if data.get('target_move') == 'posted' else ''
+        where = self._get_cash_where(data)
+        where.add("{l}.account_id = %s", account.id)
         sql2 = """SELECT aa.name as account_name, aj.name, sum(aml.debit) AS total_debit,
-         sum(aml.credit) AS total_credit, COALESCE(SUM(aml.debit - aml.credit),0) AS balance FROM (SELECT am.* FROM account_move as am
-             LEFT JOIN account_move_line aml ON aml.move_id = am.id
-             LEFT JOIN account_account aa ON aa.id = aml.account_id
-             LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-             WHERE am.date BETWEEN '""" + str(
-            data.get('date_from')) + """' and '""" + str(
-            data.get('date_to')) + """' AND aat.id='""" + str(
-            account_type_id) + """' """ + state + """) am
-                                 LEFT JOIN account_move_line aml ON aml.move_id = am.id
-                                 LEFT JOIN account_account aa ON aa.id = aml.account_id
-                                 LEFT JOIN account_journal aj ON aj.id = am.journal_id
-                                 WHERE aa.id = """ + str(account.id) + """
-                                 GROUP BY aa.name, aj.name"""
+                    sum(aml.credit) AS total_credit, COALESCE(SUM(aml.debit - aml.credit),0) AS balance
+                    FROM account_move_line aml
+                    LEFT JOIN account_account aa ON aa.id = aml.account_id
+                    LEFT JOIN account_journal aj ON aj.id = aml.journal_id
+                    WHERE """ + where.sql + """
+                    GROUP BY aa.name, aj.name"""
 
         cr = self._cr
-        cr.execute(sql2)
+        cr.execute(sql2, where.params)
         fetched_data = cr.dictfetchall()
         if fetched_data:
             return {
@@ -11,6 +11,8 @@ try:
 except ImportError:
     import xlsxwriter
 
+from .report_filter import move_line_where
+
 
 class AgeingView(models.TransientModel):
     _name = 'account.day.book'
@@ -178,33 +180,8 @@ class AgeingView(models.TransientModel):
 
     def _get_account_move_entry(self, accounts, form_data,journals, pass_date):
         cr = self.env.cr
-        move_line = self.env['account.move.line']
-        tables, where_clause, where_params = move_line._query_get()
-        wheres = [""]
-        if where_clause.strip():
-            wheres.append(where_clause.strip())
-        if form_data['target_move'] == 'posted':
-            target_move = "AND m.state = 'posted'"
-        else:
-            target_move = ''
-        sql = ('''
-                SELECT l.id AS lid,m.id AS move_id, acc.name as accname, l.account_id AS account_id, l.date AS ldate, j.code AS lcode, l.currency_id, 
-                l.amount_currency, l.ref AS lref, l.name AS lname, COALESCE(l.debit,0) AS debit, COALESCE(l.credit,0) AS credit, 
-                COALESCE(SUM(l.debit),0) - COALESCE(SUM(l.credit), 0) AS balance,
-                m.name AS move_name, c.symbol AS currency_code, p.name AS partner_name
-                FROM account_move_line l
-                JOIN account_move m ON (l.move_id=m.id)
-                LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                JOIN account_journal j ON (l.journal_id=j.id)
-                JOIN account_account acc ON (l.account_id = acc.id) 
-                WHERE l.account_id IN %s AND l.journal_id IN %s ''' + target_move + ''' AND l.date = %s
-                GROUP BY l.id,m.id, l.account_id, l.date,
-                     j.code, l.currency_id, l.amount_currency, l.ref, l.name, m.name, c.symbol, p.name , acc.name
-                     ORDER BY l.date DESC
-        ''')
-        params = (
-        tuple(accounts.ids), tuple(journals.ids), datetime.strptime(pass_date, '%d/%m/%Y'))
+        day = datetime.strptime(pass_date, '%d/%m/%Y').date()
+        sql, params = self._get_account_move_entry_query(accounts, form_data, journals, day)
         cr.execute(sql, params)
         data = cr.dictfetchall()
 
@@ -226,6 +203,29 @@ class AgeingView(models.TransientModel):
         res['move_id'] = id
         return res
 
+    def _get_account_move_entry_query(self, accounts, form_data, journals, day):
+        """ Query of the journal items of the given accounts and journals
+        dated ``day``, along with its parameters."""
+        where = move_line_where(self.env, {'target_move': form_data['target_move']},
+                                date_from=day, date_to=day)
+        where.add("{l}.account_id = ANY(%s)", accounts.ids)
+        where.add("{l}.journal_id = ANY(%s)", journals.ids)
+        sql = ('''
+                SELECT l.id AS lid,m.id AS move_id, acc.name as accname, l.account_id AS account_id, l.date AS ldate, j.code AS lcode, l.currency_id, 
+                l.amount_currency, l.ref AS lref, l.name AS lname, COALESCE(l.debit,0) AS debit, COALESCE(l.credit,0) AS credit, 
+                COALESCE(l.debit,0) - COALESCE(l.credit, 0) AS balance,
+                m.name AS move_name, c.symbol AS currency_code, p.name AS partner_name
+                FROM account_move_line l
+                JOIN account_move m ON (l.move_id=m.id)
+                LEFT JOIN res_currency c ON (l.currency_id=c.id)
+                LEFT JOIN res_partner p ON (l.partner_id=p.id)
+                JOIN account_journal j ON (l.journal_id=j.id)
+                JOIN account_account acc ON (l.account_id = acc.id) 
+                WHERE ''' + where.sql + '''
+                ORDER BY l.date DESC
+        ''')
+        return sql, where.params
+
     @api.model
     def _get_currency(self):
         journal = self.env['account.journal'].browse(
@@ -10,6 +10,20 @@ except ImportError:
     import xlsxwriter
     
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from dateutil.relativedelta import relativedelta
+from odoo.tools import config
+
+from .report_filter import display_account_having, move_line_where
+
+FETCH_RANGE = 200
+# Threads computing the months of a General Ledger in parallel, 0 or 1
+# computing the whole period with a single query.
+LEDGER_WORKERS = int(config.get('dynamic_report_ledger_workers', 0))
+
 
 class GeneralView(models.TransientModel):
     _inherit = "account.common.report"
@@ -33,6 +47,9 @@ class GeneralView(models.TransientModel):
         [('all', 'All'), ('movement', 'With movements'),
          ('not_zero', 'With balance is not equal to 0')],
         string='Display Accounts', required=True, default='movement')
+    partner_subtotals = fields.Boolean(
+        'Partner Subtotals',
+        help="Subtotal the lines of each account by partner.")
     titles = fields.Char('Title')
     target_move = fields.Selection([('posted', 'All Posted Entries'),
                                     ('all', 'All Entries')],
@@ -40,58 +57,128 @@ class GeneralView(models.TransientModel):
 
     @api.model
     def view_report(self, option, title, detail_acc=False, load_all_ml=True):
+        """ Report values of the wizard. Without ``load_all_ml`` the screen
+        gets the balances of the accounts only and loads the move lines per
+        account on unfold, reusing the result of the prints when it is
+        cached already."""
         r = self.env['account.general.ledger'].search([('id', '=', option[0])])
+        new_title, data = r._get_report_data(title, detail_acc, load_all_ml)
+        r.write({
+            'titles': new_title,
+        })
+        cache = self.env['dynamic.report.cache']
+        if not load_all_ml and not detail_acc:
+            res = cache._get_cached(r, 'view_report', [title, detail_acc, True])
+            if res is not None:
+                if not res['journal_sections']:
+                    for line in res['report_lines']:
+                        line['move_lines'] = False
+                return res
+        return cache._get_or_compute(
+            r, 'view_report', [title, detail_acc, load_all_ml],
+            lambda: r._compute_view_report(option, new_title, data))
+
+    def _compute_view_report(self, option, new_title, data):
+        filters = self.get_filter(option)
+        records = self._get_report_values(data)
+        currency = self._get_currency()
+        return {
+            'name': new_title,
+            'type': 'ir.actions.client',
+            'tag': 'g_l',
+            'filters': filters,
+            'report_lines': records['Accounts'],
+            'debit_total': records['debit_total'],
+            'credit_total': records['credit_total'],
+            'debit_balance': records['debit_balance'],
+            'journal_sections': data['journal_sections'],
+            'currency': currency,
+            'datetime': datetime
+        }
+
+    def _get_report_data(self, title, detail_acc=False, load_all_ml=True):
+        """ Resolve the journals of the report from its title and collect
+        the wizard values used by the ledger queries."""
         new_title = ''
-        journals = r.journal_ids
+        journals = self.journal_ids
         if title == 'General Ledger':
-            journals = r.journal_ids
+            journals = self.journal_ids
             new_title = 'General Ledger'
+        journal_type = False
         if title == 'Bank Book':
-            journals = self.env['account.journal'].search([('type', '=', 'bank')],
-                                                          limit=1)
+            journal_type = 'bank'
             new_title = 'Bank Book'
         if title == 'Cash Book':
-            journals = self.env['account.journal'].search([('type', '=', 'cash')],
-                                                          limit=1)
+            journal_type = 'cash'
             new_title = 'Cash Book'
-        r.write({
-            'titles': new_title,
-        })
+        if journal_type:
+            journals = self.journal_ids.filtered(lambda j: j.type == journal_type)
+            if not journals:
+                journals = self.env['account.journal'].search([
+                    ('type', '=', journal_type),
+                    ('company_id', 'in', self.env.companies.ids)])
         data = {
-            'display_account': r.display_account,
-            'model':self,
+            'display_account': self.display_account,
+            'model': self,
             'journals': journals,
-            'target_move': r.target_move,
-            'accounts': r.account_ids,
-            'account_tags': r.account_tag_ids,
-            'analytics': r.analytic_ids,
-            'analytic_tags': r.analytic_tag_ids,
+            'target_move': self.target_move,
+            'accounts': self.account_ids,
+            'account_tags': self.account_tag_ids,
+            'analytics': self.analytic_ids,
+            'analytic_tags': self.analytic_tag_ids,
             'detail_acc': detail_acc,
-            'load_all_ml': load_all_ml
+            'load_all_ml': load_all_ml,
+            'journal_sections': bool(journal_type),
+            'partner_subtotals': self.partner_subtotals,
         }
-        if r.date_from:
+        if self.date_from:
             data.update({
-                'date_from': r.date_from,
+                'date_from': self.date_from,
             })
-        if r.date_to:
+        if self.date_to:
             data.update({
-                'date_to': r.date_to,
+                'date_to': self.date_to,
             })
+        return new_title, data
 
-        filters = r.get_filter(option)
-        records = r._get_report_values(data)
-        currency = r._get_currency()
+    @api.model
+    def get_account_lines(self, wizard_id, account_id, page=False):
+        """ Return one page of the move lines of an account for the drill-down.
+
+        This is read only: the journals are resolved from the title stored by
+        the last ``view_report`` call, and neither the filter lists nor the
+        report totals are computed again. The lines are ordered on (date,
+        move, line), first by partner with the partner subtotals, and
+        ``page`` is the cursor returned with the previous page, i.e. the key
+        of its last line along with the running balance reached there."""
+        r = self.browse(wizard_id)
+        data = r._get_report_data(r.titles, account_id, False)[1]
+        account = self.env['account.account'].browse(account_id)
+        if data.get('partner_subtotals'):
+            move_lines, next_page = r._get_partner_lines_page(account, data, page)
+        else:
+            move_lines, next_page = r._get_move_lines_page(account, data, page)
         return {
-            'name': new_title,
-            'type': 'ir.actions.client',
-            'tag': 'g_l',
-            'filters': filters,
-            'report_lines': records['Accounts'],
-            'debit_total': records['debit_total'],
-            'credit_total': records['credit_total'],
-            'debit_balance': records['debit_balance'],
-            'currency': currency,
-            'datetime': datetime
+            'account_id': account_id,
+            'move_lines': move_lines,
+            'cursor': next_page,
+            'currency': r._get_currency(),
+        }
+
+    @api.model
+    def search_lines(self, wizard_id, term, page=False):
+        """ Return one page of the move lines matching ``term`` in their
+        label, reference, move or partner name, across the accounts of the
+        report. Like ``get_account_lines`` this only reads the filters of
+        the wizard, and ``page`` is the cursor returned with the previous
+        page of results."""
+        r = self.browse(wizard_id)
+        data = r._get_report_data(r.titles, False, False)[1]
+        move_lines, next_page = r._search_move_lines(data, term, page)
+        return {
+            'move_lines': move_lines,
+            'cursor': next_page,
+            'currency': r._get_currency(),
         }
 
     def get_filter(self, option):
@@ -134,6 +221,7 @@ class GeneralView(models.TransientModel):
         filters['analytic_tag_list'] = data.get('analytic_tag_list')
         filters['company_name'] = data.get('company_name')
         filters['target_move'] = data.get('target_move').capitalize()
+        filters['partner_subtotals'] = data.get('partner_subtotals')
 
         return filters
 
@@ -160,6 +248,7 @@ class GeneralView(models.TransientModel):
             'date_from': r.date_from,
             'date_to': r.date_to,
             'target_move': r.target_move,
+            'partner_subtotals': r.partner_subtotals,
             'journals_list': [(j.id, j.name, j.code) for j in journals],
             'accounts_list': [(a.id, a.name) for a in accounts],
             'account_tag_list': [(a.id, a.name) for a in account_tags],
@@ -178,8 +267,10 @@ class GeneralView(models.TransientModel):
         accounts = self.env['account.account'].search([])
         if not accounts:
             raise UserError(_("No Accounts Found! Please Add One"))
-        account_res = self._get_accounts(accounts, init_balance, display_account, data)
-        print (account_res)
+        if data.get('journal_sections'):
+            account_res = self._get_journal_lines(data)
+        else:
+            account_res = self._get_accounts(accounts, init_balance, display_account, data)
         debit_total = 0
         currency = self.env.company.currency_id
         debit_total = sum(x['debit'] for x in account_res)
@@ -228,272 +319,836 @@ class GeneralView(models.TransientModel):
         return res
 
     def _get_accounts(self, accounts, init_balance, display_account, data):
-        cr = self.env.cr
-        MoveLine = self.env['account.move.line']
-        move_lines = {x: [] for x in accounts.ids}
-        currency = self.env.company.currency_id
         det_acc = data.get('detail_acc', False)
         load_all_ml = data.get('load_all_ml', False)
 
-        tables, where_clause, where_params = MoveLine._query_get()
-        wheres = [""]
-        if where_clause.strip():
-            wheres.append(where_clause.strip())
-        final_filters = " AND ".join(wheres)
-        final_filters = final_filters.replace('account_move_line__move_id', 'm').replace(
-            'account_move_line', 'l')
-        new_final_filter = final_filters
-        acc_bal_filter = final_filters
-        if data['target_move'] == 'posted':
-            new_final_filter += " AND m.state = 'posted'"
-            acc_bal_filter += " AND m.state = 'posted'"
-        else:
-            new_final_filter += " AND m.state in ('draft','posted')"
-            acc_bal_filter += " AND m.state in ('draft','posted')"
-        if data.get('date_from'):
-            new_final_filter += " AND l.date >= '%s'" % data.get('date_from')
-        if data.get('date_to'):
-            new_final_filter += " AND l.date <= '%s'" % data.get('date_to')
-            acc_bal_filter += " AND l.date <= '%s'" % data.get('date_to')
-        if data['journals']:
-            new_final_filter += ' AND j.id IN %s' % str(tuple(data['journals'].ids) + tuple([0]))
-            acc_bal_filter += ' AND j.id IN %s' % str(tuple(data['journals'].ids) + tuple([0]))
-        if data.get('accounts'):
-            WHERE = "WHERE l.account_id IN %s" % str(tuple(data.get('accounts').ids) + tuple([0]))
-        else:
-            WHERE = "WHERE l.account_id IN %s"
-        if data.get('analytics'):
-            WHERE += ' AND anl.id IN %s' % str(tuple(data.get('analytics').ids) + tuple([0]))
-        if data.get('analytic_tags'):
-            WHERE += ' AND anltag.account_analytic_tag_id IN %s' % str(
-                tuple(data.get('analytic_tags').ids) + tuple([0]))
-
-        # Get move lines base on sql query and Calculate the total balance of move lines
-        if data.get('accounts'):
-            params = tuple(where_params)
-        else:
-            params = (tuple(accounts.ids),) + tuple(where_params)
         account_res = []
-        if det_acc:
-            accounts = self.env['account.account'].browse([det_acc])
         if data.get('accounts'):
             accounts = data.get('accounts')
+        if det_acc and not load_all_ml:
+            accounts = self.env['account.account'].browse([det_acc])
+        account_data = self._get_account_balances(accounts, display_account, data)
         if det_acc or load_all_ml:
-            for account in accounts:
-                account_balance_query = """SELECT
-                                                a.code as code,
-                                                a.name as name,
-                                                a.id as id,
-                                                COALESCE(sum(l.debit), 0) as debit,
-                                                COALESCE(sum(l.credit), 0) as credit,
-                                                COALESCE(sum(l.debit - l.credit), 0) as balance
-                                            FROM account_move_line l
-                                            LEFT JOIN account_move m on m.id=l.move_id
-                                            LEFT JOIN account_journal j on j.id=m.journal_id
-                                            LEFT JOIN account_account a on a.id=l.account_id """ + WHERE + acc_bal_filter + """ AND l.account_id=%s GROUP BY a.code, a.name, a.id"""%(account.id)
-                cr.execute(account_balance_query, params)
-                account_data = cr.dictfetchall()
-                # print (account_data)
-                move_line_data = []
-                if not account_data:
-                    vals = {
-                        'code': account.code,
-                        'name': account.name,
-                        'id': account.id,
-                        'debit': 0.00,
-                        'credit': 0.00,
-                        'balance': 0.00,
-                        'move_lines': []
-                        }
-                    account_res.append(vals)
-                elif load_all_ml or (det_acc and det_acc == account.id):
-                    if init_balance and data.get('date_from'):
-                        init_tables, init_where_clause, init_where_params = MoveLine.with_context(
-                            date_from=self.env.context.get('date_from'), date_to=False,
-                            initial_bal=True)._query_get()
-                        init_wheres = [""]
-                        if init_where_clause.strip():
-                            init_wheres.append(init_where_clause.strip())
-                        init_filters = " AND ".join(init_wheres)
-                        filters = init_filters.replace('account_move_line__move_id',
-                                                       'm').replace('account_move_line',
-                                                                    'l')
-                        new_filter = filters
-                        if data['target_move'] == 'posted':
-                            new_filter += " AND m.state = 'posted'"
-                        else:
-                            new_filter += " AND m.state in ('draft','posted')"
-                        if data.get('date_from'):
-                            new_filter += " AND l.date < '%s'" % data.get('date_from')
-                        if data['journals']:
-                            new_filter += ' AND j.id IN %s' % str(tuple(data['journals'].ids) + tuple([0]))
-                        if data.get('accounts'):
-                            OP_WHERE = "WHERE l.account_id IN %s" % str(tuple(data.get('accounts').ids) + tuple([0]))
-                        else:
-                            OP_WHERE = "WHERE l.account_id IN %s"
-                        if data.get('analytics'):
-                            OP_WHERE += ' AND anl.id IN %s' % str(tuple(data.get('analytics').ids) + tuple([0]))
-                        if data.get('analytic_tags'):
-                            OP_WHERE += ' AND anltag.account_analytic_tag_id IN %s' % str(
-                                tuple(data.get('analytic_tags').ids) + tuple([0]))
-                        
-                        move_line_query = """WITH data as (
-                                                    SELECT
-                                                        0 AS lid,
-                                                        0 AS move_id,
-                                                        l.account_id AS account_id,
-                                                        '""" + data.get('date_from').strftime("%Y-%m-%d") + """' AS ldate,
-                                                        '' AS lcode,
-                                                        """ + str(currency.id) + """ as currency_id,
-                                                        0.00 as amount_currency,
-                                                        '' AS lref,
-                                                        'Initial Balance' AS lname,
-                                                        COALESCE(SUM(l.debit),0) AS debit,
-                                                        COALESCE(SUM(l.credit),0) AS credit,
-                                                        COALESCE(SUM(l.debit - l.credit),0) AS balance,
-                                                        '' AS move_name,
-                                                        '""" + currency.symbol + """' AS currency_code,
-                                                        '' AS partner_name
-                                                    FROM account_move_line l
-                                                        LEFT JOIN account_move m ON (l.move_id=m.id)
-                                                        LEFT JOIN res_currency c ON (l.currency_id=c.id)
-                                                        LEFT JOIN res_partner p ON (l.partner_id=p.id)
-                                                        LEFT JOIN account_move i ON (m.id =i.id)
-                                                        LEFT JOIN account_account_tag_account_move_line_rel acc ON (acc.account_move_line_id=l.id)
-                                                        LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                                                        LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id=l.id)
-                                                        JOIN account_journal j ON (l.journal_id=j.id)"""+ OP_WHERE + new_filter  + """ AND l.account_id = """ + str(account.id) + """ GROUP BY l.account_id
-                                                    UNION
-                                                    SELECT
-                                                        l.id AS lid,
-                                                        m.id AS move_id,
-                                                        l.account_id AS account_id,
-                                                        l.date AS ldate,
-                                                        j.code AS lcode,
-                                                        l.currency_id,
-                                                        l.amount_currency,
-                                                        l.ref AS lref,
-                                                        l.name AS lname,
-                                                        COALESCE(l.debit,0) AS debit,
-                                                        COALESCE(l.credit,0) AS credit,
-                                                        COALESCE(SUM(l.balance),0) AS balance,
-                                                        m.name AS move_name,
-                                                        c.symbol AS currency_code,
-                                                        p.name AS partner_name
-                                                    FROM
-                                                        account_move_line l
-                                                        JOIN account_move m ON (l.move_id=m.id)\
-                                                        LEFT JOIN res_currency c ON (l.currency_id=c.id)\
-                                                        LEFT JOIN res_partner p ON (l.partner_id=p.id)\
-                                                        LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                                                        LEFT JOIN account_account_tag_account_move_line_rel acc ON (acc.account_move_line_id=l.id)
-                                                        LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id=l.id)
-                                                        JOIN account_journal j ON (l.journal_id=j.id)\
-                                                        JOIN account_account a ON (l.account_id = a.id) """+ WHERE + new_final_filter +""" AND l.account_id = """ + str(account.id) + """ GROUP BY l.id,
-                                                        m.id,  l.account_id,
-                                                        l.date, j.code, l.currency_id, l.amount_currency, l.ref, l.name, m.name, c.symbol, c.position, p.name ORDER BY ldate desc, move_id)
-                                            SELECT
-                                                lid,
-                                                move_id,
-                                                account_id as m_id,
-                                                to_char(ldate, 'DD/MM/YYYY') as ldate,
-                                                lcode,
-                                                currency_id,
-                                                amount_currency,
-                                                lref,
-                                                lname,
-                                                debit,
-                                                credit,
-                                                sum(balance) over (order by ldate asc,lcode rows between unbounded preceding and current row) as balance,
-                                                move_name,
-                                                currency_code,
-                                                partner_name
-                                            FROM data"""
-                        if data.get('accounts'):
-                            op_params = tuple(init_where_params)
-                        else:
-                            op_params = (tuple(accounts.ids),) + tuple(init_where_params)
-                        op_params = tuple(op_params) + tuple(params)
-                        cr.execute(move_line_query, op_params)
-                        move_line_data = cr.dictfetchall()
-                    else:
-                        move_line_query = """WITH data as (
-                                                    SELECT
-                                                        l.id AS lid,
-                                                        m.id AS move_id,
-                                                        l.account_id AS account_id,
-                                                        l.date AS ldate,
-                                                        j.code AS lcode,
-                                                        l.currency_id,
-                                                        l.amount_currency,
-                                                        l.ref AS lref,
-                                                        l.name AS lname,
-                                                        COALESCE(l.debit,0) AS debit,
-                                                        COALESCE(l.credit,0) AS credit,
-                                                        COALESCE(SUM(l.balance),0) AS balance,
-                                                        m.name AS move_name,
-                                                        c.symbol AS currency_code,
-                                                        p.name AS partner_name
-                                                    FROM
-                                                        account_move_line l
-                                                        JOIN account_move m ON (l.move_id=m.id)\
-                                                        LEFT JOIN res_currency c ON (l.currency_id=c.id)\
-                                                        LEFT JOIN res_partner p ON (l.partner_id=p.id)\
-                                                        LEFT JOIN account_analytic_account anl ON (l.analytic_account_id=anl.id)
-                                                        LEFT JOIN account_account_tag_account_move_line_rel acc ON (acc.account_move_line_id=l.id)
-                                                        LEFT JOIN account_analytic_tag_account_move_line_rel anltag ON (anltag.account_move_line_id=l.id)
-                                                        JOIN account_journal j ON (l.journal_id=j.id)\
-                                                        JOIN account_account a ON (l.account_id = a.id) """+ WHERE + new_final_filter +""" AND l.account_id = """ + str(account.id) + """ GROUP BY l.id,
-                                                        m.id,  l.account_id,
-                                                        l.date, j.code, l.currency_id, l.amount_currency, l.ref, l.name, m.name, c.symbol, c.position, p.name  ORDER BY l.date desc, m.id)
-                                            SELECT
-                                                lid,
-                                                move_id,
-                                                account_id as m_id,
-                                                to_char(ldate, 'DD/MM/YYYY') as ldate,
-                                                lcode,
-                                                currency_id,
-                                                amount_currency,
-                                                lref,
-                                                lname,
-                                                debit,
-                                                credit,
-                                                sum(balance) over (order by ldate asc,lcode rows between unbounded preceding and current row) as balance,
-                                                move_name,
-                                                currency_code,
-                                                partner_name
-                                            FROM data"""
-                        cr.execute(move_line_query, params)
-                        move_line_data = cr.dictfetchall()
-                    # print (move_line_data)
-                if account_data:
-                    account_data[0]['move_lines'] = move_line_data
-                    account_res.append(account_data[0])
+            if display_account != 'all':
+                accounts = self.env['account.account'].browse(
+                    [row['id'] for row in account_data])
+            if data.get('partner_subtotals'):
+                account_res = self._get_partner_ledger_lines(accounts, init_balance, data)
+            else:
+                account_res = self._get_ledger_lines(accounts, init_balance, data)
         else:
-            account_balance_query = """SELECT
-                                            a.code as code,
-                                            a.name as name,
-                                            a.id as id,
-                                            false as move_lines,
-                                            COALESCE(sum(l.debit), 0) as debit,
-                                            COALESCE(sum(l.credit), 0) as credit,
-                                            COALESCE(sum(l.debit - l.credit), 0) as balance
-                                        FROM
-                                            account_account a
-                                            LEFT JOIN account_move_line l ON l.account_id = a.id
-                                            LEFT JOIN account_move m ON m.id = l.move_id
-                                            LEFT JOIN account_journal j ON j.id=m.journal_id """ + WHERE + acc_bal_filter + """
-                                            AND a.company_id = %s
-                                        GROUP BY
-                                            a.code,
-                                            a.name,
-                                            a.id"""%(self.env.company.id)
-            cr.execute(account_balance_query, params)
-            account_data = cr.dictfetchall()
-            if account_data:
-                account_res.extend(account_data)
+            account_res.extend(account_data)
+        return account_res
+
+    def _get_account_balances(self, accounts, display_account, data):
+        """ Debit, credit and balance up to the end date of the accounts of
+        the current company to display, the display mode being applied by
+        the query itself."""
+        where = move_line_where(self.env, data, date_to=data.get('date_to'))
+        having, having_params = display_account_having(
+            display_account, self.env.company.currency_id, date_from=data.get('date_from'))
+        account_balance_query = """SELECT
+                                        a.code as code,
+                                        a.name as name,
+                                        a.id as id,
+                                        false as move_lines,
+                                        COALESCE(sum(l.debit), 0) as debit,
+                                        COALESCE(sum(l.credit), 0) as credit,
+                                        COALESCE(sum(l.debit - l.credit), 0) as balance
+                                    FROM
+                                        account_account a
+                                        LEFT JOIN account_move_line l ON (l.account_id = a.id AND """ + where.sql + """)
+                                    WHERE a.company_id = %s AND a.id = ANY(%s)
+                                    GROUP BY
+                                        a.code,
+                                        a.name,
+                                        a.id"""
+        if having:
+            account_balance_query += " HAVING " + having
+        self.env.cr.execute(account_balance_query, where.params + [
+            self.env.company.id, accounts.ids] + having_params)
+        return self.env.cr.dictfetchall()
+
+    def _get_ledger_opening(self, data, accounts, groupby=('account_id',)):
+        """ Query of the initial balance of the given accounts, grouped by
+        the ``groupby`` columns. The balance snapshots only hold the account
+        and journal dimensions, so the journal items are scanned when
+        filtering on analytic accounts or tags."""
+        if not data.get('analytics') and not data.get('analytic_tags'):
+            return self.env['account.balance.snapshot']._get_opening_query(
+                data['date_from'], data['target_move'], self.env.companies.ids,
+                data['journals'].ids, accounts.ids, groupby)
+        where = move_line_where(self.env, data, date_before=data['date_from'])
+        where.add("{l}.account_id = ANY(%s)", accounts.ids)
+        groupby = ", ".join("l.%s" % column for column in groupby)
+        query = """SELECT
+                        """ + groupby + """,
+                        COALESCE(SUM(l.debit),0) AS debit,
+                        COALESCE(SUM(l.credit),0) AS credit,
+                        COALESCE(SUM(l.debit - l.credit),0) AS balance
+                    FROM account_move_line l
+                    WHERE """ + where.sql + """
+                    GROUP BY """ + groupby
+        return query, where.params
+
+    def _get_ledger_lines(self, accounts, init_balance, data):
+        """ Fetch the initial balance rows and the move lines of all the given
+        accounts with a single windowed query, then split them per account.
+        The account debit, credit and balance are summed while splitting, so
+        the number of queries does not depend on the size of the chart of
+        accounts.
+
+        When ledger workers are configured, periods spanning several months
+        are computed in parallel instead, see ``_get_ledger_lines_parallel``,
+        unless the snapshot of the transaction cannot be shared with them."""
+        cr = self.env.cr
+        if not accounts:
+            return []
+        periods = self._get_ledger_periods(data)
+        if LEDGER_WORKERS > 1 and len(periods) > 1 and not self.pool.in_test_mode():
+            snapshot = self._export_snapshot()
+            if snapshot:
+                return self._get_ledger_lines_parallel(
+                    accounts, init_balance, data, periods, snapshot)
+        parts = [self._get_ledger_line_query(
+            accounts, data, data.get('date_from'), data.get('date_to'))]
+        if init_balance and data.get('date_from'):
+            parts.insert(0, self._get_ledger_init_query(accounts, data))
+        data_query = " UNION ALL ".join(query for query, params in parts)
+        query_params = [param for query, params in parts for param in params]
+        cr.execute(self._get_ledger_window_query(data_query), query_params)
+        account_lines = {}
+        for row in cr.dictfetchall():
+            account_lines.setdefault(row['m_id'], []).append(row)
+        return self._split_ledger_lines(accounts, account_lines)
+
+    def _export_snapshot(self):
+        """ Identifier of the snapshot of the current transaction, or None
+        when it cannot be exported, e.g. on a standby server."""
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("SELECT pg_export_snapshot()")
+                return self.env.cr.fetchone()[0]
+        except psycopg2.Error:
+            return None
+
+    def _get_ledger_lines_parallel(self, accounts, init_balance, data, periods, snapshot):
+        """ Compute the ledger lines one month at a time, each month on its
+        own cursor from a pool of at most ``LEDGER_WORKERS`` threads.
+
+        The cursors all import ``snapshot``, the one of the current
+        transaction, so that the months are computed on the same journal
+        items even when moves are posted meanwhile. Every month comes with
+        running balances starting from zero, which are stitched together
+        afterwards: the lines of a month are shifted by the prefix sum of the
+        totals of the initial balance and of the previous months of the
+        account. The workers do not see the changes not committed yet by the
+        current transaction, a report being run on committed entries."""
+        parts = [self._get_ledger_line_query(accounts, data, date_from, date_to)
+                 for date_from, date_to in periods]
+        if init_balance and data.get('date_from'):
+            parts.insert(0, self._get_ledger_init_query(accounts, data))
+        registry = self.pool
+
+        def fetch(part):
+            query, params = part
+            with registry.cursor() as cr:
+                cr.execute("SET TRANSACTION SNAPSHOT %s", [snapshot])
+                cr.execute(self._get_ledger_window_query(query), params)
+                return cr.dictfetchall()
+
+        with ThreadPoolExecutor(max_workers=min(LEDGER_WORKERS, len(parts))) as executor:
+            chunks = list(executor.map(fetch, parts))
+        offsets = {}
+        account_lines = {}
+        for rows in chunks:
+            totals = {}
+            for row in rows:
+                account_id = row['m_id']
+                row['balance'] += offsets.get(account_id, 0.0)
+                totals[account_id] = totals.get(account_id, 0.0) + row['line_balance']
+                account_lines.setdefault(account_id, []).append(row)
+            for account_id, total in totals.items():
+                offsets[account_id] = offsets.get(account_id, 0.0) + total
+        return self._split_ledger_lines(accounts, account_lines)
+
+    def _get_ledger_periods(self, data):
+        """ Months covered by the dates of the report, as (first day, last
+        day) pairs clipped to these dates."""
+        date_from = data.get('date_from')
+        date_to = data.get('date_to')
+        if not date_from or not date_to:
+            return [(date_from, date_to)]
+        periods = []
+        start = date_from
+        while start <= date_to:
+            end = min(fields.Date.end_of(start, 'month'), date_to)
+            periods.append((start, end))
+            start = end + relativedelta(days=1)
+        return periods
+
+    def _get_ledger_line_query(self, accounts, data, date_from, date_to):
+        """ Query of the move lines of the given accounts between the given
+        dates, along with its parameters."""
+        where = move_line_where(self.env, data, date_from=date_from, date_to=date_to)
+        where.add("{l}.account_id = ANY(%s)", accounts.ids)
+        line_query = """SELECT
+                            l.id AS lid,
+                            m.id AS move_id,
+                            l.account_id AS account_id,
+                            l.date AS ldate,
+                            j.code AS lcode,
+                            l.currency_id,
+                            l.amount_currency,
+                            l.ref AS lref,
+                            l.name AS lname,
+                            COALESCE(l.debit,0) AS debit,
+                            COALESCE(l.credit,0) AS credit,
+                            COALESCE(l.balance,0) AS balance,
+                            m.name AS move_name,
+                            c.symbol AS currency_code,
+                            p.name AS partner_name
+                        FROM
+                            account_move_line l
+                            JOIN account_move m ON (l.move_id=m.id)
+                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
+                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
+                            JOIN account_journal j ON (l.journal_id=j.id)
+                        WHERE """ + where.sql
+        return line_query, where.params
+
+    def _get_ledger_init_query(self, accounts, data):
+        """ Query of the initial balance row of each of the given accounts,
+        shaped like the move lines, along with its parameters."""
+        currency = self.env.company.currency_id
+        opening_query, opening_params = self._get_ledger_opening(data, accounts)
+        init_query = """SELECT
+                            0 AS lid,
+                            0 AS move_id,
+                            o.account_id AS account_id,
+                            %s::date AS ldate,
+                            '' AS lcode,
+                            %s AS currency_id,
+                            0.00 AS amount_currency,
+                            '' AS lref,
+                            'Initial Balance' AS lname,
+                            o.debit AS debit,
+                            o.credit AS credit,
+                            o.balance AS balance,
+                            '' AS move_name,
+                            %s AS currency_code,
+                            '' AS partner_name
+                        FROM (""" + opening_query + """) o"""
+        return init_query, [data['date_from'], currency.id, currency.symbol] + list(opening_params)
+
+    def _get_ledger_window_query(self, data_query):
+        """ Wrap a query of ledger rows to add the running balance of each
+        account."""
+        return """WITH data AS (""" + data_query + """)
+                        SELECT
+                            lid,
+                            move_id,
+                            account_id AS m_id,
+                            to_char(ldate, 'DD/MM/YYYY') AS ldate,
+                            lcode,
+                            currency_id,
+                            amount_currency,
+                            lref,
+                            lname,
+                            debit,
+                            credit,
+                            sum(balance) OVER (PARTITION BY account_id ORDER BY data.ldate, move_id, lid
+                                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS balance,
+                            balance AS line_balance,
+                            move_name,
+                            currency_code,
+                            partner_name
+                        FROM data
+                        ORDER BY account_id, data.ldate, move_id, lid"""
+
+    def _split_ledger_lines(self, accounts, account_lines):
+        """ Ledger of each account (or journal) from its rows, summing its
+        debit, credit and balance."""
+        account_res = []
+        for account in accounts:
+            move_lines = account_lines.get(account.id, [])
+            vals = {
+                'code': account.code,
+                'name': account.name,
+                'id': account.id,
+                'debit': 0.00,
+                'credit': 0.00,
+                'balance': 0.00,
+                'move_lines': move_lines,
+            }
+            for line in move_lines:
+                vals['debit'] += line['debit']
+                vals['credit'] += line['credit']
+                vals['balance'] += line.pop('line_balance')
+            account_res.append(vals)
         return account_res
 
+    def _get_partner_ledger_lines(self, accounts, init_balance, data):
+        """ Ledger of the given accounts with the lines grouped by partner.
+
+        The account totals, the partner subtotals and the lines come from a
+        single query grouping by GROUPING SETS, the running balance being
+        computed per partner over the line rows. The balance snapshots have
+        no partner dimension, so the initial balances are summed from the
+        journal items. The move lines of each account are its partner
+        subtotal rows, flagged with ``partner_subtotal``, each followed by
+        the lines of the partner."""
+        cr = self.env.cr
+        currency = self.env.company.currency_id
+        if not accounts:
+            return []
+        where = move_line_where(self.env, data, date_from=data.get('date_from'),
+                                date_to=data.get('date_to'))
+        where.add("{l}.account_id = ANY(%s)", accounts.ids)
+        data_query = """SELECT
+                            l.id AS lid,
+                            l.move_id AS move_id,
+                            l.account_id,
+                            l.partner_id,
+                            l.date AS ldate,
+                            j.code AS lcode,
+                            l.ref AS lref,
+                            l.name AS lname,
+                            COALESCE(l.debit,0) AS debit,
+                            COALESCE(l.credit,0) AS credit,
+                            COALESCE(l.balance,0) AS balance,
+                            m.name AS move_name
+                        FROM account_move_line l
+                            JOIN account_move m ON (l.move_id=m.id)
+                            JOIN account_journal j ON (l.journal_id=j.id)
+                        WHERE """ + where.sql
+        query_params = where.params
+        if init_balance and data.get('date_from'):
+            opening = move_line_where(self.env, data, date_before=data['date_from'])
+            opening.add("{l}.account_id = ANY(%s)", accounts.ids)
+            data_query = """SELECT
+                                0 AS lid,
+                                0 AS move_id,
+                                l.account_id,
+                                l.partner_id,
+                                %s::date AS ldate,
+                                '' AS lcode,
+                                '' AS lref,
+                                'Initial Balance' AS lname,
+                                COALESCE(SUM(l.debit),0) AS debit,
+                                COALESCE(SUM(l.credit),0) AS credit,
+                                COALESCE(SUM(l.balance),0) AS balance,
+                                '' AS move_name
+                            FROM account_move_line l
+                            WHERE """ + opening.sql + """
+                            GROUP BY l.account_id, l.partner_id
+                            UNION ALL """ + data_query
+            query_params = [data['date_from']] + opening.params + query_params
+        grouped_query = """SELECT
+                               d.account_id AS m_id,
+                               d.partner_id,
+                               p.name AS partner_name,
+                               d.lid,
+                               d.move_id,
+                               to_char(d.ldate, 'DD/MM/YYYY') AS ldate,
+                               d.lcode,
+                               d.lref,
+                               d.lname,
+                               d.move_name,
+                               GROUPING(d.partner_id) AS account_total,
+                               GROUPING(d.lid) AS partner_total,
+                               SUM(d.debit) AS debit,
+                               SUM(d.credit) AS credit,
+                               CASE WHEN GROUPING(d.lid) = 1 THEN SUM(d.balance)
+                                    ELSE SUM(SUM(d.balance)) OVER (
+                                        PARTITION BY d.account_id, d.partner_id, GROUPING(d.lid)
+                                        ORDER BY d.ldate, d.move_id, d.lid
+                                        ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+                               END AS balance
+                           FROM (""" + data_query + """) d
+                               LEFT JOIN res_partner p ON (d.partner_id=p.id)
+                           GROUP BY GROUPING SETS (
+                               (d.account_id),
+                               (d.account_id, d.partner_id, p.name),
+                               (d.account_id, d.partner_id, p.name, d.lid, d.move_id, d.ldate,
+                                d.lcode, d.lref, d.lname, d.move_name))
+                           ORDER BY d.account_id, p.name NULLS FIRST, d.partner_id NULLS FIRST,
+                               GROUPING(d.lid) DESC, d.ldate, d.move_id, d.lid"""
+        cr.execute(grouped_query, query_params)
+        account_totals = {}
+        account_lines = {}
+        for row in cr.dictfetchall():
+            if row['account_total']:
+                account_totals[row['m_id']] = row
+                continue
+            if row['partner_total']:
+                row.update({
+                    'lid': 0,
+                    'move_id': 0,
+                    'ldate': '',
+                    'lname': row['partner_name'] or _('No Partner'),
+                    'partner_subtotal': True,
+                })
+            row.update({
+                'currency_id': currency.id,
+                'currency_code': currency.symbol,
+                'amount_currency': 0.00,
+            })
+            account_lines.setdefault(row['m_id'], []).append(row)
+        account_res = []
+        for account in accounts:
+            totals = account_totals.get(account.id, {})
+            account_res.append({
+                'code': account.code,
+                'name': account.name,
+                'id': account.id,
+                'debit': totals.get('debit', 0.00),
+                'credit': totals.get('credit', 0.00),
+                'balance': totals.get('balance', 0.00),
+                'move_lines': account_lines.get(account.id, []),
+            })
+        return account_res
+
+    def _get_journal_lines(self, data):
+        """ Bank and Cash Book: the move lines of the default account of each
+        journal, with one running balance per journal. All the journals are
+        fetched with a single query partitioned by journal, and each journal
+        is returned as a section shaped like a General Ledger account."""
+        cr = self.env.cr
+        currency = self.env.company.currency_id
+        journals = data['journals']
+        if not journals:
+            return []
+        accounts = journals.mapped('default_account_id')
+        where = move_line_where(self.env, data, date_from=data.get('date_from'),
+                                date_to=data.get('date_to'))
+        line_query = """SELECT
+                            l.id AS lid,
+                            m.id AS move_id,
+                            l.journal_id AS journal_id,
+                            l.date AS ldate,
+                            j.code AS lcode,
+                            l.currency_id,
+                            l.amount_currency,
+                            l.ref AS lref,
+                            l.name AS lname,
+                            COALESCE(l.debit,0) AS debit,
+                            COALESCE(l.credit,0) AS credit,
+                            COALESCE(l.balance,0) AS balance,
+                            m.name AS move_name,
+                            c.symbol AS currency_code,
+                            p.name AS partner_name
+                        FROM
+                            account_move_line l
+                            JOIN account_move m ON (l.move_id=m.id)
+                            JOIN account_journal j ON (l.journal_id=j.id AND l.account_id=j.default_account_id)
+                            LEFT JOIN res_currency c ON (l.currency_id=c.id)
+                            LEFT JOIN res_partner p ON (l.partner_id=p.id)
+                        WHERE """ + where.sql
+        query_params = where.params
+        if data.get('date_from'):
+            opening_query, opening_params = self._get_ledger_opening(
+                data, accounts, ('journal_id', 'account_id'))
+            init_query = """SELECT
+                                0 AS lid,
+                                0 AS move_id,
+                                o.journal_id AS journal_id,
+                                %s::date AS ldate,
+                                '' AS lcode,
+                                %s AS currency_id,
+                                0.00 AS amount_currency,
+                                '' AS lref,
+                                'Initial Balance' AS lname,
+                                o.debit AS debit,
+                                o.credit AS credit,
+                                o.balance AS balance,
+                                '' AS move_name,
+                                %s AS currency_code,
+                                '' AS partner_name
+                            FROM (""" + opening_query + """) o
+                                JOIN account_journal j ON (o.journal_id=j.id AND o.account_id=j.default_account_id)"""
+            line_query = init_query + " UNION ALL " + line_query
+            query_params = [data['date_from'], currency.id, currency.symbol] + list(
+                opening_params) + query_params
+        book_query = """WITH data AS (""" + line_query + """)
+                        SELECT
+                            lid,
+                            move_id,
+                            journal_id AS m_id,
+                            to_char(ldate, 'DD/MM/YYYY') AS ldate,
+                            lcode,
+                            currency_id,
+                            amount_currency,
+                            lref,
+                            lname,
+                            debit,
+                            credit,
+                            sum(balance) OVER (PARTITION BY journal_id ORDER BY data.ldate, move_id, lid
+                                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS balance,
+                            balance AS line_balance,
+                            move_name,
+                            currency_code,
+                            partner_name
+                        FROM data
+                        ORDER BY journal_id, data.ldate, move_id, lid"""
+        cr.execute(book_query, query_params)
+        journal_lines = {}
+        for row in cr.dictfetchall():
+            journal_lines.setdefault(row['m_id'], []).append(row)
+        return self._split_ledger_lines(journals, journal_lines)
+
+    def _get_move_lines_page(self, account, data, cursor=False, limit=FETCH_RANGE):
+        """ Keyset paginated move lines of ``account``.
+
+        Returns the lines of the page and the cursor of the next page, or
+        False when the account has no more lines."""
+        cr = self.env.cr
+        currency = self.env.company.currency_id
+        where = move_line_where(self.env, data, date_from=data.get('date_from'),
+                                date_to=data.get('date_to'))
+        where.add("{l}.account_id = %s", account.id)
+        move_lines = []
+        if cursor:
+            opening = cursor['balance']
+            where.add("({l}.date, {l}.move_id, {l}.id) > (%s, %s, %s)",
+                      cursor['date'], cursor['move_id'], cursor['id'])
+        else:
+            opening = 0.00
+            if data.get('date_from'):
+                opening_query, opening_params = self._get_ledger_opening(data, account)
+                cr.execute("""SELECT
+                                  COALESCE(SUM(debit),0) AS debit,
+                                  COALESCE(SUM(credit),0) AS credit,
+                                  COALESCE(SUM(balance),0) AS balance
+                              FROM (""" + opening_query + """) o""", opening_params)
+                init = cr.dictfetchone()
+                opening = init['balance']
+                move_lines.append({
+                    'lid': 0,
+                    'move_id': 0,
+                    'm_id': account.id,
+                    'ldate': data['date_from'].strftime('%d/%m/%Y'),
+                    'lcode': '',
+                    'currency_id': currency.id,
+                    'amount_currency': 0.00,
+                    'lref': '',
+                    'lname': 'Initial Balance',
+                    'debit': init['debit'],
+                    'credit': init['credit'],
+                    'balance': opening,
+                    'move_name': '',
+                    'currency_code': currency.symbol,
+                    'partner_name': '',
+                })
+        page_query = """SELECT
+                            lid,
+                            move_id,
+                            m_id,
+                            to_char(sort_date, 'DD/MM/YYYY') AS ldate,
+                            sort_date,
+                            lcode,
+                            currency_id,
+                            amount_currency,
+                            lref,
+                            lname,
+                            debit,
+                            credit,
+                            %s + sum(line_balance) OVER (ORDER BY sort_date, move_id, lid
+                                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS balance,
+                            move_name,
+                            currency_code,
+                            partner_name
+                        FROM (
+                            SELECT
+                                l.id AS lid,
+                                l.move_id AS move_id,
+                                l.account_id AS m_id,
+                                l.date AS sort_date,
+                                j.code AS lcode,
+                                l.currency_id,
+                                l.amount_currency,
+                                l.ref AS lref,
+                                l.name AS lname,
+                                COALESCE(l.debit,0) AS debit,
+                                COALESCE(l.credit,0) AS credit,
+                                COALESCE(l.balance,0) AS line_balance,
+                                m.name AS move_name,
+                                c.symbol AS currency_code,
+                                p.name AS partner_name
+                            FROM account_move_line l
+                                JOIN account_move m ON (l.move_id=m.id)
+                                JOIN account_journal j ON (l.journal_id=j.id)
+                                LEFT JOIN res_currency c ON (l.currency_id=c.id)
+                                LEFT JOIN res_partner p ON (l.partner_id=p.id)
+                            WHERE """ + where.sql + """
+                            ORDER BY l.date, l.move_id, l.id
+                            LIMIT %s) page
+                        ORDER BY sort_date, move_id, lid"""
+        cr.execute(page_query, [opening] + where.params + [limit + 1])
+        lines = cr.dictfetchall()
+        next_cursor = False
+        if len(lines) > limit:
+            lines = lines[:limit]
+            last = lines[-1]
+            next_cursor = {
+                'date': fields.Date.to_string(last['sort_date']),
+                'move_id': last['move_id'],
+                'id': last['lid'],
+                'balance': last['balance'],
+            }
+        for line in lines:
+            line.pop('sort_date')
+        move_lines.extend(lines)
+        return move_lines, next_cursor
+
+    def _get_partner_lines_page(self, account, data, cursor=False, limit=FETCH_RANGE):
+        """ Keyset paginated move lines of ``account`` grouped by partner, see
+        ``_get_partner_ledger_lines``.
+
+        The lines, along with the initial balance row of each partner, are
+        ordered on (partner name, partner, date, move, line), and each page
+        starts the partners it reaches with their subtotal row, computed by
+        a window over the lines of the partner. The cursor carries the
+        running balance of the partner of the last line, which the next page
+        goes on from. Returns the lines of the page and the cursor of the
+        next page, or False when the account has no more lines."""
+        cr = self.env.cr
+        currency = self.env.company.currency_id
+        where = move_line_where(self.env, data, date_from=data.get('date_from'),
+                                date_to=data.get('date_to'))
+        where.add("{l}.account_id = %s", account.id)
+        data_query = """SELECT
+                            l.id AS lid,
+                            l.move_id AS move_id,
+                            l.partner_id,
+                            l.date AS sort_date,
+                            j.code AS lcode,
+                            l.ref AS lref,
+                            l.name AS lname,
+                            COALESCE(l.debit,0) AS debit,
+                            COALESCE(l.credit,0) AS credit,
+                            COALESCE(l.balance,0) AS line_balance,
+                            m.name AS move_name
+                        FROM account_move_line l
+                            JOIN account_move m ON (l.move_id=m.id)
+                            JOIN account_journal j ON (l.journal_id=j.id)
+                        WHERE """ + where.sql
+        query_params = where.params
+        if data.get('date_from'):
+            opening = move_line_where(self.env, data, date_before=data['date_from'])
+            opening.add("{l}.account_id = %s", account.id)
+            data_query = """SELECT
+                                0 AS lid,
+                                0 AS move_id,
+                                l.partner_id,
+                                %s::date AS sort_date,
+                                '' AS lcode,
+                                '' AS lref,
+                                'Initial Balance' AS lname,
+                                COALESCE(SUM(l.debit),0) AS debit,
+                                COALESCE(SUM(l.credit),0) AS credit,
+                                COALESCE(SUM(l.balance),0) AS line_balance,
+                                '' AS move_name
+                            FROM account_move_line l
+                            WHERE """ + opening.sql + """
+                            GROUP BY l.partner_id
+                            UNION ALL """ + data_query
+            query_params = [data['date_from']] + opening.params + query_params
+        keyset = ""
+        keyset_params = []
+        offset_partner, offset = -1, 0.00
+        if cursor:
+            keyset = "WHERE (pname, pid, sort_date, move_id, lid) > (%s, %s, %s, %s, %s)"
+            keyset_params = [cursor['name'], cursor['partner_id'], cursor['date'],
+                             cursor['move_id'], cursor['id']]
+            offset_partner, offset = cursor['partner_id'], cursor['balance']
+        page_query = """WITH keyed AS (
+                            SELECT
+                                d.*,
+                                COALESCE(p.name, '') AS pname,
+                                COALESCE(d.partner_id, 0) AS pid,
+                                p.name AS partner_name,
+                                SUM(d.debit) OVER w AS partner_debit,
+                                SUM(d.credit) OVER w AS partner_credit,
+                                SUM(d.line_balance) OVER w AS partner_balance
+                            FROM (""" + data_query + """) d
+                                LEFT JOIN res_partner p ON (d.partner_id=p.id)
+                            WINDOW w AS (PARTITION BY COALESCE(d.partner_id, 0))
+                        )
+                        SELECT
+                            page.*,
+                            to_char(page.sort_date, 'DD/MM/YYYY') AS ldate,
+                            CASE WHEN page.pid = %s THEN %s ELSE 0 END
+                                + sum(page.line_balance) OVER (
+                                    PARTITION BY page.pid ORDER BY page.sort_date, page.move_id, page.lid
+                                    ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS balance
+                        FROM (
+                            SELECT * FROM keyed
+                            """ + keyset + """
+                            ORDER BY pname, pid, sort_date, move_id, lid
+                            LIMIT %s) page
+                        ORDER BY page.pname, page.pid, page.sort_date, page.move_id, page.lid"""
+        cr.execute(page_query, query_params + [offset_partner, offset] + keyset_params + [limit + 1])
+        lines = cr.dictfetchall()
+        next_cursor = False
+        if len(lines) > limit:
+            lines = lines[:limit]
+            last = lines[-1]
+            next_cursor = {
+                'name': last['pname'],
+                'partner_id': last['pid'],
+                'date': fields.Date.to_string(last['sort_date']),
+                'move_id': last['move_id'],
+                'id': last['lid'],
+                'balance': last['balance'],
+            }
+        move_lines = []
+        for line in lines:
+            if line['pid'] != offset_partner:
+                offset_partner = line['pid']
+                move_lines.append({
+                    'm_id': account.id,
+                    'partner_id': line['partner_id'],
+                    'partner_name': line['partner_name'],
+                    'lid': 0,
+                    'move_id': 0,
+                    'ldate': '',
+                    'lcode': '',
+                    'lref': '',
+                    'lname': line['partner_name'] or _('No Partner'),
+                    'move_name': '',
+                    'debit': line['partner_debit'],
+                    'credit': line['partner_credit'],
+                    'balance': line['partner_balance'],
+                    'partner_subtotal': True,
+                    'currency_id': currency.id,
+                    'currency_code': currency.symbol,
+                    'amount_currency': 0.00,
+                })
+            move_lines.append({
+                'm_id': account.id,
+                'partner_id': line['partner_id'],
+                'partner_name': line['partner_name'],
+                'lid': line['lid'],
+                'move_id': line['move_id'],
+                'ldate': line['ldate'],
+                'lcode': line['lcode'],
+                'lref': line['lref'],
+                'lname': line['lname'],
+                'move_name': line['move_name'],
+                'debit': line['debit'],
+                'credit': line['credit'],
+                'balance': line['balance'],
+                'currency_id': currency.id,
+                'currency_code': currency.symbol,
+                'amount_currency': 0.00,
+            })
+        return move_lines, next_cursor
+
+    def _search_move_lines(self, data, term, cursor=False, limit=FETCH_RANGE):
+        """ Keyset paginated move lines matching ``term``, ordered on (date,
+        move, line), with the running balance of their account at each line.
+
+        The lines matching on their label, reference, move or partner name
+        are collected by a union of one ILIKE lookup per text, each served by
+        the trigram index of its table, before being joined with the filters
+        of the report. The running balances of the page are computed by a
+        window over the lines of the accounts found up to the last date of
+        the page, plus the initial balances of these accounts.
+        Returns the lines of the page and the cursor of the next page, or
+        False when there are no more matching lines."""
+        cr = self.env.cr
+        term = (term or '').strip()
+        if not term:
+            return [], False
+        pattern = '%' + term.replace('\\', '\\\\').replace(
+            '%', '\\%').replace('_', '\\_') + '%'
+        where = move_line_where(self.env, data, date_from=data.get('date_from'),
+                                date_to=data.get('date_to'))
+        running = move_line_where(self.env, data, alias='r', date_from=data.get('date_from'),
+                                  date_to=data.get('date_to'))
+        if cursor:
+            where.add("({l}.date, {l}.move_id, {l}.id) > (%s, %s, %s)",
+                      cursor['date'], cursor['move_id'], cursor['id'])
+        search_query = """WITH matched AS (
+                              SELECT id FROM account_move_line WHERE name ILIKE %s
+                              UNION
+                              SELECT id FROM account_move_line WHERE ref ILIKE %s
+                              UNION
+                              SELECT ml.id FROM account_move mm
+                                  JOIN account_move_line ml ON (ml.move_id=mm.id)
+                              WHERE mm.name ILIKE %s
+                              UNION
+                              SELECT ml.id FROM res_partner pp
+                                  JOIN account_move_line ml ON (ml.partner_id=pp.id)
+                              WHERE pp.name ILIKE %s
+                          ), page AS (
+                              SELECT
+                                  l.id AS lid,
+                                  l.move_id AS move_id,
+                                  l.account_id AS m_id,
+                                  a.code AS account_code,
+                                  a.name AS account_name,
+                                  l.date AS sort_date,
+                                  j.code AS lcode,
+                                  l.currency_id,
+                                  l.amount_currency,
+                                  l.ref AS lref,
+                                  l.name AS lname,
+                                  COALESCE(l.debit,0) AS debit,
+                                  COALESCE(l.credit,0) AS credit,
+                                  m.name AS move_name,
+                                  c.symbol AS currency_code,
+                                  p.name AS partner_name
+                              FROM matched
+                                  JOIN account_move_line l ON (l.id=matched.id)
+                                  JOIN account_move m ON (l.move_id=m.id)
+                                  JOIN account_account a ON (l.account_id=a.id)
+                                  JOIN account_journal j ON (l.journal_id=j.id)
+                                  LEFT JOIN res_currency c ON (l.currency_id=c.id)
+                                  LEFT JOIN res_partner p ON (l.partner_id=p.id)
+                              WHERE """ + where.sql + """
+                              ORDER BY l.date, l.move_id, l.id
+                              LIMIT %s
+                          ), run AS (
+                              SELECT
+                                  r.id,
+                                  sum(r.balance) OVER (PARTITION BY r.account_id ORDER BY r.date, r.move_id, r.id
+                                      ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS balance
+                              FROM account_move_line r
+                              WHERE """ + running.sql + """
+                                  AND r.account_id IN (SELECT m_id FROM page)
+                                  AND r.date <= (SELECT max(sort_date) FROM page)
+                          )
+                          SELECT
+                              page.*,
+                              to_char(page.sort_date, 'DD/MM/YYYY') AS ldate,
+                              COALESCE(run.balance,0) AS balance
+                          FROM page
+                              JOIN run ON (run.id=page.lid)
+                          ORDER BY page.sort_date, page.move_id, page.lid"""
+        cr.execute(search_query, [pattern] * 4 + where.params + [limit + 1] + running.params)
+        lines = cr.dictfetchall()
+        next_cursor = False
+        if len(lines) > limit:
+            lines = lines[:limit]
+            last = lines[-1]
+            next_cursor = {
+                'date': fields.Date.to_string(last['sort_date']),
+                'move_id': last['move_id'],
+                'id': last['lid'],
+            }
+        if lines and data.get('date_from'):
+            accounts = self.env['account.account'].browse({line['m_id'] for line in lines})
+            opening_query, opening_params = self._get_ledger_opening(data, accounts)
+            cr.execute(opening_query, opening_params)
+            openings = {row['account_id']: row['balance'] for row in cr.dictfetchall()}
+            for line in lines:
+                line['balance'] += openings.get(line['m_id'], 0.00)
+        for line in lines:
+            line.pop('sort_date')
+        return lines, next_cursor
+
     @api.model
     def _get_currency(self):
         journal = self.env['account.journal'].browse(
@@ -1,5 +1,6 @@
 import time
 from odoo import fields, models, api, _
+from odoo.tools import split_every
 
 import io
 import json
@@ -10,6 +11,17 @@ try:
 except ImportError:
     import xlsxwriter
 
+from .report_filter import move_line_where, search_partners
+
+# Partner rows per page of the summary, and the columns it can be sorted on.
+SUMMARY_PAGE_SIZE = 200
+SUMMARY_SORTS = {
+    'name': 'name',
+    'debit': 'debit',
+    'credit': 'credit',
+    'balance': 'balance',
+}
+
 
 class PartnerView(models.TransientModel):
     _inherit = "account.common.report"
@@ -32,8 +44,13 @@ class PartnerView(models.TransientModel):
     partner_category_ids = fields.Many2many('res.partner.category',
                                             string='Partner tags')
     reconciled = fields.Selection([
-        ('unreconciled', 'Unreconciled Only')],
-        string='Reconcile Type', default='unreconciled')
+        ('all', 'All Items'),
+        ('unreconciled', 'Open Items Only')],
+        string='Reconcile Type', default='all')
+    partner_rollup = fields.Boolean(
+        string='Group by Commercial Entity',
+        help="Aggregate the journal items of the contacts on their commercial "
+             "entity, the company they belong to.")
 
     account_type_ids = fields.Many2many('account.account.type',string='Account Type',
                                         domain=[('type', 'in', ('receivable', 'payable'))])
@@ -46,286 +63,227 @@ class PartnerView(models.TransientModel):
         return res
 
     def get_where_condition(self, opening=False, detail=False):
-        tables, where_clause, where_params = self.env['account.move.line']._query_get()
-        where_clause = where_clause.replace("account_move_line__move_id", "am")
-        where_clause = where_clause.replace("account_move_line", "aml")
-        where_clause += " AND aat.type in ('receivable', 'payable') AND aml.partner_id is not null"
-        if self.journal_ids:
-            journal_ids = self.journal_ids.ids
-            if len(journal_ids) == 1:
-                where_clause += " AND am.journal_id = %s"%(journal_ids[0])
-            else:
-                where_clause += " AND am.journal_id in %s"%(tuple(journal_ids),)
-        if self.account_ids:
-            account_ids = self.account_ids.ids
-            if len(account_ids) == 1:
-                where_clause += " AND aml.account_id = %s"%(account_ids[0])
-            else:
-                where_clause += " AND aml.account_id in %s"%(tuple(account_ids),)
-        if self.partner_ids:
-            partner_ids = self.partner_ids.ids
-            if len(partner_ids) == 1:
-                where_clause += " AND aml.partner_id = %s"%(partner_ids[0])
-            else:
-                where_clause += " AND aml.partner_id in %s"%(tuple(partner_ids),)
-        if self.partner_category_ids:
-            partner_category_ids = self.partner_category_ids.ids
-            if len(partner_category_ids) == 1:
-                where_clause += " AND rp.category_id = %s"%(partner_category_ids[0])
-            else:
-                where_clause += " AND rp.category_id in %s"%(tuple(partner_category_ids),)
-        if self.account_type_ids:
-            account_type_ids = self.account_type_ids.ids
-            if len(account_type_ids) == 1:
-                where_clause += " AND aa.user_type_id = %s"%(account_type_ids[0])
-            else:
-                where_clause += " AND aa.user_type_id in %s"%(tuple(account_type_ids),)
+        data = {
+            'target_move': self.target_move,
+            'journals': self.journal_ids,
+            'accounts': self.account_ids,
+            'partners': not self.partner_rollup and self.partner_ids,
+        }
+        date_from = date_before = None
         if self.date_from:
             if opening:
-                where_clause += " AND am.date < '%s'"%(self.date_from)
+                date_before = self.date_from
             elif detail:
-                where_clause += " AND am.date >= '%s'"%(self.date_from)
-        if self.date_to:
-            where_clause += " AND am.date <= '%s'"%(self.date_to)
-        if self.target_move == 'posted':
-            where_clause += " AND am.state = 'posted'"
-        return where_clause, where_params
-    
+                date_from = self.date_from
+        date_to = self.date_to if not opening else None
+        where = move_line_where(self.env, data, alias='aml', date_from=date_from,
+                                date_to=date_to, date_before=date_before)
+        where.add("aat.type IN ('receivable', 'payable') AND {l}.partner_id IS NOT NULL")
+        if self.partner_rollup and self.partner_ids:
+            where.add("""{l}.partner_id IN (SELECT id FROM res_partner
+                                          WHERE commercial_partner_id = ANY(%s))""",
+                      self.partner_ids.commercial_partner_id.ids)
+        if self.partner_category_ids:
+            where.add("""EXISTS (SELECT 1 FROM res_partner_res_partner_category_rel rel
+                                 WHERE rel.partner_id = {l}.partner_id
+                                     AND rel.category_id = ANY(%s))""",
+                      self.partner_category_ids.ids)
+        if self.account_type_ids:
+            where.add("aa.user_type_id = ANY(%s)", self.account_type_ids.ids)
+        if self.reconciled == 'unreconciled':
+            # Served by the partial index on the open journal items.
+            where.add("NOT {l}.reconciled")
+        return where.sql, where.params
+
+    def _get_partner_columns(self):
+        """ Id and name columns of the partner the journal items are grouped
+        on: the partner of the item, or its commercial entity when rolling
+        up."""
+        if self.partner_rollup:
+            return 'rp.commercial_partner_id', 'crp.name'
+        return 'aml.partner_id', 'rp.name'
+
+    def _get_partner_join(self):
+        """ Joins of the partner of the journal items and, when rolling up,
+        of its commercial entity."""
+        join = "LEFT JOIN res_partner rp ON rp.id = aml.partner_id"
+        if self.partner_rollup:
+            join += " LEFT JOIN res_partner crp ON crp.id = rp.commercial_partner_id"
+        return join
+
     @api.model
     def view_report_details(self, option, partner_id):
         r = self.env['account.partner.ledger'].search([('id', '=', option[0])])
-        print (partner_id)
-        opening_where, open_param = r.get_where_condition(opening=True)
-        print (open_param)
-        where, param = r.get_where_condition(detail=True)
-        if r.date_from:
-            param.extend(open_param)
-            sql = ("""WITH data AS (SELECT
-                            0 AS lid,
-                            aml.partner_id AS partner_id,
-                            0 AS move_id, 
-                            aml.account_id AS account_id,
-                            '' as account_name,
-                            '"""+ r.date_from.strftime('%Y-%m-%d') + """' AS ldate,
-                            '' AS lcode,
-                            aml.currency_id, 
-                            SUM(aml.amount_currency) as amount_currency,
-                            'Initial Balance' AS lref,
-                            'Initial Balance' AS ref,
-                            'Initial Balance' AS lname, 
-                            COALESCE(sum(aml.debit),0) AS debit,
-                            COALESCE(sum(aml.credit),0) AS credit, 
-                            COALESCE(SUM(aml.balance),0) AS balance,
-                            '' AS move_name,
-                            c.symbol AS currency_code,
-                            c.position AS currency_position,
-                            rp.name AS partner_name
-                        FROM account_move_line aml
-                            LEFT JOIN account_move am ON (aml.move_id=am.id)
-                            LEFT JOIN account_account aa ON (aml.account_id=aa.id)
-                            LEFT JOIN res_currency c ON (aml.currency_id=c.id)
-                            LEFT JOIN res_partner rp ON (aml.partner_id=rp.id)
-                            LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                        WHERE
-                            %s AND aml.partner_id = %s
-                        GROUP BY
-                            aml.account_id,
-                            aa.name,
-                            aml.currency_id,
-                            c.symbol,
-                            c.position,
-                            aml.partner_id,
-                            rp.name
-                        UNION
-                        SELECT
+        data = []
+        for partner_lines in r._iter_partner_details([partner_id]):
+            data = partner_lines[1]
+        currency = self._get_currency()
+        return {
+            'report_lines': data,
+            'contacts': r._get_contact_rows(partner_id) if r.partner_rollup else [],
+            'currency': currency
+            }
+
+    def _get_contact_rows(self, partner_id):
+        """ Summary rows of the contacts of the commercial entity
+        ``partner_id``, breaking its rolled up row down by contact."""
+        where, where_param = self.get_where_condition()
+        self._cr.execute("""
+            SELECT
+                rp.id as id,
+                COALESCE(rp.name, '') as name,
+                """ + self._get_summary_columns() + """
+            FROM
+                account_move_line aml
+                LEFT JOIN res_partner rp ON rp.id = aml.partner_id
+                LEFT JOIN account_account aa ON aa.id = aml.account_id
+                LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
+            WHERE
+                """ + where + """ AND rp.commercial_partner_id = %s
+            GROUP BY
+                rp.id,
+                rp.name
+            ORDER BY rp.name, rp.id""",
+            self._get_summary_params() + list(where_param) + [partner_id])
+        return self._cr.dictfetchall()
+
+    def _iter_partner_details(self, partner_ids, batch_size=200):
+        """ Yield the detail lines of the given partners as (partner id,
+        lines) pairs, in the order of ``partner_ids``.
+
+        The lines of the partners, along with their initial balance rows by
+        account, are read by one query per batch of ``batch_size`` partners,
+        computing the running balance of each partner with a window
+        partitioned by partner. Only the lines of a batch are held at once,
+        so exports do not hold the whole ledger in memory."""
+        if not partner_ids:
+            return
+        opening_where, open_param = self.get_where_condition(opening=True)
+        where, param = self.get_where_condition(detail=True)
+        partner_id, partner_name = self._get_partner_columns()
+        line_query = """SELECT
                             aml.id AS lid,
-                            aml.partner_id AS partner_id,
+                            """ + partner_id + """ AS partner_id,
                             am.id AS move_id,
                             aml.account_id AS account_id,
                             aa.name as account_name,
                             aml.date AS ldate,
                             aj.code AS lcode,
-                            aml.currency_id, 
+                            aml.currency_id,
                             aml.amount_currency,
                             aml.ref AS lref,
                             aml.ref AS ref,
-                            aml.name AS lname, 
+                            aml.name AS lname,
                             COALESCE(aml.debit,0) AS debit,
-                            COALESCE(aml.credit,0) AS credit, 
-                            COALESCE(SUM(aml.balance),0) AS balance,
+                            COALESCE(aml.credit,0) AS credit,
+                            COALESCE(aml.balance,0) AS balance,
                             am.name AS move_name,
                             c.symbol AS currency_code,
                             c.position AS currency_position,
                             rp.name AS partner_name
-                        FROM 
+                        FROM
                             account_move_line aml
                             LEFT JOIN account_move am ON (aml.move_id=am.id)
                             LEFT JOIN account_account aa ON (aml.account_id=aa.id)
                             LEFT JOIN res_currency c ON (aml.currency_id=c.id)
-                            LEFT JOIN res_partner rp ON (aml.partner_id=rp.id)
+                            """ + self._get_partner_join() + """
                             LEFT JOIN account_journal aj ON (aml.journal_id=aj.id)
                             LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
                         WHERE
-                            %s AND aml.partner_id = %s
-                        GROUP BY
-                            aml.id,
-                            am.id,
-                            aml.account_id,
-                            aa.name,
-                            aml.date,
-                            aj.code,
-                            aml.currency_id,
-                            aml.amount_currency,
-                            aml.ref,
-                            aml.name,
-                            am.name,
-                            c.symbol,
-                            c.position,
-                            rp.name
-                        ORDER BY
-                            ldate asc, lcode)
-                    SELECT
-                        lid,
-                        partner_id,
-                        move_id,
-                        account_id,
-                        account_name,
-                        to_char(ldate, 'DD/MM/YYYY') as ldate,
-                        lcode,
-                        currency_id, 
-                        amount_currency,
-                        lref,
-                        ref,
-                        lname, 
-                        debit,
-                        credit,
-                        sum(balance) over (order by ldate asc,lcode rows between unbounded preceding and current row) as balance, 
-                        move_name,
-                        currency_code,
-                        currency_position,
-                        partner_name
-                    FROM
-                        data
-                    """%(opening_where, partner_id, where, partner_id))
-            self._cr.execute(sql, param)
-        else:
-            sql = ('''WITH data AS (SELECT
-                            aml.id AS lid,
-                            aml.partner_id AS partner_id,
-                            am.id AS move_id,
-                            am.ref as ref,
-                            aml.account_id AS account_id,
-                            aa.name as account_name,
-                            aml.date AS ldate,
-                            aj.code AS lcode,
-                            aml.currency_id, 
-                            aml.amount_currency,
-                            aml.ref AS lref,
-                            aml.name AS lname, 
-                            COALESCE(aml.debit,0) AS debit,
-                            COALESCE(aml.credit,0) AS credit, 
-                            COALESCE(SUM(aml.balance),0) AS balance,
-                            am.name AS move_name,
-                            c.symbol AS currency_code,
-                            c.position AS currency_position,
-                            rp.name AS partner_name
-                        FROM
-                            account_move_line aml
-                            LEFT JOIN account_move am ON (aml.move_id=am.id)
-                            LEFT JOIN res_currency c ON (aml.currency_id=c.id)
-                            LEFT JOIN res_partner rp ON (aml.partner_id=rp.id)
-                            LEFT JOIN account_journal aj ON aml.journal_id=aj.id
-                            LEFT JOIN account_account aa ON (aml.account_id = aa.id)
-                            LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                        WHERE
-                            %s AND aml.partner_id = %s
-                        GROUP BY
-                            aml.id,
-                            am.id,
-                            aml.account_id,
-                            aa.name,
-                            aml.date,
-                            aj.code,
-                            aml.currency_id,
-                            aml.amount_currency,
-                            aml.ref,
-                            aml.name,
-                            am.name,
-                            c.symbol,
-                            c.position,
-                            rp.name
-                        ORDER BY
-                            ldate asc, lcode)
-                    SELECT
-                        lid,
-                        partner_id,
-                        move_id,
-                        account_id,
-                        account_name,
-                        to_char(ldate, 'DD/MM/YYYY') as ldate,
-                        lcode,
-                        currency_id, 
-                        amount_currency,
-                        lref,
-                        ref,
-                        lname, 
-                        debit,
-                        credit,
-                        sum(balance) over (order by ldate asc,lcode rows between unbounded preceding and current row) as balance, 
-                        move_name,
-                        currency_code,
-                        currency_position,
-                        partner_name
-                    FROM
-                        data
-                        '''%(where, partner_id))
-            self._cr.execute(sql, param)
-        data = self._cr.dictfetchall()
-        currency = self._get_currency()
-        return {
-            'report_lines': data,
-            'currency': currency
-            }
-    
+                            """ + where + """ AND """ + partner_id + """ = ANY(%s)"""
+        if self.date_from:
+            line_query = """SELECT
+                                0 AS lid,
+                                """ + partner_id + """ AS partner_id,
+                                0 AS move_id,
+                                aml.account_id AS account_id,
+                                '' as account_name,
+                                %s::date AS ldate,
+                                '' AS lcode,
+                                aml.currency_id,
+                                SUM(aml.amount_currency) as amount_currency,
+                                'Initial Balance' AS lref,
+                                'Initial Balance' AS ref,
+                                'Initial Balance' AS lname,
+                                COALESCE(sum(aml.debit),0) AS debit,
+                                COALESCE(sum(aml.credit),0) AS credit,
+                                COALESCE(SUM(aml.balance),0) AS balance,
+                                '' AS move_name,
+                                c.symbol AS currency_code,
+                                c.position AS currency_position,
+                                """ + partner_name + """ AS partner_name
+                            FROM account_move_line aml
+                                LEFT JOIN account_move am ON (aml.move_id=am.id)
+                                LEFT JOIN account_account aa ON (aml.account_id=aa.id)
+                                LEFT JOIN res_currency c ON (aml.currency_id=c.id)
+                                """ + self._get_partner_join() + """
+                                LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
+                            WHERE
+                                """ + opening_where + """ AND """ + partner_id + """ = ANY(%s)
+                            GROUP BY
+                                aml.account_id,
+                                aa.name,
+                                aml.currency_id,
+                                c.symbol,
+                                c.position,
+                                """ + partner_id + """,
+                                """ + partner_name + """
+                            UNION ALL
+                            """ + line_query
+        sql = """WITH data AS (""" + line_query + """)
+                SELECT
+                    lid,
+                    partner_id,
+                    move_id,
+                    account_id,
+                    account_name,
+                    to_char(ldate, 'DD/MM/YYYY') as ldate,
+                    lcode,
+                    currency_id,
+                    amount_currency,
+                    lref,
+                    ref,
+                    lname,
+                    debit,
+                    credit,
+                    sum(balance) over (partition by partner_id order by ldate asc, lcode, lid
+                        rows between unbounded preceding and current row) as balance,
+                    move_name,
+                    currency_code,
+                    currency_position,
+                    partner_name
+                FROM
+                    data
+                    JOIN unnest(%s::int[]) WITH ORDINALITY AS o(pid, ord) ON o.pid = data.partner_id
+                ORDER BY
+                    o.ord, data.ldate asc, lcode, lid"""
+        for batch in split_every(batch_size, partner_ids, list):
+            params = param + [batch]
+            if self.date_from:
+                params = [self.date_from] + open_param + [batch] + params
+            self._cr.execute(sql, params + [batch])
+            partner_id = None
+            lines = []
+            for row in self._cr.dictfetchall():
+                if row['partner_id'] != partner_id:
+                    if lines:
+                        yield partner_id, lines
+                    partner_id, lines = row['partner_id'], []
+                lines.append(row)
+            if lines:
+                yield partner_id, lines
+
     @api.model
-    def view_report(self, option):
+    def view_report(self, option, sort='name', paginate=False):
         r = self.env['account.partner.ledger'].search([('id', '=', option[0])])
-        where, where_param = r.get_where_condition()
-        sql = """SELECT
-                    rp.id as id,
-                    rp.name as name,
-                    SUM(aml.debit) as debit,
-                    SUM(aml.credit) as credit,
-                    SUM(aml.debit - aml.credit) as balance
-                FROM
-                    account_move_line aml
-                    LEFT JOIN account_move am ON am.id = aml.move_id
-                    LEFT JOIN res_partner rp ON rp.id = aml.partner_id
-                    LEFT JOIN account_account aa ON aa.id = aml.account_id
-                    LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                WHERE
-                    %s
-                GROUP BY
-                    rp.id,
-                    rp.name
-        """%(where)
-        self._cr.execute(sql, where_param)
-        data = self._cr.dictfetchall()
-        sum_sql =  """SELECT
-                            SUM(aml.debit) as debit,
-                            SUM(aml.credit) as credit,
-                            SUM(aml.debit - aml.credit) as balance
-                        FROM
-                            account_move_line aml
-                            LEFT JOIN account_move am ON am.id = aml.move_id
-                            LEFT JOIN res_partner rp ON rp.id = aml.partner_id
-                            LEFT JOIN account_account aa ON aa.id = aml.account_id
-                            LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
-                        WHERE
-                            %s
-        """%(where)
-        self._cr.execute(sum_sql, where_param)
-        total_data = self._cr.dictfetchall()
+        return self.env['dynamic.report.cache']._get_or_compute(
+            r, 'view_report', [sort, paginate],
+            lambda: r._compute_view_report(option, sort, paginate))
+
+    def _compute_view_report(self, option, sort='name', paginate=False):
+        data, next_page = self._get_summary_rows(sort, limit=paginate and SUMMARY_PAGE_SIZE)
+        totals = self.env['dynamic.report.cache']._get_or_compute(
+            self, 'summary_totals', [], self._get_summary_totals)
         filters = self.get_filter(option)
         currency = self._get_currency()
         return {
@@ -334,25 +292,118 @@ class PartnerView(models.TransientModel):
             'tag': 'p_l',
             'filters': filters,
             'report_lines': data,
-            'debit_total': total_data[0].get('debit', 0.00),
-            'credit_total': total_data[0].get('credit', 0.00),
-            'debit_balance': total_data[0].get('balance', 0.00),
+            'cursor': next_page,
+            'sort': sort,
+            'opening_total': totals.get('opening', 0.00),
+            'debit_total': totals.get('debit', 0.00),
+            'credit_total': totals.get('credit', 0.00),
+            'debit_balance': totals.get('balance', 0.00),
             'currency': currency,
-            'wiz_id': r.id
+            'wiz_id': self.id
         }
 
     @api.model
-    def get_partners(self):
-        query = """SELECT
-                        rp.id as id,
-                        rp.name as text
+    def get_summary_page(self, wizard_id, sort, page):
+        """ Return the page of the summary rows following the cursor
+        ``page``, as returned with the previous page."""
+        r = self.browse(wizard_id)
+        return self.env['dynamic.report.cache']._get_or_compute(
+            r, 'get_summary_page', [sort, page],
+            lambda: dict(zip(('report_lines', 'cursor'), r._get_summary_rows(
+                sort, page, SUMMARY_PAGE_SIZE))))
+
+    def _get_summary_rows(self, sort='name', cursor=False, limit=None):
+        """ Summary rows of the partners, or of their commercial entities
+        when rolling up, sorted on ``sort`` (the name
+        ascending, or the debit, credit or balance descending) and the
+        partner id, and keyset paginated by ``limit`` rows. Returns the rows
+        and the cursor of the next page, False when there is none."""
+        column = SUMMARY_SORTS[sort]
+        self._cr.execute(*self._get_summary_query(sort, cursor, limit))
+        data = self._cr.dictfetchall()
+        next_cursor = False
+        if limit and len(data) > limit:
+            data = data[:limit]
+            next_cursor = {'value': data[-1][column], 'id': data[-1]['id']}
+        return data, next_cursor
+
+    def _get_summary_page_query(self, sort='name', cursor=False):
+        """ Query of a page of the summary rows as shown on the screen, along
+        with its parameters."""
+        return self._get_summary_query(sort, cursor, SUMMARY_PAGE_SIZE)
+
+    def _get_summary_query(self, sort='name', cursor=False, limit=None):
+        """ Query of a page of the summary rows, see ``_get_summary_rows``,
+        along with its parameters."""
+        column = SUMMARY_SORTS[sort]
+        where, where_param = self.get_where_condition()
+        partner_id, partner_name = self._get_partner_columns()
+        sql = """SELECT * FROM (
+                    SELECT
+                        """ + partner_id + """ as id,
+                        COALESCE(""" + partner_name + """, '') as name,
+                        """ + self._get_summary_columns() + """
                     FROM
-                        res_partner rp
+                        account_move_line aml
+                        LEFT JOIN account_move am ON am.id = aml.move_id
+                        """ + self._get_partner_join() + """
+                        LEFT JOIN account_account aa ON aa.id = aml.account_id
+                        LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
                     WHERE
-                        rp.parent_id is null
-                        AND rp.active is true"""
-        self._cr.execute(query)
-        return self._cr.dictfetchall()
+                        """ + where + """
+                    GROUP BY
+                        """ + partner_id + """,
+                        """ + partner_name + """
+                ) summary"""
+        params = self._get_summary_params() + list(where_param)
+        if cursor:
+            sql += " WHERE (summary.%s, summary.id) %s (%%s, %%s)" % (
+                column, '>' if sort == 'name' else '<')
+            params += [cursor['value'], cursor['id']]
+        order = 'ASC' if sort == 'name' else 'DESC'
+        sql += " ORDER BY summary.%s %s, summary.id %s" % (column, order, order)
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit + 1)
+        return sql, params
+
+    def _get_summary_totals(self):
+        where, where_param = self.get_where_condition()
+        sum_sql =  """SELECT
+                            """ + self._get_summary_columns() + """
+                        FROM
+                            account_move_line aml
+                            LEFT JOIN account_move am ON am.id = aml.move_id
+                            LEFT JOIN res_partner rp ON rp.id = aml.partner_id
+                            LEFT JOIN account_account aa ON aa.id = aml.account_id
+                            LEFT JOIN account_account_type aat ON aat.id = aa.user_type_id
+                        WHERE
+                            """ + where + """
+        """
+        self._cr.execute(sum_sql, self._get_summary_params() + list(where_param))
+        return self._cr.dictfetchall()[0]
+
+    def _get_summary_columns(self):
+        """ Aggregates of the summary: the opening balance, the debit and
+        credit of the period and the closing balance, all computed from the
+        journal items up to the end date, the ones before the start date
+        being told apart with FILTER."""
+        if not self.date_from:
+            return """0.00 as opening,
+                      COALESCE(SUM(aml.debit), 0) as debit,
+                      COALESCE(SUM(aml.credit), 0) as credit,
+                      COALESCE(SUM(aml.debit - aml.credit), 0) as balance"""
+        return """COALESCE(SUM(aml.debit - aml.credit) FILTER (WHERE aml.date < %s), 0) as opening,
+                  COALESCE(SUM(aml.debit) FILTER (WHERE aml.date >= %s), 0) as debit,
+                  COALESCE(SUM(aml.credit) FILTER (WHERE aml.date >= %s), 0) as credit,
+                  COALESCE(SUM(aml.debit - aml.credit), 0) as balance"""
+
+    def _get_summary_params(self):
+        return [self.date_from] * 3 if self.date_from else []
+
+    @api.model
+    def get_partners(self, term='', page=1, commercial=False):
+        return search_partners(self.env, term, page, commercial)
     
     
     def get_filter(self, option):
@@ -387,7 +438,10 @@ class PartnerView(models.TransientModel):
             filters['partners'] = ['All']
     
         if data.get('reconciled') == 'unreconciled':
-            filters['reconciled'] = 'Unreconciled'
+            filters['reconciled'] = 'Open Items Only'
+        else:
+            filters['reconciled'] = 'All Items'
+        filters['partner_rollup'] = data.get('partner_rollup')
     
         if data.get('account_type', []):
             filters['account_type'] = self.env['account.account.type'].browse(data.get('account_type', [])).mapped('name')
@@ -414,8 +468,6 @@ class PartnerView(models.TransientModel):
         journals = r.journal_ids if r.journal_ids else self.env['account.journal'].search(company_domain)
         accounts = self.account_ids if self.account_ids else self.env['account.account'].search(company_domain)
     
-        partner = r.partner_ids if r.partner_ids else self.env[
-            'res.partner'].search([])
         categories = self.partner_category_ids if self.partner_category_ids \
             else self.env['res.partner.category'].search([])
         account_types = self.env['account.account.type'].search([('type', 'in', ('receivable', 'payable'))])
@@ -432,9 +484,10 @@ class PartnerView(models.TransientModel):
             'company_name': company_id and company_id.name,
             'partners': r.partner_ids.ids,
             'reconciled': r.reconciled,
+            'partner_rollup': r.partner_rollup,
             'account_type': r.account_type_ids.ids,
             'partner_tags': r.partner_category_ids.ids,
-            'partners_list': [(p.id, p.name) for p in partner],
+            'partners_list': [(p.id, p.name) for p in r.partner_ids],
             'category_list': [(c.id, c.name) for c in categories],
             'account_type_list': [(t.id, t.name) for t in account_types],
     
@@ -485,9 +538,10 @@ class PartnerView(models.TransientModel):
         date_head = workbook.add_format({'align': 'center', 'bold': True,
                                          'font_size': 10})
 
-        sheet.merge_range('A4:B4',
-                          'Target Moves: ' + filters.get('target_move'),
-                          date_head)
+        target_moves = 'Target Moves: ' + filters.get('target_move')
+        if wiz_obj.reconciled == 'unreconciled':
+            target_moves += ', ' + filters['reconciled']
+        sheet.merge_range('A4:B4', target_moves, date_head)
 
         sheet.merge_range('C4:D4', 'Account Type: ' + ', ' .join(
             [lt or '' for lt in
@@ -522,7 +576,8 @@ class PartnerView(models.TransientModel):
             sheet.merge_range('E4:F4', 'To: ' + filters.get('date_to'),
                               date_head)
 
-        sheet.merge_range('A5:E5', 'Partner', cell_format)
+        sheet.merge_range('A5:D5', 'Partner', cell_format)
+        sheet.write('E5', 'Opening', cell_format)
         sheet.write('F5', 'Debit', cell_format)
         sheet.write('G5', 'Credit', cell_format)
         sheet.write('H5', 'Balance', cell_format)
@@ -539,11 +594,14 @@ class PartnerView(models.TransientModel):
         sheet.set_column(6, 6, 15)
         sheet.set_column(7, 7, 15)
 
+        details = wiz_obj._iter_partner_details([report['id'] for report in report_data])
+        partner_lines = next(details, (None, []))
         for report in report_data:
 
             row += 1
-            sheet.merge_range(row, col + 0, row, col + 4, report['name'],
+            sheet.merge_range(row, col + 0, row, col + 3, report['name'],
                               sub_heading_sub)
+            sheet.write(row, col + 4, report['opening'], sub_heading_sub)
             sheet.write(row, col + 5, report['debit'], sub_heading_sub)
             sheet.write(row, col + 6, report['credit'], sub_heading_sub)
             sheet.write(row, col + 7, report['balance'], sub_heading_sub)
@@ -556,7 +614,11 @@ class PartnerView(models.TransientModel):
             sheet.write(row, col + 5, 'Debit', cell_format)
             sheet.write(row, col + 6, 'Credit', cell_format)
             sheet.write(row, col + 7, 'Balance', cell_format)
-            for r_rec in wiz_obj.view_report_details([wiz_obj.id], report['id'])['report_lines']:
+            lines = []
+            if partner_lines[0] == report['id']:
+                lines = partner_lines[1]
+                partner_lines = next(details, (None, []))
+            for r_rec in lines:
                 row += 1
                 sheet.write(row, col + 0, r_rec['ldate'], txt)
                 sheet.write(row, col + 1, r_rec['lcode'], txt)
@@ -0,0 +1,128 @@
+# Number of partners per page of the partner pickers.
+PARTNER_PAGE_SIZE = 20
+
+
+class MoveLineWhere(object):
+    """ Parameterized WHERE clause on the journal items.
+
+    Every filter is compiled into a fixed predicate on the columns of
+    ``account_move_line`` and lists of ids are passed as arrays through
+    ``= ANY(%s)``. The SQL text thus only depends on which filters are set,
+    not on their values, and PostgreSQL can reuse its plans."""
+
+    def __init__(self, alias='l'):
+        self.alias = alias
+        self.clauses = []
+        self.params = []
+
+    def add(self, clause, *params):
+        """ Add a predicate, ``{l}`` in ``clause`` standing for the alias of
+        the journal items."""
+        self.clauses.append(clause.replace('{l}', self.alias))
+        self.params.extend(params)
+        return self
+
+    def copy(self):
+        where = MoveLineWhere(self.alias)
+        where.clauses = list(self.clauses)
+        where.params = list(self.params)
+        return where
+
+    @property
+    def sql(self):
+        return " AND ".join(self.clauses) or "TRUE"
+
+
+def move_line_where(env, data, alias='l', date_from=None, date_to=None,
+                    date_before=None, company_ids=None):
+    """ Compile the filters of a report wizard into a MoveLineWhere.
+
+    ``data`` holds the usual report values: ``target_move`` and optionally
+    the ``journals``, ``accounts``, ``partners``, ``analytics`` and
+    ``analytic_tags`` recordsets. The dates are given explicitly, as the
+    reports query several periods with the same filters. The companies are
+    the allowed ones unless ``company_ids`` is given."""
+    where = MoveLineWhere(alias)
+    where.add("{l}.company_id = ANY(%s)", list(company_ids or env.companies.ids))
+    if data.get('target_move') == 'posted':
+        where.add("{l}.parent_state = ANY(%s)", ['posted'])
+    else:
+        where.add("{l}.parent_state = ANY(%s)", ['draft', 'posted'])
+    if date_from:
+        where.add("{l}.date >= %s", date_from)
+    if date_to:
+        where.add("{l}.date <= %s", date_to)
+    if date_before:
+        where.add("{l}.date < %s", date_before)
+    if data.get('journals'):
+        where.add("{l}.journal_id = ANY(%s)", data['journals'].ids)
+    if data.get('accounts'):
+        where.add("{l}.account_id = ANY(%s)", data['accounts'].ids)
+    if data.get('partners'):
+        where.add("{l}.partner_id = ANY(%s)", data['partners'].ids)
+    if data.get('analytics'):
+        where.add("{l}.analytic_account_id = ANY(%s)", data['analytics'].ids)
+    if data.get('analytic_tags'):
+        where.add("""EXISTS (SELECT 1 FROM account_analytic_tag_account_move_line_rel anltag
+                             WHERE anltag.account_move_line_id = {l}.id
+                                 AND anltag.account_analytic_tag_id = ANY(%s))""",
+                  data['analytic_tags'].ids)
+    return where
+
+
+def display_account_having(display_account, currency, alias='l', date_from=None,
+                           period=None):
+    """ HAVING clause and parameters keeping the accounts to display when
+    grouping the journal items by account: accounts with journal items
+    ('movement'), dated from ``date_from`` if given, or with a balance
+    ('not_zero'). Nothing is filtered out for 'all'.
+
+    ``period`` is an SQL condition restricting the balance to the rows of
+    the period, when the grouped rows also hold the opening balances."""
+    if display_account == 'movement':
+        if date_from:
+            return "COUNT(%s.id) FILTER (WHERE %s.date >= %%s) > 0" % (alias, alias), [date_from]
+        return "COUNT(%s.id) > 0" % alias, []
+    if display_account == 'not_zero':
+        balance = "SUM(%s.debit - %s.credit)" % (alias, alias)
+        if period:
+            balance += " FILTER (WHERE %s)" % period
+        return "ROUND(COALESCE(%s, 0), %%s) != 0" % balance, [currency.decimal_places]
+    return "", []
+
+
+def search_partners(env, term, page=1, commercial=False):
+    """ Page ``page`` of the active top-level partners whose name contains
+    ``term``, for the partner pickers of the reports, as select2 results
+    along with whether more results follow. The pages hold
+    ``PARTNER_PAGE_SIZE`` partners, and the name matching is served by the
+    trigram index on the partner names.
+
+    With ``commercial``, the commercial entities are listed instead, and
+    ``term`` also matches the names of their contacts, so that a contact
+    leads to the entity its journal items are rolled up on."""
+    if commercial:
+        query = """SELECT rp.id AS id, rp.name AS text
+                   FROM res_partner rp
+                   WHERE rp.id = rp.commercial_partner_id AND rp.active IS TRUE"""
+    else:
+        query = """SELECT rp.id AS id, rp.name AS text
+                   FROM res_partner rp
+                   WHERE rp.parent_id IS NULL AND rp.active IS TRUE"""
+    params = []
+    if term:
+        pattern = '%' + term.replace('\\', '\\\\').replace(
+            '%', '\\%').replace('_', '\\_') + '%'
+        if commercial:
+            query += """ AND rp.id IN (SELECT c.commercial_partner_id FROM res_partner c
+                                       WHERE c.active IS TRUE AND c.name ILIKE %s)"""
+        else:
+            query += " AND rp.name ILIKE %s"
+        params.append(pattern)
+    query += " ORDER BY rp.name, rp.id LIMIT %s OFFSET %s"
+    env.cr.execute(query, params + [PARTNER_PAGE_SIZE + 1, (page - 1) * PARTNER_PAGE_SIZE])
+    results = env.cr.dictfetchall()
+    return {
+        'results': results[:PARTNER_PAGE_SIZE],
+        'more': len(results) > PARTNER_PAGE_SIZE,
+    }
@@ -1,5 +1,6 @@
 import time
 from odoo import fields, models, api, _
+from odoo.tools import config
 
 import io
 import json
@@ -10,8 +11,17 @@ try:
 except ImportError:
     import xlsxwriter
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from dateutil.relativedelta import relativedelta
+
+from .report_filter import display_account_having, move_line_where
+
+# Threads computing the companies of a consolidated Trial Balance in
+# parallel, 0 or 1 computing them one after the other.
+CONSOLIDATION_WORKERS = int(config.get('dynamic_report_consolidation_workers', 4))
+
 class TrialView(models.TransientModel):
     _inherit = "account.common.report"
     _name = 'account.trial.balance'
@@ -24,37 +34,75 @@ class TrialView(models.TransientModel):
         [('all', 'All'), ('movement', 'With movements'),
          ('not_zero', 'With balance is not equal to 0')],
         string='Display Accounts', required=True, default='movement')
+    period_type = fields.Selection(
+        [('month', 'Month'), ('quarter', 'Quarter'), ('year', 'Year')],
+        string='Period Columns',
+        help="Add a column with the movement of each period.")
+    consolidate = fields.Boolean(
+        'Consolidate Companies',
+        help="Merge the accounts of all the allowed companies by code, in "
+             "the currency of the current company.")
+    group_hierarchy = fields.Boolean(
+        'Group Hierarchy',
+        help="Roll the accounts up through their account groups.")
 
     @api.model
     def view_report(self, option):
         r = self.env['account.trial.balance'].search([('id', '=', option[0])])
+        data = r._get_report_data()
+        return self.env['dynamic.report.cache']._get_or_compute(
+            r, 'view_report', [],
+            lambda: r._compute_view_report(option, data))
 
+    def _get_report_data(self):
+        """ Collect the wizard values used by the trial balance queries."""
         data = {
-            'display_account': r.display_account,
+            'display_account': self.display_account,
             'model':self,
-            'journals': r.journal_ids,
-            'target_move': r.target_move,
+            'journals': self.journal_ids,
+            'target_move': self.target_move,
 
         }
-        if r.date_from:
+        if self.date_from:
+            data.update({
+                'date_from':self.date_from,
+            })
+        if self.date_to:
+            data.update({
+                'date_to':self.date_to,
+            })
+        if self.period_type:
             data.update({
-                'date_from':r.date_from,
+                'period_type': self.period_type,
             })
-        if r.date_to:
+        if self.consolidate and len(self.env.companies) > 1:
             data.update({
-                'date_to':r.date_to,
+                'consolidate': True,
             })
+        return data
 
-        filters = r.get_filter(option)
-        records = r._get_report_values(data)
-        currency = r._get_currency()
+    def _compute_view_report(self, option, data):
+        filters = self.get_filter(option)
+        records = self._get_report_values(data)
+        currency = self._get_currency()
+        report_lines = records['Accounts']
+        root_lines = False
+        if self.group_hierarchy:
+            # the screen unfolds the groups on demand, the prints get the
+            # whole tree
+            tree = self._get_group_tree(report_lines)
+            root_lines = [tree[key] for key in tree['roots']['children']]
+            report_lines = self._flatten_group_tree(tree)
 
         return {
             'name': "Trial Balance",
             'type': 'ir.actions.client',
             'tag': 't_b',
             'filters': filters,
-            'report_lines': records['Accounts'],
+            'group_hierarchy': self.group_hierarchy,
+            'periods': records['periods'],
+            'report_lines': report_lines,
+            'root_lines': root_lines,
             'debit_total': records['debit_total'],
             'credit_total': records['credit_total'],
             'op_debit_total': records['op_debit_total'],
@@ -64,6 +112,114 @@ class TrialView(models.TransientModel):
             'currency': currency,
         }
 
+    @api.model
+    def get_group_lines(self, wizard_id, group_key):
+        """ Return the rows of the subgroups and accounts of an expanded
+        group of the hierarchical trial balance, cached along with the
+        report."""
+        r = self.browse(wizard_id)
+        return self.env['dynamic.report.cache']._get_or_compute(
+            r, 'get_group_lines', [group_key],
+            lambda: r._get_group_lines(group_key))
+
+    def _get_group_lines(self, group_key):
+        """ Rows of the children of a group, computed from the accounts of
+        the groups whose code prefix starts with the one of the group only.
+
+        The whole trial balance is computed when consolidating companies, as
+        the accounts are then merged by code, and when the period columns
+        depend on the movements of all the accounts, without both dates."""
+        data = self._get_report_data()
+        if data.get('consolidate') or (data.get('period_type') and not (
+                data.get('date_from') and data.get('date_to'))):
+            account_res = self._get_report_values(data)['Accounts']
+        else:
+            group = self.env['account.group'].browse(int(group_key[1:]))
+            accounts = self.env['account.account'].search([
+                ('group_id.code_prefix_start', '=like', (group.code_prefix_start or '') + '%')])
+            account_res = self._get_accounts(accounts, data['display_account'], data)
+            if data.get('period_type'):
+                self._get_period_balances(account_res, data)
+        tree = self._get_group_tree(account_res)
+        return [tree[key] for key in tree[group_key]['children']]
+
+    def _get_group_tree(self, account_res):
+        """ Roll the trial balance rows of the accounts up through the
+        account groups, found in a prefix tree of their code prefixes.
+
+        Returns the rows by key, each with the keys of its children, the top
+        level rows being the children of 'roots'."""
+        groups = self.env['account.group'].search(
+            [('company_id', 'in', self.env.companies.ids)])
+        groups = groups.sorted(lambda g: (len(g.code_prefix_start or ''), g.code_prefix_start or ''))
+        tree = {'roots': {'children': []}}
+        trie = {}
+        depth = {}
+        for group in groups:
+            node = trie
+            parent = 'roots'
+            for char in group.code_prefix_start or '':
+                node = node.setdefault(char, {})
+                parent = node.get('group', parent)
+            key = 'g%s' % group.id
+            node['group'] = key
+            depth[key] = 0 if parent == 'roots' else depth[parent] + 1
+            tree[key] = {
+                'key': key,
+                'id': group.id,
+                'code': group.code_prefix_start,
+                'name': group.name,
+                'group': True,
+                'level': depth[key],
+                'debit': 0.00,
+                'credit': 0.00,
+                'balance': 0.00,
+                'Init_balance': {'id': group.id, 'debit': 0.00, 'credit': 0.00, 'balance': 0.00},
+                'closing_balance': {'debit': 0.00, 'credit': 0.00},
+                'parent': parent,
+                'children': [],
+            }
+            tree[parent]['children'].append(key)
+        accounts = self.env['account.account'].browse([row['id'] for row in account_res])
+        account_groups = {account.id: account.group_id.id for account in accounts}
+        for row in account_res:
+            key = 'a%s' % row['id']
+            parent = 'g%s' % account_groups[row['id']]
+            if parent not in tree:
+                parent = 'roots'
+            tree[key] = dict(row, key=key, group=False, parent=parent, children=[],
+                             level=0 if parent == 'roots' else depth[parent] + 1)
+            tree[parent]['children'].append(key)
+        for key in sorted(depth, key=depth.get, reverse=True) + ['roots']:
+            node = tree[key]
+            # groups without any account to display are left out
+            node['children'] = [child for child in node['children']
+                                if not tree[child]['group'] or tree[child]['children']]
+            if key == 'roots':
+                continue
+            for child in node['children']:
+                child = tree[child]
+                for field in ('debit', 'credit', 'balance'):
+                    node[field] += child[field]
+                    node['Init_balance'][field] += child['Init_balance'][field]
+                for field in ('debit', 'credit'):
+                    node['closing_balance'][field] += child['closing_balance'][field]
+                if 'period_balances' in child:
+                    node['period_balances'] = [
+                        balance + child_balance for balance, child_balance in zip(
+                            node.get('period_balances') or [0.00] * len(child['period_balances']),
+                            child['period_balances'])]
+        return tree
+
+    def _flatten_group_tree(self, tree, key='roots'):
+        """ Rows of the groups and accounts below ``key`` in the tree of
+        ``_get_group_tree``, each group followed by its children."""
+        rows = []
+        for child in tree[key]['children']:
+            rows.append(tree[child])
+            rows.extend(self._flatten_group_tree(tree, child))
+        return rows
+
     def get_filter(self, option):
         data = self.get_filter_data(option)
         filters = {}
@@ -82,6 +238,9 @@ class TrialView(models.TransientModel):
         filters['journals_list'] = data.get('journals_list')
         filters['company_name'] = data.get('company_name')
         filters['target_move'] = data.get('target_move').capitalize()
+        filters['group_hierarchy'] = data.get('group_hierarchy')
+        filters['period_type'] = data.get('period_type')
+        filters['consolidate'] = data.get('consolidate')
 
         return filters
 
@@ -98,6 +257,9 @@ class TrialView(models.TransientModel):
             'date_from': r.date_from,
             'date_to': r.date_to,
             'target_move': r.target_move,
+            'group_hierarchy': r.group_hierarchy,
+            'period_type': r.period_type,
+            'consolidate': r.consolidate,
             'journals_list': [(j.id, j.name, j.code) for j in journals],
             'company_name': company_id and company_id.name,
         }
@@ -111,7 +273,13 @@ class TrialView(models.TransientModel):
         accounts = self.env['account.account'].search([])
         if not accounts:
             raise UserError(_("No Accounts Found! Please Add One"))
-        account_res = self._get_accounts(accounts, display_account, data)
+        periods = []
+        if data.get('consolidate'):
+            account_res, periods = self._get_consolidated_accounts(display_account, data)
+        else:
+            account_res = self._get_accounts(accounts, display_account, data)
+            if data.get('period_type'):
+                periods = self._get_period_balances(account_res, data)
         debit_total = 0
         debit_total = sum(x['debit'] for x in account_res)
         credit_total = sum(x['credit'] for x in account_res)
@@ -129,9 +297,137 @@ class TrialView(models.TransientModel):
             'cl_credit_total': cl_credit_total,
             'docs': docs,
             'time': time,
+            'periods': periods,
             'Accounts': account_res,
         }
 
+    def _get_consolidated_accounts(self, display_account, data):
+        """ Trial balance of all the allowed companies merged by account code,
+        in the currency of the current company at the end date of the report.
+
+        The companies are computed in parallel, on a pool of at most
+        ``CONSOLIDATION_WORKERS`` threads. Returns the rows of the accounts
+        and the labels of the period columns, given when both dates are set."""
+        currency = self.env.company.currency_id
+        date = data.get('date_to') or fields.Date.context_today(self)
+        companies = self.env.companies
+        with_periods = data.get('period_type') and data.get('date_from') and data.get('date_to')
+        registry = self.pool
+        uid = self.env.uid
+        context = self.env.context
+
+        def compute(env, company):
+            wizard = self.with_env(env)
+            journals = data['journals'].with_env(env).filtered(
+                lambda j: j.company_id == company)
+            if data['journals'] and not journals:
+                return [], []
+            company_data = dict(data, model=wizard, journals=journals)
+            accounts = env['account.account'].search([('company_id', '=', company.id)])
+            account_res = wizard._get_accounts(accounts, display_account, company_data)
+            periods = []
+            if with_periods:
+                periods = wizard._get_period_balances(account_res, company_data)
+            return account_res, periods
+
+        def fetch(company_id):
+            with api.Environment.manage(), registry.cursor() as cr:
+                env = api.Environment(cr, uid, dict(context, allowed_company_ids=[company_id]))
+                return compute(env, env['res.company'].browse(company_id))
+
+        if CONSOLIDATION_WORKERS > 1 and not self.pool.in_test_mode():
+            workers = min(CONSOLIDATION_WORKERS, len(companies))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(fetch, companies.ids))
+        else:
+            results = [compute(self.with_context(allowed_company_ids=[company.id]).env, company)
+                       for company in companies]
+        rows = {}
+        periods = []
+        for company, (account_res, company_periods) in zip(companies, results):
+            periods = periods or company_periods
+            rate = self.env['res.currency']._get_conversion_rate(
+                company.currency_id, currency, company, date)
+            for row in account_res:
+                merged = rows.get(row['code'])
+                if merged is None:
+                    merged = rows[row['code']] = {
+                        'code': row['code'],
+                        'name': row['name'],
+                        'id': row['id'],
+                        'debit': 0.00,
+                        'credit': 0.00,
+                        'balance': 0.00,
+                        'opening': 0.00,
+                        'closing': 0.00,
+                    }
+                    if with_periods:
+                        merged['period_balances'] = [0.00] * len(company_periods)
+                if company == self.env.company:
+                    merged['name'], merged['id'] = row['name'], row['id']
+                merged['debit'] += row['debit'] * rate
+                merged['credit'] += row['credit'] * rate
+                merged['balance'] += row['balance'] * rate
+                merged['opening'] += row['Init_balance']['balance'] * rate
+                merged['closing'] += (row['closing_balance']['debit']
+                                      - row['closing_balance']['credit']) * rate
+                if with_periods:
+                    merged['period_balances'] = [
+                        balance + company_balance * rate for balance, company_balance in zip(
+                            merged['period_balances'], row['period_balances'])]
+        account_res = []
+        for code in sorted(rows):
+            row = rows[code]
+            opening = currency.round(row.pop('opening'))
+            closing = currency.round(row.pop('closing'))
+            row['Init_balance'] = {
+                'id': row['id'],
+                'debit': opening > 0.00 and opening or 0.00,
+                'credit': opening < 0.00 and abs(opening) or 0.00,
+                'balance': opening,
+            }
+            row['closing_balance'] = {
+                'debit': closing > 0.00 and closing or 0.00,
+                'credit': closing < 0.00 and abs(closing) or 0.00,
+            }
+            account_res.append(row)
+        return account_res, periods
+
+    def _get_period_balances(self, account_res, data):
+        """ Add the movement of each period to the rows of the accounts, as
+        a ``period_balances`` list, from a single scan of the journal items
+        grouped by account and by date truncated to the period. Returns the
+        labels of the periods, every period between the dates of the report
+        being given a column even without any movement."""
+        unit = {'month': 1, 'quarter': 3, 'year': 12}[data['period_type']]
+        where = move_line_where(self.env, data, date_from=data.get('date_from'),
+                                date_to=data.get('date_to'))
+        where.add("{l}.account_id = ANY(%s)", [row['id'] for row in account_res])
+        self.env.cr.execute("""
+            SELECT l.account_id, date_trunc(%s, l.date)::date AS period,
+                   SUM(l.debit - l.credit) AS balance
+            FROM account_move_line l
+            WHERE """ + where.sql + """
+            GROUP BY l.account_id, period""", [data['period_type']] + where.params)
+        balances = {}
+        for account_id, period, balance in self.env.cr.fetchall():
+            balances.setdefault(account_id, {})[period] = balance
+        starts = sorted({period for periods in balances.values() for period in periods})
+        if data.get('date_from') and data.get('date_to'):
+            period = fields.Date.start_of(data['date_from'], data['period_type'])
+            starts = []
+            while period <= data['date_to']:
+                starts.append(period)
+                period += relativedelta(months=unit)
+        for row in account_res:
+            account_balances = balances.get(row['id'], {})
+            row['period_balances'] = [account_balances.get(start, 0.00) for start in starts]
+        if data['period_type'] == 'month':
+            return [start.strftime('%b %Y') for start in starts]
+        if data['period_type'] == 'quarter':
+            return ['Q%s %s' % ((start.month - 1) // 3 + 1, start.year) for start in starts]
+        return [str(start.year) for start in starts]
+
     @api.model
     def create(self, vals):
         vals['target_move'] = 'posted'
@@ -149,143 +445,112 @@ class TrialView(models.TransientModel):
         return res
 
     def _get_accounts(self, accounts, display_account, data):
-
-        account_result = {}
-        # Prepare sql query base on selected parameters from wizard
-        tables, where_clause, where_params = self.env['account.move.line']._query_get()
-        tables = tables.replace('"', '')
-        if not tables:
-            tables = 'account_move_line'
-        wheres = [""]
-        if where_clause.strip():
-            wheres.append(where_clause.strip())
-        filters = " AND ".join(wheres)
-        if data['target_move'] == 'posted':
-            filters += " AND account_move_line__move_id.state = 'posted'"
-        else:
-            filters += " AND account_move_line__move_id.state in ('draft','posted')"
-        if data.get('date_from'):
-            filters += " AND account_move_line.date >= '%s'" % data.get('date_from')
-        if data.get('date_to'):
-            filters += " AND account_move_line.date <= '%s'" % data.get('date_to')
-
-        if data['journals']:
-            filters += ' AND jrnl.id IN %s' % str(tuple(data['journals'].ids) + tuple([0]))
-        tables += 'JOIN account_journal jrnl ON (account_move_line.journal_id=jrnl.id)'
-        # compute the balance, debit and credit for the provided accounts
-        request = (
-                    "SELECT account_id AS id, SUM(debit) AS debit, SUM(credit) AS credit, (SUM(debit) - SUM(credit)) AS balance" + \
-                    " FROM " + tables + " WHERE account_id IN %s " + filters + " GROUP BY account_id")
-        params = (tuple(accounts.ids),) + tuple(where_params)
+        """ Opening, period and closing balances of the given accounts, all
+        computed by a single statement, see ``_get_accounts_query``."""
+        request, params = self._get_accounts_query(accounts, display_account, data)
         self.env.cr.execute(request, params)
-        for row in self.env.cr.dictfetchall():
-            account_result[row.pop('id')] = row
-
+        account_result = {row['id']: row for row in self.env.cr.dictfetchall()}
+        if display_account != 'all':
+            accounts = accounts.filtered(lambda a: a.id in account_result)
         account_res = []
         for account in accounts:
-            res = dict((fn, 0.0) for fn in ['credit', 'debit', 'balance'])
-            currency = account.currency_id and account.currency_id or account.company_id.currency_id
-            res['code'] = account.code
-            res['name'] = account.name
-            res['id'] = account.id
-            initial_balance = self.get_init_bal(account, display_account, data)
-            res['Init_balance'] = initial_balance
-            net_debit = initial_balance['debit']
-            net_credit = initial_balance['credit']
-            if account.id in account_result:
-                res['debit'] = account_result[account.id].get('debit')
-                res['credit'] = account_result[account.id].get('credit')
-                res['balance'] = account_result[account.id].get('balance')
-                net_debit += account_result[account.id].get('debit', 0.00)
-                net_credit += account_result[account.id].get('credit', 0.00)
-            if display_account == 'all':
-                account_res.append(res)
-            if display_account == 'not_zero' and not currency.is_zero(
-                    res['balance']):
-                account_res.append(res)
-            net_balance = net_debit - net_credit
-            res['closing_balance'] = {
-                'debit': net_balance > 0.00 and net_balance or 0.00,
-                'credit': net_balance < 0.00 and abs(net_balance) or 0.00,
-                }
-            # if display_account == 'movement' and (
-            #         not currency.is_zero(res['closing_balance']['debit']) or not currency.is_zero(
-            #         res['closing_balance']['credit'])):
-            account_res.append(res)
+            row = account_result[account.id]
+            opening = row['opening_balance']
+            closing = opening + row['balance']
+            account_res.append({
+                'code': account.code,
+                'name': account.name,
+                'id': account.id,
+                'debit': row['debit'],
+                'credit': row['credit'],
+                'balance': row['balance'],
+                'Init_balance': {
+                    'id': account.id,
+                    'debit': opening > 0.00 and opening or 0.00,
+                    'credit': opening < 0.00 and abs(opening) or 0.00,
+                    'balance': opening,
+                },
+                'closing_balance': {
+                    'debit': closing > 0.00 and closing or 0.00,
+                    'credit': closing < 0.00 and abs(closing) or 0.00,
+                },
+            })
         return account_res
 
-    def get_init_bal(self, account, display_account, data):
-        row = {
-            'id': account.id,
-            'debit': 0.00,
-            'credit': 0.00,
-            'balance': 0.00
-            }
+    def _get_accounts_query(self, accounts, display_account, data):
+        """ Statement of the opening, period and closing balances of the
+        given accounts, along with its parameters.
+
+        The opening balances come from the balance snapshots and the period
+        from the journal items, as rows of one derived table that the
+        aggregates tell apart with FILTER. Income and expense accounts open
+        at zero, their opening balance being carried by the retained
+        earnings account, see ``_get_unallocated_earnings``. With 'not_zero',
+        the accounts are filtered once this opening balance is added, so that
+        the retained earnings account is kept when it only carries it."""
+        where = move_line_where(self.env, data, date_from=data.get('date_from'),
+                                date_to=data.get('date_to'))
+        where.add("{l}.account_id = ANY(%s)", accounts.ids)
+        having, having_params = "", []
+        if display_account != 'not_zero':
+            having, having_params = display_account_having(
+                display_account, self.env.company.currency_id, period="l.period")
         if data.get('date_from'):
-            tables, where_clause, where_params = self.env[
-                'account.move.line']._query_get()
-            tables = tables.replace('"', '')
-            if not tables:
-                tables = 'account_move_line'
-            wheres = [""]
-            if where_clause.strip():
-                wheres.append(where_clause.strip())
-            filters = " AND ".join(wheres)
-            if data['target_move'] == 'posted':
-                filters += " AND account_move_line__move_id.state = 'posted'"
-            else:
-                filters += " AND account_move_line__move_id.state in ('draft','posted')"
-            if data.get('date_from'):
-                filters += " AND account_move_line.date < '%s'" % data.get('date_from')
-
-            if data['journals']:
-                filters += ' AND jrnl.id IN %s' % str(tuple(data['journals'].ids) + tuple([0]))
-            tables += ' JOIN account_journal jrnl ON (account_move_line.journal_id=jrnl.id)'
-            tables += ' LEFT JOIN account_account aa on aa.id = account_move_line.account_id'
-            tables += ' LEFT JOIN account_account_type aat ON (aat.id=aa.user_type_id)'
-
-            # compute the balance, debit and credit for the provided accounts
-            request = (
-                    "SELECT account_id AS id, SUM(debit) AS debit, SUM(credit) AS credit, (SUM(debit) - SUM(credit)) AS balance" + \
-                    " FROM " + tables + " WHERE account_id = %s and aat.internal_group not in ('income', 'expense')" % account.id + filters + " GROUP BY account_id")
-            params = tuple(where_params)
-            print (request)
-            print ("\n\n\n", params)
-            self.env.cr.execute(request, params)
-            result = self.env.cr.dictfetchall()
-            if result:
-                debit = result[0]['debit']
-                credit = result[0]['credit']
-                balance = debit - credit
-                if balance > 0.00:
-                    row['debit'] = balance
-                if balance < 0.00:
-                    row['credit'] = abs(balance)
-                row['balance'] = result[0]['balance']
-            if account.ret_earning_account:
-                request = (
-                        "SELECT SUM(debit) AS debit, SUM(credit) AS credit, (SUM(debit) - SUM(credit)) AS balance" + \
-                        " FROM " + tables + " WHERE aat.internal_group in ('income', 'expense')" + filters)
-                params = tuple(where_params)
-                self.env.cr.execute(request, params)
-                pl_result = self.env.cr.dictfetchall()
-                if pl_result:
-                    debit = pl_result[0]['debit'] or 0.00
-                    credit = pl_result[0]['credit'] or 0.00
-                    acc_debit = row['debit'] or 0.00
-                    acc_credit = row['credit'] or 0.00
-                    pl_balance = debit - credit
-                    if pl_balance < 0.00:
-                        acc_credit += abs(pl_balance)
-                    if pl_balance > 0.00:
-                        acc_debit += pl_balance
-                    acc_balance = acc_debit - acc_credit
-                    if acc_balance > 0.00:
-                        row['debit'] = acc_balance
-                    if acc_balance < 0.00:
-                        row['credit'] = abs(acc_balance)
-                    row['balance'] = acc_balance
-        return row
+            opening_query, opening_params = self.env['account.balance.snapshot']._get_opening_query(
+                data['date_from'], data['target_move'], self.env.companies.ids,
+                data['journals'].ids, accounts.ids)
+            opening_query = """
+                UNION ALL
+                SELECT o.account_id, NULL AS id, o.debit, o.credit, o.balance, FALSE AS period
+                FROM (""" + opening_query + """) o"""
+        else:
+            opening_query, opening_params = "", []
+        pl_opening = 0.00
+        if data.get('date_from'):
+            pl_opening = self.env['account.balance.snapshot']._get_unallocated_earnings(
+                data['date_from'], data['target_move'], self.env.companies.ids,
+                data['journals'].ids)
+        request = """
+            WITH l AS (
+                SELECT l.account_id, l.id, l.debit, l.credit, l.balance, TRUE AS period
+                FROM account_move_line l
+                WHERE """ + where.sql + opening_query + """
+            ), accounts AS (
+                SELECT
+                    a.id,
+                    a.ret_earning_account,
+                    COALESCE(SUM(l.balance) FILTER (WHERE NOT l.period
+                        AND t.internal_group NOT IN ('income', 'expense')), 0) AS opening_balance,
+                    COALESCE(SUM(l.debit) FILTER (WHERE l.period), 0) AS debit,
+                    COALESCE(SUM(l.credit) FILTER (WHERE l.period), 0) AS credit,
+                    COALESCE(SUM(l.debit - l.credit) FILTER (WHERE l.period), 0) AS balance
+                FROM account_account a
+                    JOIN account_account_type t ON (a.user_type_id=t.id)
+                    LEFT JOIN l ON (l.account_id=a.id)
+                WHERE a.id = ANY(%s)
+                GROUP BY a.id, a.ret_earning_account"""
+        if having:
+            request += " HAVING " + having
+        request += """
+            ), balances AS (
+                SELECT
+                    a.id,
+                    a.debit,
+                    a.credit,
+                    a.balance,
+                    a.opening_balance + CASE WHEN a.ret_earning_account
+                        THEN %s::numeric ELSE 0 END AS opening_balance
+                FROM accounts a
+            )
+            SELECT * FROM balances b"""
+        params = where.params + list(opening_params) + [accounts.ids] + having_params + [
+            pl_opening]
+        if display_account == 'not_zero':
+            decimal_places = self.env.company.currency_id.decimal_places
+            request += """
+            WHERE ROUND(b.balance, %s) != 0 OR ROUND(b.opening_balance, %s) != 0"""
+            params += [decimal_places, decimal_places]
+        return request, params
 
     @api.model
     def _get_currency(self):
@@ -363,16 +628,29 @@ class TrialView(models.TransientModel):
         worksheet.write(row, 5, 'Credit', bold_center_bg)
         worksheet.write(row, 6, 'Closing Debit', bold_center_bg)
         worksheet.write(row, 7, 'Closing Credit', bold_center_bg)
+        periods = total.get('periods') or []
+        if periods:
+            worksheet.set_column(8, 7 + len(periods), 18)
+            if len(periods) > 1:
+                worksheet.merge_range(row - 1, 8, row - 1, 7 + len(periods), "Period Movements", bold_center_bg)
+            else:
+                worksheet.write(row - 1, 8, "Period Movements", bold_center_bg)
+        for col, period in enumerate(periods, 8):
+            worksheet.write(row, col, period, bold_center_bg)
         row += 1
         for rec_data in report_data_main:
-            worksheet.write(row, 0, rec_data['code'])
-            worksheet.write(row, 1, rec_data['name'])
-            worksheet.write_number(row, 2, rec_data['Init_balance']['debit'], no_format)
-            worksheet.write_number(row, 3, rec_data['Init_balance']['credit'], no_format)
-            worksheet.write_number(row, 4, rec_data['debit'], no_format)
-            worksheet.write_number(row, 5, rec_data['credit'], no_format)
-            worksheet.write_number(row, 6, rec_data['closing_balance']['debit'], no_format)
-            worksheet.write_number(row, 7, rec_data['closing_balance']['credit'], no_format)
+            text_format = rec_data.get('group') and bold or None
+            num_format = rec_data.get('group') and normal_num_bold or no_format
+            worksheet.write(row, 0, rec_data['code'], text_format)
+            worksheet.write(row, 1, rec_data['name'], text_format)
+            worksheet.write_number(row, 2, rec_data['Init_balance']['debit'], num_format)
+            worksheet.write_number(row, 3, rec_data['Init_balance']['credit'], num_format)
+            worksheet.write_number(row, 4, rec_data['debit'], num_format)
+            worksheet.write_number(row, 5, rec_data['credit'], num_format)
+            worksheet.write_number(row, 6, rec_data['closing_balance']['debit'], num_format)
+            worksheet.write_number(row, 7, rec_data['closing_balance']['credit'], num_format)
+            for col, balance in enumerate(rec_data.get('period_balances') or [], 8):
+                worksheet.write_number(row, col, balance, num_format)
             row += 1
         worksheet.write(row, 1, 'Total', bold_center)
         worksheet.write_number(row, 2, total['op_debit_total'], normal_num_bold_bg)
@@ -381,6 +659,11 @@ class TrialView(models.TransientModel):
         worksheet.write_number(row, 5, total['credit_total'], normal_num_bold_bg)
         worksheet.write_number(row, 6, total['cl_debit_total'], normal_num_bold_bg)
         worksheet.write_number(row, 7, total['cl_credit_total'], normal_num_bold_bg)
+        for col in range(len(periods)):
+            worksheet.write_number(row, 8 + col, sum(
+                (rec_data.get('period_balances') or [0.00] * len(periods))[col]
+                for rec_data in report_data_main if not rec_data.get('group')),
+                normal_num_bold_bg)
         workbook.close()
         output.seek(0)
         response.stream.write(output.read())